@@ -0,0 +1,60 @@
+"""Measure bulk entry ingestion throughput against the configured storage backend.
+
+    python benchmarks/bench_bulk_ingest.py --entries 100000 --batch-size 2000
+
+Prints one JSON object with the throughput; the target is >= 10k entries/sec
+against a local Neo4j (RECALL_STORAGE=memory measures the in-memory engine).
+The benchmark capsule is deleted afterwards.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+from datetime import datetime, UTC
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src/backend')))
+
+import db
+from ingest import ingest_entries
+
+FIELDS = [
+    {"name": "sensor", "type": "string"},
+    {"name": "temperature", "type": "int"},
+    {"name": "ok", "type": "boolean"},
+]
+
+
+def synthetic_records(count):
+    for i in range(count):
+        yield {"properties": {"sensor": f"s{i % 50}", "temperature": random.randint(-20, 45), "ok": i % 7 != 0}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--entries', type=int, default=50000)
+    parser.add_argument('--batch-size', type=int, default=2000)
+    args = parser.parse_args()
+
+    capsule_id = db.create_capsule("bench_capsule_ingest", "bulk ingest benchmark", datetime.now(UTC), FIELDS)
+    try:
+        capsule = db.get_capsule_by_id(capsule_id)
+        summary = None
+        for event in ingest_entries(capsule, synthetic_records(args.entries), batch_size=args.batch_size):
+            if event['event'] == 'done':
+                summary = event
+        summary.pop('event')
+        summary.update(benchmark='bulk_ingest', batch_size=args.batch_size, target_entries_per_sec=10000)
+        print(json.dumps(summary))
+    finally:
+        if db.get_backend().name == 'neo4j':
+            with db.get_session() as session:
+                session.run(
+                    "MATCH (c:Capsule {id: $id}) OPTIONAL MATCH (c)-[:HAS_ENTRY]->(e) DETACH DELETE c, e",
+                    id=capsule_id
+                ).consume()
+        db.close_backend()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Compare snapshot storage size and rebuild latency: full copies vs keyframes + deltas.
+
+    python benchmarks/bench_snapshots.py --versions 2000 --keyframe-interval 20
+
+Each run records the same edit history of one entry twice, once with every
+version a full copy (keyframe interval 1, the previous layout) and once with
+delta compression, then rebuilds random versions with a cold cache. Prints
+one JSON object. The benchmark capsule is deleted afterwards.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, UTC
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src/backend')))
+
+import db
+import snapshots
+from storage import get_backend
+
+
+def edit_history(count, size):
+    """Yield `count` payloads of a document with `size` fields, changing one field per version."""
+    document = {f"field_{i}": f"value {i} " + "x" * 40 for i in range(size)}
+    for version in range(count):
+        document[f"field_{random.randrange(size)}"] = f"edit {version}"
+        yield json.dumps(document)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run(capsule_id, payloads, interval, reads):
+    entry_id = db.create_entry(capsule_id, datetime.now(UTC), json.dumps({"bench": interval}))
+    start = datetime(2025, 1, 1, tzinfo=UTC)
+    began = time.perf_counter()
+    ids = [
+        snapshots.create_snapshot(entry_id, start + timedelta(seconds=i), payload, interval=interval)
+        for i, payload in enumerate(payloads)
+    ]
+    write_seconds = time.perf_counter() - began
+    stored = get_backend().get_snapshots_by_entry(entry_id)
+    latencies = []
+    for snapshot_id in random.sample(ids, min(reads, len(ids))):
+        snapshots.get_snapshot_cache().clear()
+        began = time.perf_counter()
+        snapshot = snapshots.get_snapshot(snapshot_id)
+        latencies.append((time.perf_counter() - began) * 1000)
+        assert snapshot['payload'] == payloads[ids.index(snapshot_id)]
+    return {
+        'keyframe_interval': interval,
+        'stored_bytes': sum(len(record['payload']) for record in stored),
+        'keyframes': sum(1 for record in stored if record['kind'] == snapshots.KEYFRAME),
+        'writes_per_sec': round(len(ids) / write_seconds, 1),
+        'rebuild_ms_p50': round(statistics.median(latencies), 3),
+        'rebuild_ms_p95': round(percentile(latencies, 95), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--versions', type=int, default=1000)
+    parser.add_argument('--fields', type=int, default=50)
+    parser.add_argument('--keyframe-interval', type=int, default=snapshots.DEFAULT_KEYFRAME_INTERVAL)
+    parser.add_argument('--reads', type=int, default=200)
+    args = parser.parse_args()
+
+    payloads = list(edit_history(args.versions, args.fields))
+    capsule_id = db.create_capsule("bench_capsule_snapshots", "snapshot benchmark", datetime.now(UTC), [])
+    try:
+        full = run(capsule_id, payloads, 1, args.reads)
+        delta = run(capsule_id, payloads, args.keyframe_interval, args.reads)
+        print(json.dumps({
+            'benchmark': 'snapshots',
+            'versions': args.versions,
+            'full_copy': full,
+            'delta': delta,
+            'storage_ratio': round(delta['stored_bytes'] / full['stored_bytes'], 4),
+        }))
+    finally:
+        if db.get_backend().name == 'neo4j':
+            with db.get_session() as session:
+                session.run(
+                    """
+                    MATCH (c:Capsule {id: $id}) OPTIONAL MATCH (c)-[:HAS_ENTRY]->(e) OPTIONAL MATCH (e)-[:HAS_SNAPSHOT]->(s)
+                    DETACH DELETE c, e, s
+                    """,
+                    id=capsule_id
+                ).consume()
+        db.close_backend()
+
+
+if __name__ == '__main__':
+    main()
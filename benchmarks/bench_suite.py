@@ -0,0 +1,146 @@
+"""Latency and throughput of the data-layer and API hot paths on a synthetic capsule.
+
+    python benchmarks/bench_suite.py --backend memory --entries 5000 --fan-out 3 --tags 50 \
+        --snapshot-depth 10 --output results.json
+    python benchmarks/bench_suite.py --backend neo4j --compare results.json
+
+Generates a capsule (see synthetic.py), then times each operation
+`--iterations` times: create_entry, get_entries_by_capsule,
+search_entries_by_text, get_linked_entries_recursive, GET
+/api/entries/search and the rendered capsule page (view_capsule). Prints
+one JSON document with the scale, backend and git revision, and per-
+operation throughput and p50/p90/p95/p99 latencies. With `--compare`, the
+p50/p95 change against an earlier result file is added. The capsule is
+deleted afterwards.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+from datetime import datetime, UTC
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import VOCABULARY, db, delete_capsule, generate_capsule, measure
+from storage import BACKENDS, create_backend, set_backend
+
+OPERATIONS = (
+    'create_entry', 'get_entries_by_capsule', 'search_entries_by_text',
+    'get_linked_entries_recursive', 'api_entries_search', 'view_capsule',
+)
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def flask_client():
+    # recall.py prints its template paths on import; keep stdout for the JSON result.
+    with contextlib.redirect_stdout(sys.stderr):
+        from recall import app
+    return app.test_client()
+
+
+def run_suite(capsule_id, entry_ids, iterations, depth, rng, operations=OPERATIONS):
+    client = flask_client()
+    words = [rng.choice(VOCABULARY) for _ in range(iterations)]
+    starts = [rng.choice(entry_ids) for _ in range(iterations)] if entry_ids else []
+
+    def get(url):
+        response = client.get(url)
+        assert response.status_code == 200, (url, response.status_code)
+
+    plans = {
+        'create_entry': (
+            lambda i: db.create_entry(capsule_id, datetime.now(UTC), json.dumps({"title": f"new {i}", "priority": 1})),
+            range(iterations),
+        ),
+        'get_entries_by_capsule': (lambda _: db.get_entries_by_capsule(capsule_id), range(iterations)),
+        'search_entries_by_text': (lambda word: db.search_entries_by_text(word, limit=50), words),
+        'get_linked_entries_recursive': (lambda entry_id: db.get_linked_entries_recursive(entry_id, depth), starts),
+        'api_entries_search': (lambda word: get(f"/api/entries/search?text={word}&limit=50"), words),
+        'view_capsule': (lambda _: get(f"/capsule/{capsule_id}"), range(iterations)),
+    }
+    return {name: measure(*plans[name]) for name in operations}
+
+
+def compare(results, baseline):
+    """Return per-operation p50/p95 ratios of `results` over `baseline` (below 1.0 is faster)."""
+    changes = {}
+    for name, current in results.items():
+        previous = baseline.get('operations', {}).get(name)
+        if not previous or not current.get('count'):
+            continue
+        changes[name] = {
+            f'{key}_ratio': round(current[key] / previous[key], 3) if previous.get(key) else None
+            for key in ('p50_ms', 'p95_ms')
+        }
+    return changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backend', choices=BACKENDS, default=os.getenv('RECALL_STORAGE', 'memory'))
+    parser.add_argument('--entries', type=int, default=2000)
+    parser.add_argument('--fan-out', type=int, default=3)
+    parser.add_argument('--tags', type=int, default=50, help='distinct tag names')
+    parser.add_argument('--tags-per-entry', type=int, default=2)
+    parser.add_argument('--snapshot-depth', type=int, default=0, help='snapshot versions per snapshotted entry')
+    parser.add_argument('--snapshot-entries', type=int, default=100)
+    parser.add_argument('--depth', type=int, default=3, help='max depth for get_linked_entries_recursive')
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--operation', action='append', choices=OPERATIONS, help='run only these (repeatable)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='also write the JSON result to this file')
+    parser.add_argument('--compare', help='earlier result file to compare p50/p95 against')
+    args = parser.parse_args()
+
+    set_backend(create_backend(args.backend))
+    rng = random.Random(args.seed)
+    scale = {
+        'entries': args.entries, 'fan_out': args.fan_out, 'tags': args.tags,
+        'tags_per_entry': args.tags_per_entry, 'snapshot_depth': args.snapshot_depth,
+        'snapshot_entries': args.snapshot_entries,
+    }
+    capsule_id, entry_ids = generate_capsule(seed=args.seed, name="bench_capsule_suite", **scale)
+    try:
+        operations = run_suite(capsule_id, entry_ids, args.iterations, args.depth, rng,
+                               args.operation or OPERATIONS)
+    finally:
+        delete_capsule(capsule_id)
+        db.close_backend()
+    result = {
+        'benchmark': 'suite',
+        'backend': args.backend,
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'recorded_at': datetime.now(UTC).isoformat(),
+        'scale': dict(scale, depth=args.depth, iterations=args.iterations, seed=args.seed),
+        'operations': operations,
+    }
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as baseline:
+            previous = json.load(baseline)
+        result['compare'] = {
+            'baseline_revision': previous.get('revision'),
+            'operations': compare(operations, previous),
+        }
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            output.write(text + '\n')
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""Synthetic capsule generator and timing helpers shared by the benchmarks.
+
+A generated capsule has `entries` entries whose text is drawn from a small
+vocabulary (so full-text queries have hits), `fan_out` LINKS_TO edges per
+entry to random other entries, tags drawn from `tags` distinct names and
+`snapshot_depth` snapshot versions on each of the first `snapshot_entries`
+entries. Everything is written through the bulk data-layer calls and is
+reproducible from `seed`.
+"""
+import json
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, UTC
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src/backend')))
+
+import db
+
+FIELDS = [
+    {"name": "title", "type": "string"},
+    {"name": "body", "type": "string"},
+    {"name": "priority", "type": "int"},
+    {"name": "done", "type": "boolean"},
+]
+VOCABULARY = (
+    "sensor report river harbor signal archive ledger orbit canyon meadow "
+    "lantern quartz ember vapor summit tundra delta beacon prism falcon"
+).split()
+BATCH_SIZE = 2000
+
+
+def entry_properties(rng, index):
+    return {
+        "title": f"{rng.choice(VOCABULARY)} {index}",
+        "body": " ".join(rng.choice(VOCABULARY) for _ in range(12)),
+        "priority": rng.randint(1, 5),
+        "done": rng.random() < 0.3,
+    }
+
+
+def generate_capsule(entries=1000, fan_out=3, tags=20, tags_per_entry=2, snapshot_depth=0,
+                     snapshot_entries=100, seed=0, name="bench_capsule"):
+    """Create a synthetic capsule; returns `(capsule_id, entry_ids)`."""
+    rng = random.Random(seed)
+    capsule_id = db.create_capsule(name, "synthetic benchmark capsule", datetime.now(UTC), FIELDS)
+    start = datetime(2025, 1, 1, tzinfo=UTC)
+    entry_ids = []
+    for offset in range(0, entries, BATCH_SIZE):
+        rows = [
+            (start + timedelta(seconds=i), json.dumps(entry_properties(rng, i)))
+            for i in range(offset, min(offset + BATCH_SIZE, entries))
+        ]
+        entry_ids += db.create_entries_batch(capsule_id, rows)
+    if fan_out and len(entry_ids) > 1:
+        links = [
+            (source, target)
+            for source in entry_ids
+            for target in rng.sample(entry_ids, min(fan_out + 1, len(entry_ids)))
+            if target != source
+        ]
+        db.link_entries(links)
+    if tags and tags_per_entry:
+        names = [f"tag_{i}" for i in range(tags)]
+        db.tag_entries([
+            (entry_id, tag) for entry_id in entry_ids for tag in rng.sample(names, min(tags_per_entry, tags))
+        ])
+    for entry_id in entry_ids[:snapshot_entries] if snapshot_depth else []:
+        document = entry_properties(rng, 0)
+        for version in range(snapshot_depth):
+            document["priority"] = version
+            db.create_snapshot(entry_id, start + timedelta(seconds=version), json.dumps(document))
+    return capsule_id, entry_ids
+
+
+def delete_capsule(capsule_id):
+    """Remove a generated capsule with its entries and their snapshots."""
+    db.delete_capsule(capsule_id)
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(len(ordered) * pct / 100) - 1)]
+
+
+def measure(operation, arguments):
+    """Call `operation(argument)` for each argument; returns throughput and latency percentiles in ms."""
+    latencies = []
+    began = time.perf_counter()
+    for argument in arguments:
+        started = time.perf_counter()
+        operation(argument)
+        latencies.append((time.perf_counter() - started) * 1000)
+    elapsed = time.perf_counter() - began
+    if not latencies:
+        return {'count': 0}
+    return {
+        'count': len(latencies),
+        'ops_per_sec': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'mean_ms': round(sum(latencies) / len(latencies), 3),
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p90_ms': round(percentile(latencies, 90), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'max_ms': round(max(latencies), 3),
+    }
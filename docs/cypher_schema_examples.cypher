@@ -1,5 +1,6 @@
 # Cypher Schema Setup for Recall (Neo4j)
-# Run these in Neo4j Browser or cypher-shell as needed.
+# Run these in Neo4j Browser or cypher-shell as needed; `python src/backend/schema.py`
+# applies them as versioned migrations and records the version on a SchemaVersion node.
 
 // Ensure unique IDs for all major node types
 CREATE CONSTRAINT capsule_id_unique IF NOT EXISTS FOR (c:Capsule) REQUIRE c.id IS UNIQUE;
@@ -9,6 +10,28 @@ CREATE CONSTRAINT snapshot_id_unique IF NOT EXISTS FOR (s:Snapshot) REQUIRE s.id
 CREATE CONSTRAINT tag_id_unique IF NOT EXISTS FOR (tag:Tag) REQUIRE tag.id IS UNIQUE;
 CREATE CONSTRAINT template_id_unique IF NOT EXISTS FOR (tpl:Template) REQUIRE tpl.id IS UNIQUE;
 
+// Tags and templates are looked up (and MERGEd) by name
+CREATE CONSTRAINT tag_name_unique IF NOT EXISTS FOR (tag:Tag) REQUIRE tag.name IS UNIQUE;
+CREATE CONSTRAINT template_name_unique IF NOT EXISTS FOR (tpl:Template) REQUIRE tpl.name IS UNIQUE;
+
+// Full-text index over entry property values (db.ensure_schema creates this at startup
+// and backfills search_text/search_fields on older entries)
+CREATE FULLTEXT INDEX entry_search IF NOT EXISTS FOR (e:Entry) ON EACH [e.search_text, e.search_fields];
+
+// Range indexes for time-ordered reads (entry pages, snapshot history)
+CREATE INDEX entry_timestamp IF NOT EXISTS FOR (e:Entry) ON (e.timestamp);
+CREATE INDEX snapshot_created_at IF NOT EXISTS FOR (s:Snapshot) ON (s.created_at);
+
+// Native datetime on entries (ts, always UTC) for time-range reads and bucket counts
+CREATE INDEX entry_ts IF NOT EXISTS FOR (e:Entry) ON (e.ts);
+
+// Applied schema version
+MATCH (v:SchemaVersion {name: 'recall'}) RETURN v.version, v.applied_at;
+
+// Example: ranked search, with a field-scoped term (`title:report` in the API)
+CALL db.index.fulltext.queryNodes('entry_search', 'search_text:sensor AND search_fields:title__report') YIELD node, score
+RETURN node, score ORDER BY score DESC LIMIT 20;
+
 // Example: Create a Capsule, Thread, and Entry and link them
 CREATE (c:Capsule {id: 'abc', name: 'Test Capsule', description: '...', created_at: '2025-06-13T00:00:00Z'})
 CREATE (t:Thread {id: 'def', name: 'Thread1', created_at: '2025-06-13T00:00:00Z'})
@@ -28,3 +51,38 @@ MERGE (e1)-[:LINKS_TO]->(e2);
 // Example: Assign Template to Thread
 MATCH (t:Thread {id: 'def'}), (tpl:Template {id: 'tpl1'})
 MERGE (t)-[:USES_TEMPLATE]->(tpl);
+
+// Example: Range index over a native entry field and a filtered page (storage_mode 'native')
+CREATE INDEX entry_field_temperature IF NOT EXISTS FOR (e:Entry) ON (e.`f_temperature`);
+MATCH (c:Capsule {id: 'abc'})-[:HAS_ENTRY]->(e:Entry)
+WHERE e.`f_temperature` > 30
+RETURN e ORDER BY e.timestamp, e.id LIMIT 100;
+
+// Example: Bulk tagging, one batch of (entry, tag) pairs per transaction
+UNWIND $rows AS row
+MATCH (e:Entry {id: row.entry_id})
+MERGE (tag:Tag {name: row.tag}) ON CREATE SET tag.id = randomUUID()
+MERGE (e)-[:TAGGED_AS]->(tag);
+
+// Example: Hourly entry counts in a time range
+MATCH (c:Capsule {id: 'abc'})-[:HAS_ENTRY]->(e:Entry)
+WHERE e.ts >= datetime('2025-06-13T00:00:00Z') AND e.ts < datetime('2025-06-14T00:00:00Z')
+RETURN datetime.truncate('hour', e.ts) AS start, count(e) AS count ORDER BY start;
+
+// Example: Delete a capsule, then purge its entries one batch (transaction) at a time
+MATCH (c:Capsule {id: 'abc'}) REMOVE c:Capsule SET c:DeletedCapsule, c.deleted_at = '2025-06-13T00:00:00Z';
+MATCH (c:DeletedCapsule {id: 'abc'})-[:HAS_ENTRY]->(e:Entry)
+WITH e LIMIT 1000
+OPTIONAL MATCH (e)-[:HAS_SNAPSHOT]->(s:Snapshot)
+DETACH DELETE s, e;
+
+// Example: Most used tags in a capsule, from the maintained counters
+MATCH (:Capsule {id: 'abc'})-[tc:TAG_COUNT]->(tag:Tag)
+RETURN tag.name AS name, tc.entries AS entries ORDER BY entries DESC, name LIMIT 20;
+
+// Example: Entries tagged both 'red' and 'blue', walking the less used tag
+MATCH (tag:Tag) WHERE tag.name IN ['red', 'blue']
+WITH tag ORDER BY tag.entries LIMIT 1
+MATCH (tag)<-[:TAGGED_AS]-(e:Entry)
+WHERE all(name IN ['red', 'blue'] WHERE (e)-[:TAGGED_AS]->(:Tag {name: name}))
+RETURN e ORDER BY e.timestamp, e.id LIMIT 100;
@@ -0,0 +1,161 @@
+"""Grouped statistics over a capsule's int and boolean fields.
+
+An aggregation reads one or more declared `int`/`boolean` fields and
+returns, per group, the number of entries in the group and for each field
+the count, sum, avg, min and max of its typed values (booleans count as
+0/1, so `sum` is the number of true values and `avg` their share). Values
+that do not have the field's declared type are ignored, as filters do.
+`group_by` is one of
+
+    (none)          one group over the whole capsule or time range
+    <field name>    the value of a declared int/boolean/string field
+    tag             each tag name; an entry counts once per tag and
+                    untagged entries form the null group
+    hour, day       the UTC hour or day of the entry timestamp
+
+Groups are ordered by key with the null group last. Native-mode capsules
+on Neo4j are aggregated by one Cypher query; otherwise the entries are
+decoded once into a columnar extract (group keys plus one value column per
+field) that is reduced in one pass with Python integers, so sums never
+overflow.
+"""
+import json
+from datetime import datetime
+from entry_storage import is_typed, native_fields
+from filters import BUCKETS, entry_time, truncate
+
+AGGREGATE_TYPES = ('int', 'boolean')
+GROUP_TAG = 'tag'
+
+
+def parse_aggregation(args, fields):
+    """Read `field` (repeatable) and `group_by` request args against a capsule's declared fields.
+
+    Returns `(columns, group_by)`. `columns` is a list of `(name, type)`, all
+    int/boolean fields when no `field` is given. `group_by` is None,
+    `('tag', None)`, `('bucket', 'hour'|'day')` or `('field', (name, type))`.
+    Raises ValueError for unknown or non-numeric fields and bad groupings.
+    """
+    declared = native_fields(fields)
+    numeric = {name: kind for name, kind in declared.items() if kind in AGGREGATE_TYPES}
+    names = args.getlist('field') or list(numeric)
+    if not names:
+        raise ValueError('capsule declares no int or boolean fields to aggregate')
+    for name in names:
+        if name not in numeric:
+            raise ValueError(f"'{name}' is not a declared int or boolean field")
+    columns = [(name, numeric[name]) for name in dict.fromkeys(names)]
+    group = args.get('group_by')
+    if not group:
+        return columns, None
+    if group == GROUP_TAG:
+        return columns, ('tag', None)
+    if group in BUCKETS:
+        return columns, ('bucket', group)
+    if group in declared:
+        return columns, ('field', (group, declared[group]))
+    raise ValueError(f"'group_by' must be {GROUP_TAG}, {', '.join(BUCKETS)} or a declared field")
+
+
+def group_name(group_by):
+    """The `group_by` value a parsed grouping was read from (None when ungrouped)."""
+    if group_by is None:
+        return None
+    kind, key = group_by
+    return GROUP_TAG if kind == 'tag' else key[0] if kind == 'field' else key
+
+
+def field_stats(count, total, low, high):
+    return {
+        'count': count,
+        'sum': total,
+        'avg': total / count if count else None,
+        'min': low if count else None,
+        'max': high if count else None,
+    }
+
+
+def _properties(entry):
+    properties = entry.get('properties')
+    if isinstance(properties, str):
+        try:
+            properties = json.loads(properties)
+        except ValueError:
+            properties = {}
+    return properties if isinstance(properties, dict) else {}
+
+
+def _number(properties, name, field_type):
+    value = properties.get(name)
+    if not is_typed(field_type, value):
+        return None
+    return int(value)
+
+
+def _group_keys(entry, properties, group_by, tags):
+    if group_by is None:
+        return (None,)
+    kind, key = group_by
+    if kind == 'tag':
+        return tags.get(entry['id']) or (None,)
+    if kind == 'bucket':
+        moment = entry_time(entry)
+        return (truncate(moment, key) if moment is not None else None,)
+    name, field_type = key
+    value = properties.get(name)
+    return (value if is_typed(field_type, value) else None,)
+
+
+def columnar_extract(entries, columns, group_by=None, tags=None):
+    """Decode entries into `(keys, values)`: one group key per row and one value list per column.
+
+    Values are ints (booleans as 0/1) or None where the entry has no typed
+    value. When grouping by tag, `tags` maps entry ids to tag names and an
+    entry contributes one row per tag.
+    """
+    keys = []
+    values = [[] for _ in columns]
+    for entry in entries:
+        properties = _properties(entry)
+        row = [_number(properties, name, field_type) for name, field_type in columns]
+        for key in _group_keys(entry, properties, group_by, tags):
+            keys.append(key)
+            for column, value in zip(values, row):
+                column.append(value)
+    return keys, values
+
+
+def _reduce(codes, values, size):
+    counts = [0] * size
+    for code in codes:
+        counts[code] += 1
+    stats = []
+    for column in values:
+        n, total, low, high = [0] * size, [0] * size, [None] * size, [None] * size
+        for code, value in zip(codes, column):
+            if value is None:
+                continue
+            n[code] += 1
+            total[code] += value
+            if low[code] is None or value < low[code]:
+                low[code] = value
+            if high[code] is None or value > high[code]:
+                high[code] = value
+        stats.append([field_stats(*group) for group in zip(n, total, low, high)])
+    return counts, stats
+
+
+def aggregate_columns(keys, values, columns):
+    """Reduce a columnar extract to `[{'key', 'count', 'fields': {name: stats}}]` in key order."""
+    order = sorted(set(keys), key=lambda key: (key is None, key))
+    index = {key: i for i, key in enumerate(order)}
+    codes = [index[key] for key in keys]
+    counts, stats = _reduce(codes, values, len(order))
+    return [
+        {
+            'key': key.isoformat() if isinstance(key, datetime) else key,
+            'count': counts[i],
+            'fields': {name: stats[c][i] for c, (name, _) in enumerate(columns)},
+        }
+        for i, key in enumerate(order)
+    ]
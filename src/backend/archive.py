@@ -0,0 +1,342 @@
+"""Capsule archives: a capsule with its entries, snapshots, tags, templates and links as NDJSON.
+
+An archive is one JSON record per line, each with a `type`, in this order:
+
+    header        {"format": "recall-capsule", "version": 1}
+    capsule       id, name, description, created_at, fields, storage_mode
+    entry         id, timestamp, properties (an object)
+    snapshot      the stored record (id, created_at, payload, kind, seq, base) and entry_id
+    tag           entry_id, name
+    template      id, name, structure; written just before its first use
+    uses_template entry_id, template_id
+    link          source, target (LINKS_TO edges between the capsule's entries)
+    end           counts of the records above
+
+Exports read every section from a database cursor and imports write
+consecutive records of one type in batches (one UNWIND transaction each),
+so neither side holds more than a batch in memory, whatever the capsule
+size. Archives may be gzip- or zstd-compressed (zstd needs the zstandard
+package); imports detect the codec from the first bytes.
+
+Imports either keep the archived ids (`ids='preserve'`, refused when the
+capsule already exists) or give the capsule a new id and derive every
+entry and snapshot id from it with uuid5 (`ids='remap'`), which maps ids
+consistently without keeping a table of them. Tags and templates are
+matched by name. Entries and snapshots that already exist are skipped and
+edges are merged, so replaying records is harmless: after a failure the
+import resumes from its last checkpoint, `{'records': <records applied>,
+'capsule_id': <target>, 'import_id': <marker>}`, and may redo at most one
+batch. The capsule an import creates carries its `import_id`, and a resume
+is refused unless the target capsule has the checkpoint's, so a checkpoint
+can only ever write into the capsule its own import created.
+"""
+from datetime import datetime, UTC
+import json
+import uuid
+import zlib
+import db
+from entry_storage import MIGRATING
+from storage import get_backend
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+FORMAT = 'recall-capsule'
+VERSION = 1
+CODECS = ('gzip', 'zstd')
+ID_MODES = ('remap', 'preserve')
+DEFAULT_IMPORT_BATCH_SIZE = 1000
+MAX_IMPORT_BATCH_SIZE = 20000
+CHUNK_SIZE = 64 * 1024
+SNAPSHOT_KEYS = ('id', 'created_at', 'payload', 'kind', 'seq', 'base')
+# Batched record types and the keys each must carry
+BATCHED_RECORDS = {
+    'entry': ('id', 'timestamp'),
+    'snapshot': ('id', 'entry_id'),
+    'tag': ('entry_id', 'name'),
+    'uses_template': ('entry_id', 'template_id'),
+    'link': ('source', 'target'),
+}
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+
+class ImportInterrupted(Exception):
+    """An import stopped part way; `checkpoint` says where to resume."""
+
+    def __init__(self, message, checkpoint):
+        super().__init__(message)
+        self.checkpoint = dict(checkpoint)
+
+
+# Export
+def export_records(capsule):
+    """Yield a capsule's archive records in order, streaming each section from the database."""
+    backend = get_backend()
+    counts = {'entries': 0, 'snapshots': 0, 'tags': 0, 'templates': 0, 'uses_template': 0, 'links': 0}
+    yield {'type': 'header', 'format': FORMAT, 'version': VERSION, 'exported_at': datetime.now(UTC).isoformat()}
+    yield {'type': 'capsule', **{key: capsule.get(key) for key in
+                                 ('id', 'name', 'description', 'created_at', 'fields', 'storage_mode')}}
+    for entry in db.iter_entries_by_capsule(capsule['id']):
+        counts['entries'] += 1
+        yield {'type': 'entry', 'id': entry['id'], 'timestamp': entry.get('timestamp'),
+               'properties': json.loads(entry.get('properties') or '{}')}
+    for record in db.iter_capsule_snapshots(capsule['id']):
+        counts['snapshots'] += 1
+        yield {'type': 'snapshot', 'entry_id': record['entry_id'], **{key: record.get(key) for key in SNAPSHOT_KEYS}}
+    for entry_id, tag in backend.iter_capsule_relations(capsule['id'], 'TAGGED_AS'):
+        counts['tags'] += 1
+        yield {'type': 'tag', 'entry_id': entry_id, 'name': tag['name']}
+    templates = set()
+    for entry_id, template in backend.iter_capsule_relations(capsule['id'], 'USES_TEMPLATE'):
+        if template['id'] not in templates:
+            templates.add(template['id'])
+            stored = db.get_template(template['id']) or template
+            counts['templates'] += 1
+            yield {'type': 'template', 'id': template['id'], 'name': stored['name'],
+                   'structure': stored.get('structure')}
+        counts['uses_template'] += 1
+        yield {'type': 'uses_template', 'entry_id': entry_id, 'template_id': template['id']}
+    for source, target in backend.iter_capsule_relations(capsule['id'], 'LINKS_TO'):
+        counts['links'] += 1
+        yield {'type': 'link', 'source': source, 'target': target['id']}
+    yield {'type': 'end', 'counts': counts}
+
+
+def encode_lines(records):
+    """Serialize records as NDJSON, yielding bytes in chunks of about CHUNK_SIZE."""
+    buffer = []
+    size = 0
+    for record in records:
+        line = (json.dumps(record, default=str) + '\n').encode('utf-8')
+        buffer.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield b''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def compress(chunks, codec=None):
+    """Compress a stream of byte chunks with `codec` (None, 'gzip' or 'zstd')."""
+    check_codec(codec)
+    if codec is None:
+        yield from chunks
+        return
+    if codec == 'gzip':
+        compressor = zlib.compressobj(wbits=31)
+    else:
+        compressor = zstandard.ZstdCompressor().compressobj()
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def check_codec(codec):
+    """Raise ValueError unless archives can be written with `codec` here."""
+    if codec is not None and codec not in CODECS:
+        raise ValueError(f"compress must be one of {', '.join(CODECS)}")
+    if codec == 'zstd' and zstandard is None:
+        raise ValueError('zstd compression needs the zstandard package')
+
+
+def export_archive(capsule, codec=None):
+    """Return a generator of the capsule's archive as (optionally compressed) bytes."""
+    check_codec(codec)
+    return compress(encode_lines(export_records(capsule)), codec)
+
+
+# Import
+def decompress(stream):
+    """Yield the decompressed bytes of a binary file-like `stream`, detecting gzip and zstd by magic bytes."""
+    head = stream.read(len(ZSTD_MAGIC))
+    if head.startswith(GZIP_MAGIC):
+        decompressor = zlib.decompressobj(wbits=31)
+    elif head.startswith(ZSTD_MAGIC):
+        if zstandard is None:
+            raise ValueError('archive is zstd-compressed but the zstandard package is not installed')
+        decompressor = zstandard.ZstdDecompressor().decompressobj()
+    else:
+        decompressor = None
+    chunk = head
+    while chunk:
+        yield decompressor.decompress(chunk) if decompressor else chunk
+        chunk = stream.read(CHUNK_SIZE)
+
+
+def iter_records(stream):
+    """Parse an archive stream into records, holding at most one partial line between chunks."""
+    pending = b''
+    number = 0
+    for chunk in decompress(stream):
+        lines = (pending + chunk).split(b'\n')
+        pending = lines.pop()
+        for line in lines:
+            number += 1
+            if line.strip():
+                yield _parse_line(line, number)
+    if pending.strip():
+        yield _parse_line(pending, number + 1)
+
+
+def _parse_line(line, number):
+    try:
+        record = json.loads(line)
+    except ValueError:
+        raise ValueError(f'line {number} is not valid JSON')
+    if not isinstance(record, dict) or 'type' not in record:
+        raise ValueError(f'line {number} is not an archive record')
+    return record
+
+
+def _remap(namespace, old_id):
+    return str(uuid.uuid5(namespace, old_id))
+
+
+def _check_resume_target(checkpoint):
+    """Raise ValueError unless `checkpoint` resumes into a capsule created by its own import."""
+    capsule_id, import_id = checkpoint.get('capsule_id'), checkpoint.get('import_id')
+    if not capsule_id or not import_id:
+        raise ValueError('checkpoint needs the capsule_id and import_id of the import to resume')
+    capsule = db.get_capsule_by_id(capsule_id)
+    if capsule is None:
+        # Only the checkpoint saved just before the capsule is created points at a missing one
+        if checkpoint['records'] > 1:
+            raise ValueError(f'capsule {capsule_id} no longer exists')
+    elif capsule.get('import_id') != import_id:
+        raise ValueError(f'capsule {capsule_id} was not created by this import')
+
+
+def import_archive(records, ids='remap', batch_size=DEFAULT_IMPORT_BATCH_SIZE, checkpoint=None, on_checkpoint=None):
+    """Write archive `records` into a new capsule and return a summary of what was created.
+
+    Pass the last `checkpoint` to resume a failed import; `on_checkpoint` is
+    called with the new checkpoint after each batch is committed. Raises
+    ValueError when the archive is unusable before anything was written;
+    once the capsule exists any failure, including a malformed or truncated
+    archive, raises ImportInterrupted with the checkpoint to resume from
+    (its `__cause__` is the original error).
+    """
+    if ids not in ID_MODES:
+        raise ValueError(f"ids must be one of {', '.join(ID_MODES)}")
+    checkpoint = dict(checkpoint or {'records': 0, 'capsule_id': None, 'import_id': None})
+    resume_from = checkpoint['records']
+    if resume_from:
+        _check_resume_target(checkpoint)
+    elif checkpoint.get('capsule_id'):
+        raise ValueError('capsule_id can only be given to resume an interrupted import')
+    summary = {'capsule_id': checkpoint.get('capsule_id'), 'entries': 0, 'snapshots': 0, 'tags': 0,
+               'templates': 0, 'uses_template': 0, 'links': 0, 'resumed_from': resume_from}
+    state = {'capsule': False, 'namespace': None, 'templates': {}, 'kind': None, 'batch': [], 'applied': resume_from}
+
+    def entry_id(old_id):
+        return old_id if ids == 'preserve' else _remap(state['namespace'], old_id)
+
+    def save(applied):
+        checkpoint['records'] = applied
+        if on_checkpoint:
+            on_checkpoint(dict(checkpoint))
+
+    def flush():
+        kind, batch = state['kind'], state['batch']
+        if not batch:
+            return
+        capsule_id = checkpoint['capsule_id']
+        if kind == 'entry':
+            rows = [(entry_id(r['id']), datetime.fromisoformat(r['timestamp']), json.dumps(r.get('properties') or {}))
+                    for r in batch]
+            summary['entries'] += db.import_entries_batch(capsule_id, rows)
+        elif kind == 'snapshot':
+            rows = [dict({key: r.get(key) for key in SNAPSHOT_KEYS}, id=entry_id(r['id']), entry_id=entry_id(r['entry_id']))
+                    for r in batch]
+            summary['snapshots'] += db.import_snapshots_batch(rows)
+        elif kind == 'tag':
+            summary['tags'] += db.tag_entries([(entry_id(r['entry_id']), r['name']) for r in batch],
+                                              batch_size=batch_size)['created']
+        elif kind == 'uses_template':
+            pairs = [(entry_id(r['entry_id']), state['templates'][r['template_id']]) for r in batch]
+            summary['uses_template'] += db.assign_templates(pairs, batch_size=batch_size)['created']
+        elif kind == 'link':
+            pairs = [(entry_id(r['source']), entry_id(r['target'])) for r in batch]
+            summary['links'] += db.link_entries(pairs, batch_size=batch_size)['created']
+        state['batch'] = []
+        save(state['applied'])
+
+    def start_capsule(record, index):
+        capsule_id = checkpoint.get('capsule_id')
+        if capsule_id is None:
+            capsule_id = record['id'] if ids == 'preserve' else str(uuid.uuid4())
+            if db.get_capsule_by_id(capsule_id) is not None:
+                raise ValueError(f'capsule {capsule_id} already exists')
+            # Recorded before the capsule is created, so a retry finds it
+            checkpoint['capsule_id'] = summary['capsule_id'] = capsule_id
+            checkpoint['import_id'] = uuid.uuid4().hex
+            save(index)
+        if db.get_capsule_by_id(capsule_id) is None:
+            # Imported entries are all written in the target layout, so a migration is already finished
+            storage_mode = 'native' if record.get('storage_mode') == MIGRATING else record.get('storage_mode')
+            db.create_capsule(record['name'], record.get('description'), datetime.fromisoformat(record['created_at']),
+                              record.get('fields') or [], storage_mode=storage_mode, capsule_id=capsule_id,
+                              import_id=checkpoint['import_id'])
+        save(index + 1)
+
+    index = -1
+    finished = False
+    try:
+        for index, record in enumerate(records):
+            kind = record['type']
+            if index == 0:
+                if kind != 'header' or record.get('format') != FORMAT:
+                    raise ValueError('not a capsule archive (missing header)')
+                if record.get('version') != VERSION:
+                    raise ValueError(f"unsupported archive version {record.get('version')}")
+            elif kind == 'capsule':
+                if index >= resume_from:
+                    start_capsule(record, index)
+                state['capsule'] = True
+                if ids == 'remap':
+                    state['namespace'] = uuid.UUID(checkpoint['capsule_id'])
+            elif kind == 'template':
+                # Replayed even when resuming: later uses_template records need the mapping
+                state['templates'][record['id']] = db.create_template(record['name'], record.get('structure'))
+                if index >= resume_from:
+                    summary['templates'] += 1
+            elif kind == 'end':
+                flush()
+                state['applied'] = index + 1
+                save(index + 1)
+                finished = True
+                break
+            elif kind in BATCHED_RECORDS:
+                if not state['capsule']:
+                    raise ValueError(f'record {index + 1}: {kind} record before the capsule record')
+                missing = [key for key in BATCHED_RECORDS[kind] if record.get(key) is None]
+                if missing:
+                    raise ValueError(f"record {index + 1}: {kind} record without {', '.join(missing)}")
+                if kind == 'uses_template' and record['template_id'] not in state['templates']:
+                    raise ValueError(f'record {index + 1}: template {record["template_id"]} is not in the archive')
+                if index < resume_from:
+                    continue
+                if kind != state['kind'] or len(state['batch']) >= batch_size:
+                    flush()
+                    state['kind'] = kind
+                state['batch'].append(record)
+                state['applied'] = index + 1
+            else:
+                raise ValueError(f'record {index + 1}: unknown record type {kind!r}')
+        if not finished:
+            flush()
+    except Exception as e:
+        if not checkpoint.get('capsule_id'):
+            raise
+        raise ImportInterrupted(f"import stopped after {checkpoint['records']} records: {e}", checkpoint) from e
+    if not finished:
+        raise ImportInterrupted(f'archive ended after {index + 1} records without its end record', checkpoint)
+    summary['records'] = index + 1
+    return summary
@@ -0,0 +1,156 @@
+"""ASGI entry point for Recall.
+
+    uvicorn asgi:application --app-dir src/backend
+
+Hot read routes are answered on the event loop through async_db (capsule
+metadata and entries, or an entry with its tags, links and template, are
+fetched concurrently). They send the same ETags as their Flask views (see
+http_cache.py), answer If-None-Match with 304, share the response body
+cache and report X-DB-* headers. Every other request falls through to the
+Flask app, wrapped with asgiref's WsgiToAsgi, so the sync API keeps working
+unchanged.
+"""
+from urllib.parse import parse_qs
+from asgiref.wsgi import WsgiToAsgi
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import parse_etags
+import async_db
+import metrics
+from cache import get_response_cache
+from controllers.entry_controller import ENTRY_DETAIL_SCOPES
+from http_cache import scope_etag
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor
+from recall import app
+
+wsgi_application = WsgiToAsgi(app)
+url_adapter = app.url_map.bind('localhost')
+
+
+async def _send(send, status, body=b'', headers=()):
+    headers = [(b'content-length', str(len(body)).encode())] + list(headers)
+    stats = metrics.request_stats()
+    if stats is not None:
+        headers += [(name.lower().encode(), value.encode()) for name, value in metrics.stats_headers(stats).items()]
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def _json_body(payload):
+    """Encode a payload byte for byte as the Flask views' jsonify does, so an ETag names the same body."""
+    return app.json.response(payload).get_data()
+
+
+async def _send_json(send, status, payload):
+    body = _json_body(payload)
+    await _send(send, status, body, [(b'content-type', b'application/json')])
+
+
+async def _conditional_json(send, request_headers, scope, build, variant=''):
+    """ASGI counterpart of http_cache.conditional_json; `build` is a coroutine function.
+
+    `build` returns the payload dict, or None after sending an error response itself.
+    """
+    etag = scope_etag(scope, variant)
+    etag_headers = [(b'etag', f'"{etag}"'.encode()), (b'cache-control', b'no-cache')]
+    if parse_etags(request_headers.get(b'if-none-match', b'').decode('latin-1')).contains(etag):
+        return await _send(send, 304, headers=etag_headers)
+    cache = get_response_cache()
+    body = cache.get(etag) if cache is not None else None
+    if body is None:
+        payload = await build()
+        if payload is None:
+            return
+        body = _json_body(payload)
+        if cache is not None:
+            cache.set(etag, body)
+    await _send(send, 200, body, [(b'content-type', b'application/json')] + etag_headers)
+
+
+async def get_capsule(send, headers, query, capsule_id):
+    after = query.get('after')
+    limit = query.get('limit')
+    try:
+        if after:
+            decode_cursor(after, 2)
+        if limit is not None:
+            limit = int(limit) if limit.isdigit() else 0
+            if not 1 <= limit <= MAX_PAGE_SIZE:
+                raise ValueError(f"'limit' must be between 1 and {MAX_PAGE_SIZE}")
+    except ValueError as e:
+        return await _send_json(send, 400, {'error': str(e)})
+
+    async def build():
+        capsule, entries, next_cursor = await async_db.get_capsule_with_entries(
+            capsule_id, limit=limit or (DEFAULT_PAGE_SIZE if after else None), after=after
+        )
+        if capsule is None:
+            return await _send_json(send, 404, {'error': 'Capsule not found'})
+        payload = {
+            'capsule_id': capsule_id,
+            'capsule_name': capsule['name'],
+            'description': capsule['description'],
+            'entries': entries,
+        }
+        if limit is not None or after is not None:
+            payload['next_cursor'] = next_cursor
+        return payload
+    # Same variant as the Flask view, so both paths share ETags and cached bodies
+    await _conditional_json(send, headers, capsule_id, build, variant=f'{limit}:{after}')
+
+
+async def get_entry(send, headers, query, entry_id):
+    async def build():
+        details = await async_db.get_entry_details(entry_id)
+        if details is None:
+            return await _send_json(send, 404, {'error': 'Entry not found'})
+        return details
+    await _conditional_json(send, headers, ENTRY_DETAIL_SCOPES, build, variant=f'entry:{entry_id}')
+
+
+# Flask endpoints answered natively on the event loop.
+ASYNC_HANDLERS = {
+    'capsule_bp.api_get_capsule': get_capsule,
+    'entry_bp.api_get_entry': get_entry,
+}
+
+
+def _route(scope):
+    """Return `(handler, rule, query, view_args)` for requests served natively, else None."""
+    if scope['method'] != 'GET':
+        return None
+    try:
+        rule, view_args = url_adapter.match(scope['path'], method='GET', return_rule=True)
+    except HTTPException:
+        return None
+    handler = ASYNC_HANDLERS.get(rule.endpoint)
+    query = {key: values[-1] for key, values in parse_qs(scope.get('query_string', b'').decode()).items()}
+    if handler is None or 'stream' in query:
+        return None
+    return handler, rule.rule, query, view_args
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await async_db.close()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await _lifespan(receive, send)
+    if scope['type'] == 'http':
+        route = _route(scope)
+        if route is not None:
+            handler, rule, query, view_args = route
+            if metrics.metrics_enabled():
+                metrics.begin_request(rule)
+            try:
+                return await handler(send, dict(scope.get('headers', [])), query, **view_args)
+            finally:
+                metrics.end_request()
+    return await wsgi_application(scope, receive, send)
@@ -0,0 +1,50 @@
+import asyncio
+from cache import get_capsule_cache
+from metrics import instrument_module
+from storage import get_async_backend
+
+# Async variant of the read side of db.py for the ASGI entry point (asgi.py).
+# Independent queries are issued concurrently instead of one after another.
+
+async def get_capsule_by_id(capsule_id):
+    """Return a capsule record (fields parsed), sharing db.py's capsule cache."""
+    return await get_capsule_cache().get_or_load_async(capsule_id, get_async_backend().get_capsule)
+
+async def get_all_capsules():
+    return await get_async_backend().get_all_capsules()
+
+async def get_capsule_with_entries(capsule_id, limit=None, after=None):
+    """Fetch capsule metadata and its entries concurrently.
+
+    Returns `(capsule, entries, next_cursor)`; entries are paged by
+    (timestamp, id) when `limit` or `after` is given, otherwise all are returned.
+    """
+    backend = get_async_backend()
+    if limit is None and after is None:
+        entries_call = backend.get_entries_by_capsule(capsule_id)
+    else:
+        entries_call = backend.get_entries_page(capsule_id, limit, after=after)
+    capsule, entries = await asyncio.gather(get_capsule_by_id(capsule_id), entries_call)
+    if capsule is None:
+        return None, [], None
+    if isinstance(entries, tuple):
+        return capsule, entries[0], entries[1]
+    return capsule, entries, None
+
+async def get_entry_details(entry_id):
+    """Fetch an entry with its tags, outgoing links and template in one concurrent round."""
+    backend = get_async_backend()
+    entry, tags, linked, template = await asyncio.gather(
+        backend.get_entry_by_id(entry_id),
+        backend.get_tags_for_entry(entry_id),
+        backend.get_linked_entries(entry_id),
+        backend.get_template_for_entry(entry_id),
+    )
+    if entry is None:
+        return None
+    return {'entry': entry, 'tags': tags, 'linked_entries': linked, 'template': template}
+
+async def close():
+    await get_async_backend().close()
+
+instrument_module(globals(), exclude=('close',))
@@ -0,0 +1,358 @@
+from collections import OrderedDict
+import copy
+import json
+import os
+import threading
+import time
+import uuid
+
+DEFAULT_CAPSULE_CACHE_SIZE = 1024
+DEFAULT_CAPSULE_CACHE_TTL = 300.0
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe LRU cache whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, maxsize, ttl=None, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                self.misses += 1
+                return default
+            value, expires_at = item
+            if expires_at is not None and expires_at <= self._clock():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        expires_at = self._clock() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': 'local',
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+
+class RedisCache:
+    """Shared cache backend so every worker process sees the same entries.
+
+    Requires the optional `redis` package. Values are stored as JSON under
+    `prefix`; expiry and eviction are left to Redis (`ttl` and its maxmemory
+    policy), so only this process's hit/miss counters are reported.
+    """
+
+    def __init__(self, url, ttl=None, prefix='recall:'):
+        import redis
+        self._client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        raw = self._client.get(self.prefix + key)
+        if raw is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return json.loads(raw)
+
+    def set(self, key, value):
+        self._client.set(self.prefix + key, json.dumps(value, default=str), ex=int(self.ttl) if self.ttl else None)
+
+    def delete(self, key):
+        self._client.delete(self.prefix + key)
+
+    def clear(self):
+        keys = list(self._client.scan_iter(match=self.prefix + '*'))
+        if keys:
+            self._client.delete(*keys)
+
+    def stats(self):
+        return {'backend': 'redis', 'ttl': self.ttl, 'hits': self.hits, 'misses': self.misses}
+
+
+class ReadThroughCache:
+    """Read-through wrapper over a cache backend for records loaded from the db.
+
+    Missing records (loader returned None) are not cached. Callers get a copy,
+    so mutating a returned record never changes the cached one.
+    """
+
+    def __init__(self, backend, namespace):
+        self.backend = backend
+        self.namespace = namespace
+
+    def _key(self, key):
+        return f'{self.namespace}:{key}'
+
+    def get_or_load(self, key, loader):
+        value = self.backend.get(self._key(key), _MISSING)
+        if value is _MISSING:
+            value = loader(key)
+            if value is None:
+                return None
+            self.backend.set(self._key(key), value)
+        return copy.deepcopy(value)
+
+    async def get_or_load_async(self, key, loader):
+        """Like get_or_load, for a coroutine loader."""
+        value = self.backend.get(self._key(key), _MISSING)
+        if value is _MISSING:
+            value = await loader(key)
+            if value is None:
+                return None
+            self.backend.set(self._key(key), value)
+        return copy.deepcopy(value)
+
+    def invalidate(self, key):
+        self.backend.delete(self._key(key))
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        return self.backend.stats()
+
+
+def make_backend(maxsize, ttl):
+    """Build the cache backend: Redis when RECALL_CACHE_URL is set, else a local LRU."""
+    url = os.getenv('RECALL_CACHE_URL')
+    if url:
+        return RedisCache(url, ttl=ttl)
+    return LRUCache(maxsize, ttl=ttl)
+
+
+_capsule_cache = None
+_capsule_cache_lock = threading.Lock()
+
+
+def get_capsule_cache():
+    """Return the process-wide cache of capsule records (with parsed `fields`)."""
+    global _capsule_cache
+    if _capsule_cache is None:
+        with _capsule_cache_lock:
+            if _capsule_cache is None:
+                backend = make_backend(
+                    int(os.getenv('RECALL_CAPSULE_CACHE_SIZE', DEFAULT_CAPSULE_CACHE_SIZE)),
+                    float(os.getenv('RECALL_CAPSULE_CACHE_TTL', DEFAULT_CAPSULE_CACHE_TTL)),
+                )
+                _capsule_cache = ReadThroughCache(backend, 'capsule')
+    return _capsule_cache
+
+
+# Version scopes besides capsule ids (see VersionCounters).
+CAPSULE_LIST = 'capsules'
+LINKS = 'links'
+TAGS = 'tags'
+TEMPLATES = 'templates'
+SNAPSHOTS = 'snapshots'
+
+
+DEFAULT_VERSION_TTL = 60.0
+
+
+class VersionCounters:
+    """Change counters per scope, from which response ETags are derived without reading the db.
+
+    A scope is a capsule id or one of CAPSULE_LIST, LINKS, TAGS, TEMPLATES,
+    SNAPSHOTS. Writes bump the scopes they change; `bump()` with no scopes
+    advances the epoch, which changes every scope's version (for writes whose
+    capsule is not known). Versions include a per-process `instance` token, so
+    a tag issued by one worker never validates against another worker's
+    counters.
+
+    These counters only see this process's writes: other workers and the CLIs
+    (archive imports, purges, compaction) write without bumping them. So that
+    their changes still show up, every version also changes each `ttl`
+    seconds (0 disables this). Deployments with more than one writer should
+    set RECALL_CACHE_URL to share counters through RedisVersionCounters.
+    """
+
+    def __init__(self, ttl=None, clock=time.monotonic):
+        self.instance = uuid.uuid4().hex[:12]
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.epoch = 0
+        self._counters = {}
+
+    def bump(self, *scopes):
+        with self._lock:
+            if not scopes:
+                self.epoch += 1
+            for scope in scopes:
+                self._counters[scope] = self._counters.get(scope, 0) + 1
+
+    def version(self, scope):
+        window = int(self._clock() // self.ttl) if self.ttl else 0
+        with self._lock:
+            return f'{self.instance}.{window}.{self.epoch}.{self._counters.get(scope, 0)}'
+
+    def clear(self):
+        self.bump()
+
+
+class RedisVersionCounters:
+    """VersionCounters kept in Redis, shared by every worker process (requires `redis`)."""
+
+    def __init__(self, url, prefix='recall:version:'):
+        import redis
+        self._client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def bump(self, *scopes):
+        pipeline = self._client.pipeline()
+        for key in [self.prefix + scope for scope in scopes] or [self.prefix + '*epoch']:
+            pipeline.incr(key)
+        pipeline.execute()
+
+    def version(self, scope):
+        epoch, counter = self._client.mget(self.prefix + '*epoch', self.prefix + scope)
+        return f'{int(epoch or 0)}.{int(counter or 0)}'
+
+    def clear(self):
+        self.bump()
+
+
+_versions = None
+_versions_lock = threading.Lock()
+
+
+def get_versions():
+    """Return the process-wide version counters: in Redis when RECALL_CACHE_URL is set, else local.
+
+    Local versions roll over every RECALL_VERSION_TTL seconds (see VersionCounters).
+    """
+    global _versions
+    if _versions is None:
+        with _versions_lock:
+            if _versions is None:
+                url = os.getenv('RECALL_CACHE_URL')
+                if url:
+                    _versions = RedisVersionCounters(url)
+                else:
+                    _versions = VersionCounters(ttl=float(os.getenv('RECALL_VERSION_TTL', DEFAULT_VERSION_TTL)))
+    return _versions
+
+
+class ResponseCache:
+    """LRU of serialized response bodies keyed by ETag, bounded by their total size in bytes.
+
+    Entries are never invalidated: a write changes the ETag a request maps to,
+    and bodies for stale tags age out. With local version counters tags also
+    change every RECALL_VERSION_TTL seconds, which bounds how long a body
+    written around this process is served. Bodies over `max_body_bytes` are
+    not kept.
+    """
+
+    def __init__(self, max_bytes, max_body_bytes=None):
+        self.max_bytes = max_bytes
+        self.max_body_bytes = max_body_bytes if max_body_bytes is not None else max_bytes
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, etag):
+        with self._lock:
+            body = self._data.get(etag)
+            if body is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(etag)
+            self.hits += 1
+            return body
+
+    def set(self, etag, body):
+        if len(body) > self.max_body_bytes:
+            return
+        with self._lock:
+            previous = self._data.pop(etag, None)
+            self.size += len(body) - (len(previous) if previous is not None else 0)
+            self._data[etag] = body
+            while self.size > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._data),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+DEFAULT_RESPONSE_CACHE_BYTES = 32 * 1024 * 1024
+DEFAULT_RESPONSE_CACHE_MAX_BODY_BYTES = 2 * 1024 * 1024
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Return the process-wide response body cache (None when RECALL_RESPONSE_CACHE_BYTES is 0)."""
+    global _response_cache
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                _response_cache = ResponseCache(
+                    int(os.getenv('RECALL_RESPONSE_CACHE_BYTES', DEFAULT_RESPONSE_CACHE_BYTES)),
+                    int(os.getenv('RECALL_RESPONSE_CACHE_MAX_BODY_BYTES', DEFAULT_RESPONSE_CACHE_MAX_BODY_BYTES)),
+                )
+    return _response_cache if _response_cache.max_bytes > 0 else None
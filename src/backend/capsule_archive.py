@@ -0,0 +1,89 @@
+"""Export a capsule to an NDJSON archive file or import one (see archive.py).
+
+    python src/backend/capsule_archive.py export <capsule_id> -o capsule.ndjson.gz --compress gzip
+    python src/backend/capsule_archive.py import capsule.ndjson.gz [--ids preserve] [--batch-size 5000]
+
+Imports write a checkpoint next to the archive (`<archive>.checkpoint`, or
+--checkpoint) after every batch; running the same import again resumes
+from it. The checkpoint is removed once the import completes.
+"""
+import argparse
+import json
+import os
+import sys
+import db
+from archive import (
+    CODECS, DEFAULT_IMPORT_BATCH_SIZE, ID_MODES, ImportInterrupted, export_archive, import_archive, iter_records
+)
+
+
+def export_command(args):
+    capsule = db.get_capsule_by_id(args.capsule_id)
+    if capsule is None:
+        sys.exit(f'No capsule {args.capsule_id}')
+    codec = args.compress
+    if codec is None and args.output.endswith('.gz'):
+        codec = 'gzip'
+    elif codec is None and args.output.endswith('.zst'):
+        codec = 'zstd'
+    written = 0
+    with open(args.output, 'wb') as out:
+        for chunk in export_archive(capsule, codec):
+            out.write(chunk)
+            written += len(chunk)
+    print(f"[Recall] Exported capsule {args.capsule_id} to {args.output} ({written} bytes)")
+
+
+def import_command(args):
+    checkpoint_path = args.checkpoint or args.archive + '.checkpoint'
+    checkpoint = None
+    if os.path.exists(checkpoint_path):
+        with open(checkpoint_path, encoding='utf-8') as f:
+            checkpoint = json.load(f)
+        print(f"[Recall] Resuming into capsule {checkpoint['capsule_id']} after {checkpoint['records']} records")
+
+    def save(state):
+        with open(checkpoint_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(checkpoint_path + '.tmp', checkpoint_path)
+
+    with open(args.archive, 'rb') as stream:
+        try:
+            summary = import_archive(iter_records(stream), ids=args.ids, batch_size=args.batch_size,
+                                     checkpoint=checkpoint, on_checkpoint=save)
+        except ImportInterrupted as e:
+            save(e.checkpoint)
+            sys.exit(f'[Recall] {e}; run the same command again to resume (checkpoint in {checkpoint_path})')
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    print(f"[Recall] Imported capsule {summary['capsule_id']}: {summary['entries']} entries, "
+          f"{summary['snapshots']} snapshots, {summary['tags']} tags, {summary['links']} links")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    export_parser = commands.add_parser('export', help='write a capsule archive')
+    export_parser.add_argument('capsule_id')
+    export_parser.add_argument('-o', '--output', required=True)
+    export_parser.add_argument('--compress', choices=CODECS, help='default: from the .gz/.zst file extension')
+    import_parser = commands.add_parser('import', help='create a capsule from an archive')
+    import_parser.add_argument('archive')
+    import_parser.add_argument('--ids', choices=ID_MODES, default='remap')
+    import_parser.add_argument('--batch-size', type=int, default=DEFAULT_IMPORT_BATCH_SIZE)
+    import_parser.add_argument('--checkpoint', help='checkpoint file (default: <archive>.checkpoint)')
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'export':
+            export_command(args)
+        else:
+            import_command(args)
+    except ValueError as e:
+        sys.exit(f'[Recall] {e}')
+    finally:
+        db.close_backend()
+
+
+if __name__ == '__main__':
+    main()
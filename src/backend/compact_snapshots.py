@@ -0,0 +1,32 @@
+"""Compact snapshot histories by folding old versions into a keyframe.
+
+    python src/backend/compact_snapshots.py --keep 100               # every entry with > 100 versions
+    python src/backend/compact_snapshots.py --keep 100 --entry <id>  # one entry
+
+Each entry is compacted in its own transaction.
+"""
+import argparse
+import db
+from storage import get_backend
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--keep', type=int, required=True, help='most recent versions to keep per entry')
+    parser.add_argument('--entry', action='append', help='entry id (repeatable); default is every entry over --keep')
+    args = parser.parse_args()
+
+    entry_ids = args.entry or get_backend().get_entries_with_snapshot_history(args.keep)
+    removed = 0
+    try:
+        for entry_id in entry_ids:
+            count = db.compact_snapshots(entry_id, args.keep)
+            removed += count
+            print(f"[Recall] {entry_id}: {count} snapshots compacted")
+    finally:
+        db.close_backend()
+    print(f"[Recall] Removed {removed} snapshots across {len(entry_ids)} entries")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,22 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from db import (
-    create_capsule, get_all_capsules, get_capsule_by_id, delete_capsule,
-    create_entry, get_entries_by_capsule, get_entry_by_id, delete_entry
+    create_capsule, get_all_capsules, get_capsule_by_id,
+    create_entry, get_entries_by_capsule, get_entry_by_id, delete_entry,
+    get_entries_page, iter_entries_by_capsule, get_entries_filtered,
+    count_entries_by_bucket, aggregate_entries
 )
+from aggregation import group_name, parse_aggregation
+from archive import (
+    DEFAULT_IMPORT_BATCH_SIZE, ID_MODES, MAX_IMPORT_BATCH_SIZE, ImportInterrupted,
+    check_codec, export_archive, import_archive, iter_records
+)
+from cache import CAPSULE_LIST, TAGS, get_versions
+from deletion import delete_capsule_in_background, get_deletion_jobs
+from filters import BUCKETS, parse_filters, parse_time_range
+from http_cache import conditional_json
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor
+from ingest import DEFAULT_BATCH_SIZE, MAX_BATCH_SIZE, ingest_entries, iter_ndjson
+from write_buffer import RETRY_AFTER_SECONDS, BufferFull, get_write_buffer
 from datetime import datetime, UTC
 import json
 
@@ -30,35 +44,386 @@ def api_get_all_capsules():
                     type: string
                   name:
                     type: string
+      304:
+        description: Unchanged since the ETag sent in If-None-Match
     """
-    capsules = get_all_capsules()
-    result = [
-        {'id': row['id'], 'name': row['name']} for row in capsules
-    ]
-    return jsonify({'capsules': result})
+    def build():
+        capsules = get_all_capsules()
+        return {'capsules': [{'id': row['id'], 'name': row['name']} for row in capsules]}
+    return conditional_json(CAPSULE_LIST, build)
+
+STREAM_FORMATS = ('json', 'ndjson')
+
+def _stream_entries(capsule, after, stream_format):
+    """Serialize a capsule's entries incrementally from the db cursor."""
+    entries = iter_entries_by_capsule(capsule['id'], after=after)
+    if stream_format == 'ndjson':
+        for entry in entries:
+            yield json.dumps(dict(entry), default=str) + '\n'
+        return
+    header = {
+        'capsule_id': capsule['id'],
+        'capsule_name': capsule['name'],
+        'description': capsule['description'],
+    }
+    yield json.dumps(header, default=str)[:-1] + ', "entries": ['
+    separator = ''
+    for entry in entries:
+        yield separator + json.dumps(dict(entry), default=str)
+        separator = ', '
+    yield ']}'
 
 @capsule_bp.route('/api/capsule/<capsule_id>', methods=['GET'])
 def api_get_capsule(capsule_id):
+    """
+    Get a capsule and its entries
+    ---
+    tags:
+      - Capsules
+    parameters:
+      - name: capsule_id
+        in: path
+        type: string
+        required: true
+      - name: limit
+        in: query
+        type: integer
+        description: Page size (max 1000); enables keyset pagination ordered by timestamp, id
+      - name: after
+        in: query
+        type: string
+        description: Cursor from the previous page's next_cursor
+      - name: stream
+        in: query
+        type: string
+        enum: [json, ndjson]
+        description: Stream all entries (from `after`, if given) as a chunked JSON document or NDJSON
+    responses:
+      200:
+        description: Capsule with entries (and next_cursor when paginated)
+      304:
+        description: Unchanged since the ETag sent in If-None-Match (not for streams)
+      400:
+        description: Invalid limit, cursor or stream format
+      404:
+        description: Capsule not found
+    """
+    after = request.args.get('after')
+    limit = request.args.get('limit')
+    stream_format = request.args.get('stream')
+    try:
+        if after:
+            decode_cursor(after, 2)
+        if stream_format is not None and stream_format not in STREAM_FORMATS:
+            raise ValueError(f"stream must be one of {', '.join(STREAM_FORMATS)}")
+        if limit is not None:
+            limit = int(limit) if limit.isdigit() else 0
+            if not 1 <= limit <= MAX_PAGE_SIZE:
+                raise ValueError(f"'limit' must be between 1 and {MAX_PAGE_SIZE}")
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if stream_format:
+        capsule = get_capsule_by_id(capsule_id)
+        if not capsule:
+            return jsonify({'error': 'Capsule not found'}), 404
+        mimetype = 'application/x-ndjson' if stream_format == 'ndjson' else 'application/json'
+        return Response(stream_with_context(_stream_entries(capsule, after, stream_format)), mimetype=mimetype)
+
+    def build():
+        capsule = get_capsule_by_id(capsule_id)
+        if not capsule:
+            return jsonify({'error': 'Capsule not found'}), 404
+        payload = {
+            'capsule_id': capsule_id,
+            'capsule_name': capsule['name'],
+            'description': capsule['description'],
+        }
+        if limit is None and after is None:
+            payload['entries'] = [dict(entry) for entry in get_entries_by_capsule(capsule_id)]
+        else:
+            entries, next_cursor = get_entries_page(capsule_id, limit=limit or DEFAULT_PAGE_SIZE, after=after)
+            payload['entries'] = [dict(entry) for entry in entries]
+            payload['next_cursor'] = next_cursor
+        return payload
+    return conditional_json(capsule_id, build, variant=f'{limit}:{after}')
+
+FILTER_RESERVED_PARAMS = ('limit', 'after', 'from', 'to')
+
+@capsule_bp.route('/api/capsule/<capsule_id>/entries', methods=['GET'])
+def api_filter_entries(capsule_id):
+    """
+    Filter a capsule's entries by field values
+    ---
+    tags:
+      - Entries
+    description: >
+      Every other query term is a filter on a declared field, written
+      `field<op>value` with op one of =, !=, >, <, >=, <= (e.g.
+      `?temperature>30&ok=true`). Terms are ANDed; results are ordered by
+      timestamp, id. `from` and `to` bound the entry timestamp.
+    parameters:
+      - name: capsule_id
+        in: path
+        type: string
+        required: true
+      - name: limit
+        in: query
+        type: integer
+        description: Page size (default 100, max 1000)
+      - name: after
+        in: query
+        type: string
+        description: Cursor from the previous page's next_cursor
+      - name: from
+        in: query
+        type: string
+        description: ISO-8601 timestamp, inclusive (naive values are UTC)
+      - name: to
+        in: query
+        type: string
+        description: ISO-8601 timestamp, exclusive (naive values are UTC)
+    responses:
+      200:
+        description: Matching entries and next_cursor
+      400:
+        description: Unknown field, bad operator or value, invalid time range, limit or cursor
+      404:
+        description: Capsule not found
+    """
     capsule = get_capsule_by_id(capsule_id)
     if not capsule:
         return jsonify({'error': 'Capsule not found'}), 404
-    entries = get_entries_by_capsule(capsule_id)
+    after = request.args.get('after')
+    limit = request.args.get('limit', str(DEFAULT_PAGE_SIZE))
+    try:
+        if after:
+            decode_cursor(after, 2)
+        limit = int(limit) if limit.isdigit() else 0
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            raise ValueError(f"'limit' must be between 1 and {MAX_PAGE_SIZE}")
+        filters = parse_filters(request.query_string.decode(), capsule.get('fields'), FILTER_RESERVED_PARAMS)
+        start, end = parse_time_range(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    entries, next_cursor = get_entries_filtered(capsule_id, filters, limit=limit, after=after, start=start, end=end)
     return jsonify({
         'capsule_id': capsule_id,
-        'capsule_name': capsule['name'],
-        'description': capsule['description'],
-        'entries': [dict(entry) for entry in entries]
+        'entries': [dict(entry) for entry in entries],
+        'next_cursor': next_cursor,
     })
 
+@capsule_bp.route('/api/capsule/<capsule_id>/timeline', methods=['GET'])
+def api_capsule_timeline(capsule_id):
+    """
+    Count a capsule's entries per hour or day
+    ---
+    tags:
+      - Entries
+    parameters:
+      - name: capsule_id
+        in: path
+        type: string
+        required: true
+      - name: bucket
+        in: query
+        type: string
+        enum: [hour, day]
+        description: UTC bucket width (default day)
+      - name: from
+        in: query
+        type: string
+        description: ISO-8601 timestamp, inclusive
+      - name: to
+        in: query
+        type: string
+        description: ISO-8601 timestamp, exclusive
+    responses:
+      200:
+        description: Non-empty buckets in time order, each with its start and count
+      304:
+        description: Not modified since the ETag in If-None-Match
+      400:
+        description: Unknown bucket or invalid time range
+      404:
+        description: Capsule not found
+    """
+    bucket = request.args.get('bucket', 'day')
+    try:
+        if bucket not in BUCKETS:
+            raise ValueError(f"'bucket' must be one of {', '.join(BUCKETS)}")
+        start, end = parse_time_range(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    def build():
+        if not get_capsule_by_id(capsule_id):
+            return jsonify({'error': 'Capsule not found'}), 404
+        buckets = count_entries_by_bucket(capsule_id, bucket, start=start, end=end)
+        return {
+            'capsule_id': capsule_id,
+            'bucket': bucket,
+            'from': start.isoformat() if start else None,
+            'to': end.isoformat() if end else None,
+            'buckets': buckets,
+            'total': sum(item['count'] for item in buckets),
+        }
+    return conditional_json(capsule_id, build, variant=f'timeline:{bucket}:{start}:{end}')
+
+@capsule_bp.route('/api/capsule/<capsule_id>/aggregate', methods=['GET'])
+def api_aggregate_entries(capsule_id):
+    """
+    Grouped statistics over a capsule's int and boolean fields
+    ---
+    tags:
+      - Entries
+    description: >
+      For each group, the number of entries and per field the count, sum,
+      avg, min and max of its typed values (booleans count as 0/1). Groups
+      are ordered by key, with the null group (no value, no tag) last.
+    parameters:
+      - name: capsule_id
+        in: path
+        type: string
+        required: true
+      - name: field
+        in: query
+        type: array
+        items:
+          type: string
+        collectionFormat: multi
+        description: Declared int/boolean fields to aggregate (default all of them)
+      - name: group_by
+        in: query
+        type: string
+        description: tag, hour, day or a declared field name (default no grouping)
+      - name: from
+        in: query
+        type: string
+        description: ISO-8601 timestamp, inclusive
+      - name: to
+        in: query
+        type: string
+        description: ISO-8601 timestamp, exclusive
+    responses:
+      200:
+        description: Groups with their key, entry count and per-field statistics
+      304:
+        description: Not modified since the ETag in If-None-Match
+      400:
+        description: Unknown or non-numeric field, bad group_by or time range
+      404:
+        description: Capsule not found
+    """
+    capsule = get_capsule_by_id(capsule_id)
+    if not capsule:
+        return jsonify({'error': 'Capsule not found'}), 404
+    try:
+        columns, group_by = parse_aggregation(request.args, capsule.get('fields'))
+        start, end = parse_time_range(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    names = [name for name, _ in columns]
+    group = group_name(group_by)
+
+    def build():
+        return {
+            'capsule_id': capsule_id,
+            'fields': names,
+            'group_by': group,
+            'from': start.isoformat() if start else None,
+            'to': end.isoformat() if end else None,
+            'groups': aggregate_entries(capsule_id, columns, group_by, start=start, end=end),
+        }
+    variant = f"aggregate:{','.join(names)}:{group}:{start}:{end}"
+    if group == 'tag':
+        # Tagging bumps the tag scope, not the capsule's
+        variant += f':{get_versions().version(TAGS)}'
+    return conditional_json(capsule_id, build, variant=variant)
+
 @capsule_bp.route('/api/capsule/<capsule_id>/add_entry', methods=['POST'])
 def api_add_entry(capsule_id):
     capsule = get_capsule_by_id(capsule_id)
     if not capsule:
         return jsonify({'error': 'Capsule not found'}), 404
     properties = request.json.get('properties', '{}')
+    buffer = get_write_buffer()
+    if buffer is not None:
+        try:
+            buffer.add_entry(capsule_id, datetime.now(UTC), json.dumps(properties))
+        except BufferFull as e:
+            return jsonify({'error': str(e)}), 429, {'Retry-After': str(RETRY_AFTER_SECONDS)}
+        return jsonify({'success': True, 'queued': True}), 202
     create_entry(capsule_id, datetime.now(UTC), json.dumps(properties))
     return jsonify({'success': True})
 
+@capsule_bp.route('/api/capsule/<capsule_id>/entries/bulk', methods=['POST'])
+def api_bulk_add_entries(capsule_id):
+    """
+    Bulk-create entries in a capsule
+    ---
+    tags:
+      - Entries
+    consumes:
+      - application/json
+      - application/x-ndjson
+    parameters:
+      - name: capsule_id
+        in: path
+        type: string
+        required: true
+      - name: batch_size
+        in: query
+        type: integer
+        description: Entries written per transaction (default 2000, max 20000)
+      - name: progress
+        in: query
+        type: string
+        enum: [ndjson]
+        description: Stream one progress event per batch instead of a single summary
+      - name: body
+        in: body
+        required: true
+        description: JSON array (or NDJSON lines) of {"properties": {...}, "timestamp": "..."} or bare property objects
+    responses:
+      200:
+        description: Summary with per-batch progress and per-row validation errors
+      400:
+        description: Malformed body or batch_size
+      404:
+        description: Capsule not found
+    """
+    capsule = get_capsule_by_id(capsule_id)
+    if not capsule:
+        return jsonify({'error': 'Capsule not found'}), 404
+    batch_size = request.args.get('batch_size', str(DEFAULT_BATCH_SIZE))
+    if not batch_size.isdigit() or not 1 <= int(batch_size) <= MAX_BATCH_SIZE:
+        return jsonify({'error': f"'batch_size' must be between 1 and {MAX_BATCH_SIZE}"}), 400
+    if request.mimetype == 'application/x-ndjson':
+        records = iter_ndjson(request.stream)
+    else:
+        body = request.get_json(silent=True)
+        if isinstance(body, dict):
+            body = body.get('entries')
+        if not isinstance(body, list):
+            return jsonify({'error': 'Expected a JSON array of entries'}), 400
+        records = body
+    events = ingest_entries(capsule, records, batch_size=int(batch_size))
+    if request.args.get('progress') == 'ndjson':
+        return Response(
+            stream_with_context(json.dumps(event) + '\n' for event in events),
+            mimetype='application/x-ndjson'
+        )
+    summary = {'batches': [], 'errors': []}
+    for event in events:
+        kind = event.pop('event')
+        if kind == 'batch':
+            summary['batches'].append(event)
+        elif kind == 'error':
+            summary['errors'].append(event)
+        else:
+            summary.update(event)
+    return jsonify(summary)
+
 @capsule_bp.route('/api/capsule/<capsule_id>/delete_entry', methods=['POST'])
 def api_delete_entry(capsule_id):
     """
@@ -111,6 +476,10 @@ def api_delete_capsule(capsule_id):
     ---
     tags:
       - Capsules
+    description: >
+      The capsule disappears from every read immediately; its entries and
+      their snapshots are then removed in batches by a background job whose
+      progress is reported by GET on the same URL.
     parameters:
       - name: capsule_id
         in: path
@@ -119,12 +488,14 @@ def api_delete_capsule(capsule_id):
         description: ID of the capsule to delete
     responses:
       200:
-        description: Capsule deleted successfully
+        description: Capsule deleted; entries are being purged
         schema:
           type: object
           properties:
             success:
               type: boolean
+            job:
+              type: object
       404:
         description: Capsule not found
         schema:
@@ -133,8 +504,150 @@ def api_delete_capsule(capsule_id):
             error:
               type: string
     """
+    job = delete_capsule_in_background(capsule_id)
+    if job is None:
+        return jsonify({'error': 'Capsule not found'}), 404
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+@capsule_bp.route('/api/capsule/<capsule_id>/delete', methods=['GET'])
+def api_capsule_deletion_status(capsule_id):
+    """
+    Progress of a capsule's deletion
+    ---
+    tags:
+      - Capsules
+    parameters:
+      - name: capsule_id
+        in: path
+        type: string
+        required: true
+    responses:
+      200:
+        description: Job status (running, done or failed) with entries, snapshots and batches deleted so far
+      404:
+        description: No deletion of this capsule was started by this process
+    """
+    job = get_deletion_jobs().get(capsule_id)
+    if job is None:
+        return jsonify({'error': 'No deletion job for this capsule'}), 404
+    return jsonify(job.to_dict())
+
+ARCHIVE_EXTENSIONS = {None: '.ndjson', 'gzip': '.ndjson.gz', 'zstd': '.ndjson.zst'}
+ARCHIVE_MIMETYPES = {None: 'application/x-ndjson', 'gzip': 'application/gzip', 'zstd': 'application/zstd'}
+
+@capsule_bp.route('/api/capsule/<capsule_id>/export', methods=['GET'])
+def api_export_capsule(capsule_id):
+    """
+    Export a capsule as an NDJSON archive
+    ---
+    tags:
+      - Capsules
+    description: >
+      Streams the capsule with its entries, snapshots, tags, templates and
+      LINKS_TO edges between its entries, one record per line (see
+      archive.py), as a file download.
+    parameters:
+      - name: capsule_id
+        in: path
+        type: string
+        required: true
+      - name: compress
+        in: query
+        type: string
+        enum: [gzip, zstd]
+        description: Compress the archive (zstd needs the zstandard package on the server)
+    responses:
+      200:
+        description: The archive, streamed
+      400:
+        description: Unknown or unavailable compression
+      404:
+        description: Capsule not found
+    """
+    codec = request.args.get('compress') or None
+    try:
+        check_codec(codec)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     capsule = get_capsule_by_id(capsule_id)
     if not capsule:
         return jsonify({'error': 'Capsule not found'}), 404
-    delete_capsule(capsule_id)
-    return jsonify({'success': True})
+    filename = f'capsule-{capsule_id}{ARCHIVE_EXTENSIONS[codec]}'
+    return Response(
+        stream_with_context(export_archive(capsule, codec)), mimetype=ARCHIVE_MIMETYPES[codec],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+@capsule_bp.route('/api/capsules/import', methods=['POST'])
+def api_import_capsule():
+    """
+    Import a capsule from an NDJSON archive
+    ---
+    tags:
+      - Capsules
+    consumes:
+      - application/x-ndjson
+      - application/gzip
+      - application/zstd
+    description: >
+      The body is an archive written by the export endpoint, plain or gzip/zstd
+      compressed (detected from its first bytes). It is read as a stream and
+      written in batches. When an import fails part way the response carries
+      a checkpoint; send the same archive again with `resume_records`,
+      `capsule_id` and `import_id` from it to continue. A resume only writes
+      into the capsule that import created.
+    parameters:
+      - name: ids
+        in: query
+        type: string
+        enum: [remap, preserve]
+        description: Give the capsule, entries and snapshots new ids (default) or keep the archived ones
+      - name: batch_size
+        in: query
+        type: integer
+        description: Records written per transaction (default 1000, max 20000)
+      - name: resume_records
+        in: query
+        type: integer
+        description: Checkpoint `records` of an interrupted import
+      - name: capsule_id
+        in: query
+        type: string
+        description: Checkpoint `capsule_id` of an interrupted import (only with resume_records)
+      - name: import_id
+        in: query
+        type: string
+        description: Checkpoint `import_id` of an interrupted import (only with resume_records)
+      - name: body
+        in: body
+        required: true
+        description: The archive
+    responses:
+      200:
+        description: Summary with the capsule id and the number of entries, snapshots and edges created
+      400:
+        description: Not an archive, malformed or truncated, bad parameters, the capsule exists or is not this import's (with a checkpoint if writing had started)
+      500:
+        description: Writing failed; the checkpoint to resume from is included
+    """
+    ids = request.args.get('ids', 'remap')
+    batch_size = request.args.get('batch_size', str(DEFAULT_IMPORT_BATCH_SIZE))
+    resume_records = request.args.get('resume_records', '0')
+    if ids not in ID_MODES:
+        return jsonify({'error': f"'ids' must be one of {', '.join(ID_MODES)}"}), 400
+    if not batch_size.isdigit() or not 1 <= int(batch_size) <= MAX_IMPORT_BATCH_SIZE:
+        return jsonify({'error': f"'batch_size' must be between 1 and {MAX_IMPORT_BATCH_SIZE}"}), 400
+    if not resume_records.isdigit():
+        return jsonify({'error': "'resume_records' must be a record count"}), 400
+    checkpoint = {'records': int(resume_records), 'capsule_id': request.args.get('capsule_id'),
+                  'import_id': request.args.get('import_id')}
+    try:
+        summary = import_archive(iter_records(request.stream), ids=ids, batch_size=int(batch_size),
+                                 checkpoint=checkpoint)
+    except ImportInterrupted as e:
+        # A malformed or truncated archive is the client's to fix; anything else failed writing
+        status = 400 if e.__cause__ is None or isinstance(e.__cause__, ValueError) else 500
+        return jsonify({'error': str(e), 'checkpoint': e.checkpoint}), status
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(summary)
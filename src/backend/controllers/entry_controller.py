@@ -1,11 +1,58 @@
 from flask import Blueprint, request, jsonify
 from db import (
-    link_entry_to_entry, get_linked_entries, get_linked_entries_recursive,
-    get_entry_by_id, search_entries_by_text, filter_entries_by_tag
+    link_entry_to_entry, get_linked_entries, traverse_linked_entries,
+    search_entries_combined, get_entry_details, tag_entries, link_entries,
+    DEFAULT_EDGE_BATCH_SIZE
 )
+from cache import LINKS, TAGS, TEMPLATES
+from http_cache import conditional_json
 
 entry_bp = Blueprint('entry_bp', __name__)
 
+# Entries are immutable once written (deletes bump every scope), so an entry's
+# details only change with its tags, links and template.
+ENTRY_DETAIL_SCOPES = (LINKS, TAGS, TEMPLATES)
+
+def _int_arg(name, default=None, minimum=1):
+    """Read an integer query parameter, raising ValueError when malformed or below `minimum`."""
+    value = request.args.get(name)
+    if value is None:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        number = minimum - 1
+    if number < minimum:
+        raise ValueError(f"'{name}' must be an integer >= {minimum}")
+    return number
+
+@entry_bp.route('/api/entries/<entry_id>', methods=['GET'])
+def api_get_entry(entry_id):
+    """
+    Get an entry with its tags, outgoing links and template
+    ---
+    tags:
+      - Entries
+    parameters:
+      - name: entry_id
+        in: path
+        type: string
+        required: true
+    responses:
+      200:
+        description: Entry details
+      304:
+        description: Unchanged since the ETag sent in If-None-Match
+      404:
+        description: Entry not found
+    """
+    def build():
+        details = get_entry_details(entry_id)
+        if details is None:
+            return jsonify({'error': 'Entry not found'}), 404
+        return details
+    return conditional_json(ENTRY_DETAIL_SCOPES, build, variant=f'entry:{entry_id}')
+
 @entry_bp.route('/api/entries/<entry_id>/link', methods=['POST'])
 def api_link_entry(entry_id):
     """
@@ -51,35 +98,224 @@ def api_link_entry(entry_id):
     link_entry_to_entry(entry_id, target_id)
     return jsonify({'success': True})
 
+MAX_EDGE_BATCH_SIZE = 20000
+
+def _edge_pairs(keys):
+    """Read `pairs` from the JSON body as [a, b] arrays or objects with the given keys."""
+    body = request.get_json(silent=True)
+    pairs = body.get('pairs') if isinstance(body, dict) else body
+    if not isinstance(pairs, list):
+        raise ValueError('Expected a JSON array of pairs')
+    result = []
+    for index, pair in enumerate(pairs):
+        if isinstance(pair, dict):
+            pair = [pair.get(key) for key in keys]
+        if not isinstance(pair, list) or len(pair) != 2 or not all(isinstance(v, str) and v for v in pair):
+            raise ValueError(f"pair {index}: expected {{{', '.join(keys)}}} or a two-item array of strings")
+        result.append(tuple(pair))
+    return result
+
+def _bulk_edges(write, keys):
+    try:
+        batch_size = _int_arg('batch_size', DEFAULT_EDGE_BATCH_SIZE)
+        if batch_size > MAX_EDGE_BATCH_SIZE:
+            raise ValueError(f"'batch_size' must be between 1 and {MAX_EDGE_BATCH_SIZE}")
+        pairs = _edge_pairs(keys)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(write(pairs, batch_size=batch_size))
+
+@entry_bp.route('/api/entries/tags/bulk', methods=['POST'])
+def api_bulk_tag_entries():
+    """
+    Tag many entries at once
+    ---
+    tags:
+      - Entries
+    parameters:
+      - name: batch_size
+        in: query
+        type: integer
+        description: Pairs written per transaction (default 5000, max 20000)
+      - name: body
+        in: body
+        required: true
+        description: '{"pairs": [{"entry_id": "...", "tag": "..."}]} or [["entry_id", "tag"], ...]'
+    responses:
+      200:
+        description: Counts of created and existing edges, missing entries, duplicates and batches
+      400:
+        description: Malformed pairs or batch_size
+    """
+    return _bulk_edges(tag_entries, ('entry_id', 'tag'))
+
+@entry_bp.route('/api/entries/links/bulk', methods=['POST'])
+def api_bulk_link_entries():
+    """
+    Link many pairs of entries at once
+    ---
+    tags:
+      - Entries
+    parameters:
+      - name: batch_size
+        in: query
+        type: integer
+        description: Pairs written per transaction (default 5000, max 20000)
+      - name: body
+        in: body
+        required: true
+        description: '{"pairs": [{"source": "...", "target": "..."}]} or [["source", "target"], ...]'
+    responses:
+      200:
+        description: Counts of created and existing edges, missing entries, duplicates and batches
+      400:
+        description: Malformed pairs or batch_size
+    """
+    return _bulk_edges(link_entries, ('source', 'target'))
+
 @entry_bp.route('/api/entries/<entry_id>/links', methods=['GET'])
 def api_get_entry_links(entry_id):
-    linked = get_linked_entries(entry_id)
-    return jsonify({'linked_entries': [dict(e) for e in linked]})
+    def build():
+        return {'linked_entries': [dict(e) for e in get_linked_entries(entry_id)]}
+    return conditional_json(LINKS, build, variant=entry_id)
+
+MAX_TRAVERSAL_DEPTH = 20
 
 @entry_bp.route('/api/entries/<entry_id>/links_recursive', methods=['GET'])
 def api_get_entry_links_recursive(entry_id):
-    linked = get_linked_entries_recursive(entry_id)
-    # Remove duplicates by id
-    seen = set()
-    unique = []
-    for e in linked:
-        eid = e.get('id')
-        if eid and eid not in seen:
-            seen.add(eid)
-            unique.append(dict(e))
-    return jsonify({'linked_entries_recursive': unique})
+    """
+    Entries reachable from an entry via LINKS_TO
+    ---
+    tags:
+      - Entries
+    parameters:
+      - name: entry_id
+        in: path
+        type: string
+        required: true
+      - name: depth
+        in: query
+        type: integer
+        description: Maximum number of hops to follow (default 5, max 20)
+      - name: limit
+        in: query
+        type: integer
+        description: Maximum number of entries to return
+      - name: fan_out
+        in: query
+        type: integer
+        description: Maximum links followed out of any single entry
+    responses:
+      200:
+        description: Linked entries plus depth and path for each, in breadth-first order
+      304:
+        description: Unchanged since the ETag sent in If-None-Match
+      400:
+        description: Invalid depth, limit or fan_out
+    """
+    try:
+        depth = min(_int_arg('depth', 5), MAX_TRAVERSAL_DEPTH)
+        limit = _int_arg('limit')
+        fan_out = _int_arg('fan_out')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-@entry_bp.route('/api/entries/search', methods=['GET'])
-def api_search_entries():
+    def build():
+        hits, truncated = traverse_linked_entries(entry_id, max_depth=depth, limit=limit, fan_out=fan_out)
+        return {
+            'linked_entries_recursive': [dict(hit['entry']) for hit in hits],
+            'traversal': [
+                {'id': hit['entry']['id'], 'depth': hit['depth'], 'path': hit['path']} for hit in hits
+            ],
+            'truncated': truncated,
+        }
+    return conditional_json(LINKS, build, variant=f'{entry_id}:{depth}:{limit}:{fan_out}')
+
+def _run_search(default_mode):
     text = request.args.get('text')
     tag = request.args.get('tag')
-    results = set()
-    if text:
-        for e in search_entries_by_text(text):
-            results.add(e['id'])
-    if tag:
-        for e in filter_entries_by_tag(tag):
-            results.add(e['id'])
-    # Fetch full entry objects for all result IDs
-    entries = [dict(get_entry_by_id(eid)) for eid in results if get_entry_by_id(eid)]
-    return jsonify({'entries': entries})
+    linked_to = request.args.get('linked_to')
+    mode = request.args.get('mode', default_mode).lower()
+    try:
+        offset = _int_arg('offset', 0, minimum=0)
+        limit = _int_arg('limit')
+        hits = search_entries_combined(text=text, tag=tag, linked_to=linked_to, mode=mode, skip=offset, limit=limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        'entries': [dict(entry) for entry, _ in hits],
+        'scores': {entry['id']: score for entry, score in hits},
+        'mode': mode,
+    })
+
+@entry_bp.route('/api/entries/search', methods=['GET'])
+def api_search_entries():
+    """
+    Search entries by text and/or tag (any predicate matches by default)
+    ---
+    tags:
+      - Entries
+    parameters:
+      - name: text
+        in: query
+        type: string
+        description: Full-text query; supports field:value terms
+      - name: tag
+        in: query
+        type: string
+      - name: linked_to
+        in: query
+        type: string
+        description: Entry id joined to results by a LINKS_TO edge
+      - name: mode
+        in: query
+        type: string
+        enum: [or, and]
+      - name: offset
+        in: query
+        type: integer
+      - name: limit
+        in: query
+        type: integer
+    responses:
+      200:
+        description: Matching entries, best match first
+      400:
+        description: Invalid mode, offset or limit
+    """
+    return _run_search('or')
+
+@entry_bp.route('/api/search', methods=['GET'])
+def api_combined_search():
+    """
+    Combined search: /api/search?tag=X&text=Y&linked_to=Z (all predicates must match by default)
+    ---
+    tags:
+      - Entries
+    parameters:
+      - name: text
+        in: query
+        type: string
+      - name: tag
+        in: query
+        type: string
+      - name: linked_to
+        in: query
+        type: string
+      - name: mode
+        in: query
+        type: string
+        enum: [and, or]
+      - name: offset
+        in: query
+        type: integer
+      - name: limit
+        in: query
+        type: integer
+    responses:
+      200:
+        description: Matching entries, best match first
+      400:
+        description: Invalid mode, offset or limit
+    """
+    return _run_search('and')
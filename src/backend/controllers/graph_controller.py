@@ -0,0 +1,80 @@
+from flask import Blueprint, request, jsonify
+from db import get_capsule_by_id
+from cache import LINKS, SNAPSHOTS, TAGS, TEMPLATES
+from http_cache import conditional_stream
+from graph_export import DEFAULT_NODE_LIMIT, MAX_NODE_LIMIT, PRUNE_MODES, stream_graph
+
+graph_bp = Blueprint('graph_bp', __name__)
+
+def _graph_options():
+    """Parse graph export query parameters, raising ValueError on bad input."""
+    limit = request.args.get('limit', str(DEFAULT_NODE_LIMIT))
+    if not limit.isdigit() or not 1 <= int(limit) <= MAX_NODE_LIMIT:
+        raise ValueError(f"'limit' must be between 1 and {MAX_NODE_LIMIT}")
+    prune = request.args.get('prune', 'none')
+    if prune not in PRUNE_MODES:
+        raise ValueError(f"prune must be one of {', '.join(PRUNE_MODES)}")
+    seed = request.args.get('seed')
+    if seed is not None and not seed.lstrip('-').isdigit():
+        raise ValueError("'seed' must be an integer")
+    return {
+        'limit': int(limit),
+        'prune': prune,
+        'seed': int(seed) if seed is not None else None,
+        'snapshots': request.args.get('snapshots', 'false').lower() in ('true', '1', 'yes'),
+    }
+
+@graph_bp.route('/api/capsules/<capsule_id>/graph', methods=['GET'])
+def api_capsule_graph(capsule_id):
+    """
+    Export a capsule as a Cytoscape.js graph
+    ---
+    tags:
+      - Graph
+    parameters:
+      - name: capsule_id
+        in: path
+        type: string
+        required: true
+      - name: limit
+        in: query
+        type: integer
+        description: Maximum entry nodes (default 2000, max 50000)
+      - name: prune
+        in: query
+        type: string
+        enum: [none, degree, sample]
+        description: Which entries to keep when the capsule exceeds limit
+      - name: seed
+        in: query
+        type: integer
+        description: Random seed for prune=sample
+      - name: snapshots
+        in: query
+        type: boolean
+        description: Include snapshot nodes and HAS_SNAPSHOT edges
+    responses:
+      200:
+        description: "{capsule, elements: [{group, data}], node_count, edge_count, truncated}, streamed"
+      304:
+        description: Unchanged since the ETag sent in If-None-Match
+      400:
+        description: Invalid parameters
+      404:
+        description: Capsule not found
+    """
+    try:
+        options = _graph_options()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    # Entry-level edge writes only bump their shared scope, so the graph's tag
+    # covers those scopes as well as the capsule itself.
+    scopes = (capsule_id, LINKS, TAGS, TEMPLATES, SNAPSHOTS)
+    variant = 'graph:{capsule_id}:{limit}:{prune}:{seed}:{snapshots}'.format(capsule_id=capsule_id, **options)
+
+    def build():
+        capsule = get_capsule_by_id(capsule_id)
+        if not capsule:
+            return jsonify({'error': 'Capsule not found'}), 404
+        return stream_graph(capsule, **options)
+    return conditional_stream(scopes, build, variant=variant)
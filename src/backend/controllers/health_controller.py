@@ -0,0 +1,42 @@
+from flask import Blueprint, jsonify
+from storage import get_backend
+from cache import get_capsule_cache, get_response_cache
+from write_buffer import get_write_buffer
+
+health_bp = Blueprint('health_bp', __name__)
+
+@health_bp.route('/api/health/db', methods=['GET'])
+def api_db_health():
+    """
+    Storage backend connectivity and connection pool usage
+    ---
+    tags:
+      - Health
+    responses:
+      200:
+        description: Backend reachable; for Neo4j also pool counters (in_use, sessions_high_water, saturated_requests, ...)
+      503:
+        description: Backend unreachable
+    """
+    health = get_backend().health()
+    status = 200 if health['status'] == 'ok' else 503
+    return jsonify(health), status
+
+@health_bp.route('/api/health/cache', methods=['GET'])
+def api_cache_health():
+    """
+    Capsule metadata cache counters
+    ---
+    tags:
+      - Health
+    responses:
+      200:
+        description: Hit, miss and eviction counters for the capsule and response body caches, and write-behind queue counters
+    """
+    responses = get_response_cache()
+    buffer = get_write_buffer()
+    return jsonify({
+        'capsules': get_capsule_cache().stats(),
+        'responses': responses.stats() if responses else None,
+        'write_buffer': buffer.stats() if buffer else None,
+    })
@@ -0,0 +1,32 @@
+from flask import Blueprint, Response
+from metrics import get_metrics
+from pool import get_pool
+from storage import get_backend
+
+metrics_bp = Blueprint('metrics_bp', __name__)
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """
+    Data-layer metrics in Prometheus text format
+    ---
+    tags:
+      - Health
+    produces:
+      - text/plain
+    responses:
+      200:
+        description: Call and query counters and latency histograms by function and route; pool gauges on Neo4j
+    """
+    gauges = {}
+    if get_backend().name == 'neo4j':
+        stats = get_pool().stats()
+        gauges = {
+            'recall_neo4j_pool_in_use': ('Sessions currently checked out', stats['in_use']),
+            'recall_neo4j_pool_sessions_high_water': (
+                'Most sessions checked out at once (estimate of open connections)', stats['sessions_high_water']),
+            'recall_neo4j_pool_saturated_requests': (
+                'Sessions requested while every pool slot was in use (estimate of connection waits)',
+                stats['saturated_requests']),
+        }
+    return Response(get_metrics().render(gauges), mimetype='text/plain; version=0.0.4')
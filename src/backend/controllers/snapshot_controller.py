@@ -0,0 +1,154 @@
+from flask import Blueprint, request, jsonify
+from db import create_snapshot, get_snapshot, get_snapshot_history, compact_snapshots, get_entry_by_id
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor
+from write_buffer import RETRY_AFTER_SECONDS, BufferFull, get_write_buffer
+from datetime import datetime, UTC
+import json
+
+snapshot_bp = Blueprint('snapshot_bp', __name__)
+
+@snapshot_bp.route('/api/entries/<entry_id>/snapshots', methods=['POST'])
+def api_create_snapshot(entry_id):
+    """
+    Record a new version of an entry
+    ---
+    tags:
+      - Snapshots
+    parameters:
+      - name: entry_id
+        in: path
+        type: string
+        required: true
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          properties:
+            payload:
+              description: Snapshot payload (JSON value, stored as delta against the previous version when smaller)
+    responses:
+      200:
+        description: Snapshot created
+      202:
+        description: Snapshot queued by the write-behind buffer (no id yet)
+      404:
+        description: Entry not found
+      429:
+        description: Write-behind buffer full; retry after Retry-After seconds
+    """
+    payload = (request.get_json(silent=True) or {}).get('payload', {})
+    if not isinstance(payload, str):
+        payload = json.dumps(payload)
+    buffer = get_write_buffer()
+    if buffer is not None:
+        if get_entry_by_id(entry_id) is None:
+            return jsonify({'error': 'Entry not found'}), 404
+        try:
+            buffer.add_snapshot(entry_id, datetime.now(UTC), payload)
+        except BufferFull as e:
+            return jsonify({'error': str(e)}), 429, {'Retry-After': str(RETRY_AFTER_SECONDS)}
+        return jsonify({'success': True, 'queued': True}), 202
+    snapshot_id = create_snapshot(entry_id, datetime.now(UTC), payload)
+    if snapshot_id is None:
+        return jsonify({'error': 'Entry not found'}), 404
+    return jsonify({'success': True, 'id': snapshot_id})
+
+@snapshot_bp.route('/api/entries/<entry_id>/snapshots', methods=['GET'])
+def api_snapshot_history(entry_id):
+    """
+    List an entry's snapshot history
+    ---
+    tags:
+      - Snapshots
+    parameters:
+      - name: entry_id
+        in: path
+        type: string
+        required: true
+      - name: limit
+        in: query
+        type: integer
+        description: Page size (default 100, max 1000)
+      - name: after
+        in: query
+        type: string
+        description: Cursor from the previous page's next_cursor
+      - name: payload
+        in: query
+        type: boolean
+        description: Set to false to list versions without rebuilding payloads
+    responses:
+      200:
+        description: Snapshots ordered by created_at, with next_cursor
+      400:
+        description: Invalid limit or cursor
+      404:
+        description: Entry not found
+    """
+    after = request.args.get('after')
+    limit = request.args.get('limit', str(DEFAULT_PAGE_SIZE))
+    try:
+        if after:
+            decode_cursor(after, 2)
+        limit = int(limit) if limit.isdigit() else 0
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            raise ValueError(f"'limit' must be between 1 and {MAX_PAGE_SIZE}")
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if get_entry_by_id(entry_id) is None:
+        return jsonify({'error': 'Entry not found'}), 404
+    include_payload = request.args.get('payload', 'true').lower() not in ('false', '0', 'no')
+    snapshots, next_cursor = get_snapshot_history(entry_id, limit=limit, after=after, include_payload=include_payload)
+    return jsonify({'entry_id': entry_id, 'snapshots': snapshots, 'next_cursor': next_cursor})
+
+@snapshot_bp.route('/api/snapshots/<snapshot_id>', methods=['GET'])
+def api_get_snapshot(snapshot_id):
+    """
+    Get one snapshot with its payload rebuilt
+    ---
+    tags:
+      - Snapshots
+    parameters:
+      - name: snapshot_id
+        in: path
+        type: string
+        required: true
+    responses:
+      200:
+        description: Snapshot
+      404:
+        description: Snapshot not found
+    """
+    snapshot = get_snapshot(snapshot_id)
+    if snapshot is None:
+        return jsonify({'error': 'Snapshot not found'}), 404
+    return jsonify(snapshot)
+
+@snapshot_bp.route('/api/entries/<entry_id>/snapshots/compact', methods=['POST'])
+def api_compact_snapshots(entry_id):
+    """
+    Fold old versions of an entry into a single keyframe
+    ---
+    tags:
+      - Snapshots
+    parameters:
+      - name: entry_id
+        in: path
+        type: string
+        required: true
+      - name: keep
+        in: query
+        type: integer
+        required: true
+        description: Number of most recent versions to keep
+    responses:
+      200:
+        description: Number of snapshots removed
+      400:
+        description: Missing or invalid keep
+    """
+    keep = request.args.get('keep', '')
+    if not keep.isdigit() or int(keep) < 1:
+        return jsonify({'error': "'keep' must be an integer >= 1"}), 400
+    return jsonify({'success': True, 'removed': compact_snapshots(entry_id, int(keep))})
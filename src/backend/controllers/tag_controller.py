@@ -0,0 +1,167 @@
+from flask import Blueprint, request, jsonify
+from db import get_tag_by_name, get_tag_counts, get_tag_cooccurrence, get_entries_with_tags
+from cache import TAGS
+from http_cache import conditional_json
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor
+
+tag_bp = Blueprint('tag_bp', __name__)
+
+MAX_INTERSECTION_TAGS = 10
+
+def _limit_arg(default=None):
+    """Read `limit` (1..MAX_PAGE_SIZE), raising ValueError when it is malformed or out of range."""
+    limit = request.args.get('limit')
+    if limit is None:
+        return default
+    limit = int(limit) if limit.isdigit() else 0
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"'limit' must be between 1 and {MAX_PAGE_SIZE}")
+    return limit
+
+@tag_bp.route('/api/tags', methods=['GET'])
+def api_get_tags():
+    """
+    Tags in use with their entry counts
+    ---
+    tags:
+      - Tags
+    description: >
+      Counts are maintained as entries are tagged and deleted, so this does
+      not scan TAGGED_AS edges. Entries of deleted capsules are not counted.
+    parameters:
+      - name: capsule_id
+        in: query
+        type: string
+        description: Count only this capsule's entries
+      - name: limit
+        in: query
+        type: integer
+        description: Return only the most used tags (max 1000)
+    responses:
+      200:
+        description: Tags ordered by entry count, then name
+        schema:
+          type: object
+          properties:
+            tags:
+              type: array
+              items:
+                type: object
+                properties:
+                  name:
+                    type: string
+                  entries:
+                    type: integer
+      304:
+        description: Unchanged since the ETag sent in If-None-Match
+      400:
+        description: Invalid limit
+    """
+    capsule_id = request.args.get('capsule_id')
+    try:
+        limit = _limit_arg()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    def build():
+        return {'capsule_id': capsule_id, 'tags': get_tag_counts(capsule_id=capsule_id, limit=limit)}
+    return conditional_json(TAGS, build, variant=f'counts:{capsule_id}:{limit}')
+
+@tag_bp.route('/api/tags/<tag_name>/related', methods=['GET'])
+def api_get_related_tags(tag_name):
+    """
+    Tags that co-occur with a tag
+    ---
+    tags:
+      - Tags
+    parameters:
+      - name: tag_name
+        in: path
+        type: string
+        required: true
+      - name: capsule_id
+        in: query
+        type: string
+        description: Only consider this capsule's entries
+      - name: limit
+        in: query
+        type: integer
+        description: Return only the strongest co-occurrences (max 1000)
+    responses:
+      200:
+        description: Other tags with the number of entries they share with this one, most first
+      304:
+        description: Unchanged since the ETag sent in If-None-Match
+      400:
+        description: Invalid limit
+      404:
+        description: Tag not found
+    """
+    capsule_id = request.args.get('capsule_id')
+    try:
+        limit = _limit_arg()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    def build():
+        if get_tag_by_name(tag_name) is None:
+            return jsonify({'error': 'Tag not found'}), 404
+        return {
+            'tag': tag_name,
+            'capsule_id': capsule_id,
+            'related': get_tag_cooccurrence(tag_name, capsule_id=capsule_id, limit=limit),
+        }
+    return conditional_json(TAGS, build, variant=f'related:{tag_name}:{capsule_id}:{limit}')
+
+@tag_bp.route('/api/tags/entries', methods=['GET'])
+def api_get_entries_with_tags():
+    """
+    Entries carrying every given tag: /api/tags/entries?tag=a&tag=b
+    ---
+    tags:
+      - Tags
+    parameters:
+      - name: tag
+        in: query
+        type: array
+        items:
+          type: string
+        collectionFormat: multi
+        required: true
+        description: Tag name (repeat for an intersection, up to 10)
+      - name: capsule_id
+        in: query
+        type: string
+      - name: limit
+        in: query
+        type: integer
+        description: Page size (default 100, max 1000)
+      - name: after
+        in: query
+        type: string
+        description: Cursor from the previous page's next_cursor
+    responses:
+      200:
+        description: Matching entries ordered by timestamp, id, and next_cursor
+      400:
+        description: No tag, too many tags, invalid limit or cursor
+    """
+    tag_names = list(dict.fromkeys(request.args.getlist('tag')))
+    after = request.args.get('after')
+    try:
+        if not tag_names:
+            raise ValueError("at least one 'tag' is required")
+        if len(tag_names) > MAX_INTERSECTION_TAGS:
+            raise ValueError(f"at most {MAX_INTERSECTION_TAGS} tags can be intersected")
+        if after:
+            decode_cursor(after, 2)
+        limit = _limit_arg(DEFAULT_PAGE_SIZE)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    entries, next_cursor = get_entries_with_tags(tag_names, limit=limit, capsule_id=request.args.get('capsule_id'),
+                                                 after=after)
+    return jsonify({
+        'tags': tag_names,
+        'entries': [dict(entry) for entry in entries],
+        'next_cursor': next_cursor,
+    })
@@ -0,0 +1,94 @@
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from db import get_template, get_capsule_by_id
+from template_engine import DEFAULT_BATCH_SIZE, MAX_BATCH_SIZE, apply_template
+import json
+
+template_bp = Blueprint('template_bp', __name__)
+
+MAX_REPEAT = 100000
+
+@template_bp.route('/api/templates/<template_id>/apply', methods=['POST'])
+def api_apply_template(template_id):
+    """
+    Create entries in one or more capsules from a template's structure
+    ---
+    tags:
+      - Templates
+    parameters:
+      - name: template_id
+        in: path
+        type: string
+        required: true
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          properties:
+            capsule_ids:
+              type: array
+              items:
+                type: string
+            repeat:
+              type: integer
+              description: Copies of the structure's entry list per capsule (default 1)
+            batch_size:
+              type: integer
+              description: Entries per write transaction (default 2000, max 20000)
+            dry_run:
+              type: boolean
+              description: Only report what would be created
+      - name: progress
+        in: query
+        type: string
+        enum: [ndjson]
+        description: Stream batch/error/done events as NDJSON instead of one summary
+    responses:
+      200:
+        description: Summary with created entries, tag and template edge counts, bytes and per-batch timings
+      400:
+        description: Invalid body or template structure, or the application is too large
+      404:
+        description: Template or capsule not found
+    """
+    template = get_template(template_id)
+    if not template:
+        return jsonify({'error': 'Template not found'}), 404
+    body = request.get_json(silent=True) or {}
+    capsule_ids = body.get('capsule_ids')
+    repeat = body.get('repeat', 1)
+    batch_size = body.get('batch_size', DEFAULT_BATCH_SIZE)
+    if not isinstance(capsule_ids, list) or not capsule_ids or not all(isinstance(c, str) for c in capsule_ids):
+        return jsonify({'error': "'capsule_ids' must be a non-empty list of capsule ids"}), 400
+    if not isinstance(repeat, int) or isinstance(repeat, bool) or not 1 <= repeat <= MAX_REPEAT:
+        return jsonify({'error': f"'repeat' must be between 1 and {MAX_REPEAT}"}), 400
+    if not isinstance(batch_size, int) or isinstance(batch_size, bool) or not 1 <= batch_size <= MAX_BATCH_SIZE:
+        return jsonify({'error': f"'batch_size' must be between 1 and {MAX_BATCH_SIZE}"}), 400
+    capsules = []
+    for capsule_id in dict.fromkeys(capsule_ids):
+        capsule = get_capsule_by_id(capsule_id)
+        if not capsule:
+            return jsonify({'error': f'Capsule {capsule_id} not found'}), 404
+        capsules.append(capsule)
+    try:
+        events = apply_template(template, capsules, repeat=repeat, batch_size=batch_size,
+                                dry_run=bool(body.get('dry_run')))
+        first = next(events)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if request.args.get('progress') == 'ndjson':
+        def stream():
+            yield json.dumps(first) + '\n'
+            for event in events:
+                yield json.dumps(event) + '\n'
+        return Response(stream_with_context(stream()), mimetype='application/x-ndjson')
+    summary = {'batches': [], 'errors': []}
+    for event in [first, *events]:
+        kind = event.pop('event')
+        if kind == 'batch':
+            summary['batches'].append(event)
+        elif kind == 'error':
+            summary['errors'].append(event)
+        else:
+            summary.update(event)
+    return jsonify(summary)
@@ -1,314 +1,485 @@
-from neo4j import GraphDatabase
 from dotenv import load_dotenv
-import os
 from datetime import datetime
-import json
+import atexit
+import time
+from pool import get_pool
+from cache import CAPSULE_LIST, LINKS, SNAPSHOTS, TAGS, TEMPLATES, get_capsule_cache, get_versions
+from entry_storage import MIGRATING, capsule_storage_mode, default_storage_mode, split_properties, writes_native
+from metrics import instrument_module
+from pagination import DEFAULT_PAGE_SIZE
+from schema import SchemaError, schema_mode
+from storage import get_backend, set_backend
+import snapshots
 
 load_dotenv()
 
-NEO4J_URI = os.getenv("NEO4J_URI")
-NEO4J_USER = os.getenv("NEO4J_USER")
-NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
+# The data layer delegates to the active storage backend (see storage/), so the
+# functions below keep their signatures whichever graph store is configured.
+
+class _BorrowedDriver:
+    """Context-manager view of the shared driver that leaves it open on exit."""
+
+    def __init__(self, driver):
+        self._driver = driver
+
+    def __enter__(self):
+        return self._driver
+
+    def __exit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        return getattr(self._driver, name)
 
 def get_graph_driver():
-    return GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    """Return the process-wide pooled Neo4j driver (safe to use in a `with` block)."""
+    return _BorrowedDriver(get_pool().driver)
+
+def get_session(**kwargs):
+    """Borrow a session from the pooled Neo4j driver."""
+    return get_pool().session(**kwargs)
+
+def close_backend():
+    """Release the active backend's connections."""
+    get_backend().close()
+
+def init_app(app):
+    """Attach the storage backend to a Flask app, set up the schema and close it at exit."""
+    app.extensions['recall_db'] = get_backend()
+    atexit.register(close_backend)
+    mode = schema_mode()
+    if mode == 'check':
+        problems = check_schema()
+        if problems:
+            raise SchemaError('Schema is not current: ' + '; '.join(problems))
+        return
+    if mode == 'migrate':
+        try:
+            ensure_schema()
+        except Exception as e:
+            print(f"[Recall] Schema setup skipped: {e}")
+
+def ensure_schema():
+    """Apply pending schema migrations for the active backend."""
+    get_backend().ensure_schema()
+
+def check_schema():
+    """Return the active backend's schema problems (pending migrations, missing indexes)."""
+    return get_backend().check_schema()
 
 # Capsule CRUD (Graph)
-def create_capsule(name, description, created_at, fields=None):
-    with get_graph_driver() as driver:
-        with driver.session() as session:
-            result = session.run(
-                """
-                CREATE (c:Capsule {id: randomUUID(), name: $name, description: $description, created_at: $created_at, fields: $fields})
-                RETURN c.id AS id
-                """,
-                name=name, description=description, created_at=created_at.isoformat(), fields=json.dumps(fields or [])
-            )
-            return result.single()["id"]
+def create_capsule(name, description, created_at, fields=None, storage_mode=None, capsule_id=None, import_id=None):
+    """Create a capsule; `storage_mode` defaults to RECALL_ENTRY_STORAGE (see entry_storage).
+
+    `capsule_id` is only given when a capsule keeps an id from elsewhere, as
+    archive imports do; by default the backend generates one. Imports also
+    pass `import_id`, which marks the capsule as theirs (see archive.py).
+    """
+    storage_mode = storage_mode or default_storage_mode()
+    if storage_mode == 'native' and fields:
+        get_backend().ensure_field_indexes(fields)
+    capsule_id = get_backend().create_capsule(name, description, created_at, fields, storage_mode=storage_mode,
+                                              capsule_id=capsule_id, import_id=import_id)
+    get_capsule_cache().invalidate(capsule_id)
+    get_versions().bump(CAPSULE_LIST)
+    return capsule_id
 
 def get_all_capsules():
-    with get_graph_driver() as driver:
-        with driver.session() as session:
-            result = session.run("MATCH (c:Capsule) RETURN c")
-            return [record["c"] for record in result]
+    return get_backend().get_all_capsules()
 
 def get_capsule_by_id(capsule_id):
-    with get_graph_driver() as driver:
-        with driver.session() as session:
-            result = session.run("MATCH (c:Capsule {id: $capsule_id}) RETURN c", capsule_id=capsule_id)
-            record = result.single()
-            if record:
-                capsule = dict(record["c"])
-                if 'fields' in capsule and isinstance(capsule['fields'], str):
-                    try:
-                        capsule['fields'] = json.loads(capsule['fields'])
-                    except Exception:
-                        capsule['fields'] = []
-                return capsule
-            return None
+    """Return a capsule record with its `fields` schema parsed, served from the capsule cache."""
+    return get_capsule_cache().get_or_load(capsule_id, get_backend().get_capsule)
+
+DEFAULT_PURGE_BATCH_SIZE = 1000
 
 def delete_capsule(capsule_id):
-    with get_graph_driver() as driver:
-        with driver.session() as session:
-            session.run(
-                "MATCH (c:Capsule {id: $id}) DETACH DELETE c",
-                id=capsule_id
-            )
+    """Delete a capsule with its entries, their snapshots and edges. Returns False if there is no such capsule."""
+    if not mark_capsule_deleted(capsule_id):
+        return False
+    purge_capsule(capsule_id)
+    return True
+
+def mark_capsule_deleted(capsule_id):
+    """Take a capsule out of every read at once; its entries are removed by purge_capsule."""
+    deleted = get_backend().mark_capsule_deleted(capsule_id)
+    get_capsule_cache().invalidate(capsule_id)
+    # Tag counts only cover live capsules
+    get_versions().bump(CAPSULE_LIST, TAGS, capsule_id)
+    return deleted
+
+def purge_capsule(capsule_id, batch_size=DEFAULT_PURGE_BATCH_SIZE, pause=0, progress=None):
+    """Remove a deleted capsule's entries and snapshots, one bounded transaction per batch.
+
+    Sleeps `pause` seconds between batches so writers elsewhere get the locks
+    in between, and calls `progress(entries, snapshots)` with running totals
+    after each batch. Returns `(entries, snapshots)` removed.
+    """
+    entries = snapshots = 0
+    while True:
+        count, removed = get_backend().purge_capsule_batch(capsule_id, batch_size)
+        if not count:
+            return entries, snapshots
+        entries += count
+        snapshots += removed
+        # Entries of other capsules may link to the removed ones
+        get_versions().bump()
+        if progress:
+            progress(entries, snapshots)
+        if pause:
+            time.sleep(pause)
 
 # Entry CRUD (Graph)
+# API responses carry ETags derived from per-scope versions (see http_cache.py).
+# Entry-level writes do not know their capsule, so they bump a shared scope
+# (LINKS, TAGS, TEMPLATES, SNAPSHOTS) or, for deletes, the epoch.
+def _entry_layout(capsule, properties):
+    """Return `(properties_json, native)` as the capsule's storage mode stores them."""
+    if writes_native(capsule):
+        return split_properties(capsule.get('fields'), properties)
+    return properties, None
+
+def _layout_capsule(capsule_id):
+    """Read the capsule record that decides an entry write's layout.
+
+    This bypasses the capsule cache: a worker holding a cached `json` mode
+    would keep writing JSON entries behind a running storage migration.
+    """
+    return get_backend().get_capsule(capsule_id)
+
 def create_entry(capsule_id, timestamp, properties):
-    with get_graph_driver() as driver:
-        with driver.session() as session:
-            result = session.run(
-                """
-                MATCH (c:Capsule {id: $capsule_id})
-                CREATE (e:Entry {id: randomUUID(), timestamp: $timestamp, properties: $properties})
-                CREATE (c)-[:HAS_ENTRY]->(e)
-                RETURN e.id AS id
-                """,
-                capsule_id=capsule_id, timestamp=timestamp.isoformat(), properties=properties
-            )
-            return result.single()["id"]
+    properties, native = _entry_layout(_layout_capsule(capsule_id), properties)
+    entry_id = get_backend().create_entry(capsule_id, timestamp, properties, native=native)
+    get_versions().bump(capsule_id)
+    return entry_id
 
 def get_entries_by_capsule(capsule_id):
-    with get_graph_driver() as driver:
-        with driver.session() as session:
-            result = session.run(
-                """
-                MATCH (c:Capsule {id: $capsule_id})-[:HAS_ENTRY]->(e:Entry)
-                RETURN e
-                """,
-                capsule_id=capsule_id
-            )
-            return [record["e"] for record in result]
+    return get_backend().get_entries_by_capsule(capsule_id)
+
+def create_entries_batch(capsule_id, rows):
+    """Create many entries under a capsule in one write transaction.
+
+    `rows` is a list of `(timestamp, properties_json)` pairs. The capsule is
+    matched once and the entries are created with a single UNWIND. Returns the
+    new entry ids (empty if the capsule does not exist).
+    """
+    capsule = _layout_capsule(capsule_id)
+    ids = get_backend().create_entries_batch(
+        capsule_id, [(timestamp, *_entry_layout(capsule, properties)) for timestamp, properties in rows]
+    )
+    get_versions().bump(capsule_id)
+    return ids
+
+def import_entries_batch(capsule_id, rows):
+    """Create entries that keep their ids from `(entry_id, timestamp, properties_json)` rows.
+
+    Used by archive imports: one transaction per call, and entries whose id
+    already exists are skipped so a batch can be replayed. Returns the number
+    of entries created.
+    """
+    capsule = _layout_capsule(capsule_id)
+    created = get_backend().import_entries_batch(
+        capsule_id, [(entry_id, timestamp, *_entry_layout(capsule, properties)) for entry_id, timestamp, properties in rows]
+    )
+    get_versions().bump(capsule_id)
+    return created
+
+def create_entries_from_template(capsule_id, template_id, rows):
+    """Create a batch of entries stamped from a template in one write transaction.
+
+    `rows` are `(timestamp, properties_json, tags)`; every entry is tagged with
+    its tags and gets a USES_TEMPLATE edge. Returns the new entry ids.
+    """
+    capsule = _layout_capsule(capsule_id)
+    ids = get_backend().create_entries_from_template(
+        capsule_id, template_id,
+        [(timestamp, *_entry_layout(capsule, properties), tags) for timestamp, properties, tags in rows]
+    )
+    get_versions().bump(capsule_id, TAGS)
+    return ids
+
+def get_entries_page(capsule_id, limit=DEFAULT_PAGE_SIZE, after=None):
+    """Return one page of a capsule's entries ordered by (timestamp, id).
+
+    `after` is the cursor returned with the previous page. Returns
+    `(entries, next_cursor)`; next_cursor is None on the last page.
+    """
+    return get_backend().get_entries_page(capsule_id, limit, after=after)
+
+def iter_entries_by_capsule(capsule_id, after=None):
+    """Yield a capsule's entries in (timestamp, id) order straight from the result cursor.
+
+    The session stays open while the generator is consumed, so nothing is
+    materialized beyond the driver's fetch buffer.
+    """
+    return get_backend().iter_entries_by_capsule(capsule_id, after=after)
+
+def get_entries_filtered(capsule_id, filters, limit=DEFAULT_PAGE_SIZE, after=None, start=None, end=None):
+    """Return one page of a capsule's entries matching every `(field, op, value)` filter.
+
+    `start` (inclusive) and `end` (exclusive) bound the entry timestamp and are
+    served by the datetime index. Field filters on native-mode capsules use
+    indexed node properties; others decode each entry's JSON. Returns
+    `(entries, next_cursor)` like get_entries_page.
+    """
+    if not filters or capsule_storage_mode(get_capsule_by_id(capsule_id)) == 'native':
+        return get_backend().get_entries_filtered(capsule_id, filters, limit, after=after, start=start, end=end)
+    return get_backend().scan_entries_filtered(capsule_id, filters, limit, after=after, start=start, end=end)
+
+def count_entries_by_bucket(capsule_id, bucket, start=None, end=None):
+    """Return `[{'start', 'count'}]` entry counts per UTC hour or day bucket, computed in the database."""
+    return get_backend().count_entries_by_bucket(capsule_id, bucket, start=start, end=end)
+
+def aggregate_entries(capsule_id, columns, group_by=None, start=None, end=None):
+    """Grouped statistics over a capsule's int/boolean fields (see aggregation.py).
+
+    Native-mode capsules are aggregated by the backend over typed node
+    properties; other capsules are decoded into a columnar extract.
+    """
+    if capsule_storage_mode(get_capsule_by_id(capsule_id)) == 'native':
+        return get_backend().aggregate_entries(capsule_id, columns, group_by, start=start, end=end)
+    return get_backend().scan_aggregate_entries(capsule_id, columns, group_by, start=start, end=end)
+
+def migrate_capsule_storage(capsule_id, batch_size=1000, progress=None):
+    """Move a capsule's entries to native field properties, one batch per transaction.
+
+    The capsule is marked `migrating` first; entry writes read the mode
+    uncached, so from then on they land natively. A write that read the old
+    mode just before the switch can still commit a JSON entry behind the
+    cursor, so a second sweep runs before the capsule switches to `native`
+    (enabling indexed filters). Safe to re-run. Returns the entry count.
+    """
+    capsule = get_backend().get_capsule(capsule_id)
+    if capsule is None:
+        return 0
+    if capsule_storage_mode(capsule) != 'native':
+        get_backend().ensure_field_indexes(capsule.get('fields'))
+        get_backend().set_capsule_storage_mode(capsule_id, MIGRATING)
+        get_capsule_cache().invalidate(capsule_id)
+    migrated = _migrate_entries(capsule_id, capsule.get('fields'), batch_size, progress)
+    if capsule_storage_mode(capsule) != 'native':
+        _migrate_entries(capsule_id, capsule.get('fields'), batch_size)
+        get_backend().set_capsule_storage_mode(capsule_id, 'native')
+        get_capsule_cache().invalidate(capsule_id)
+    return migrated
+
+def _migrate_entries(capsule_id, fields, batch_size, progress=None):
+    """Rewrite every entry of a capsule in the native layout; returns the entry count."""
+    migrated = 0
+    after = None
+    while True:
+        count, after = get_backend().migrate_entries_batch(capsule_id, fields, batch_size, after=after)
+        migrated += count
+        if progress:
+            progress(migrated)
+        if after is None:
+            return migrated
 
 def get_entry_by_id(entry_id):
-    with get_graph_driver() as driver:
-        with driver.session() as session:
-            result = session.run(
-                "MATCH (e:Entry {id: $id}) RETURN e",
-                id=entry_id
-            )
-            return result.single()["e"] if result.single() else None
+    return get_backend().get_entry_by_id(entry_id)
 
 def delete_entry(entry_id):
-    with get_graph_driver() as driver:
-        with driver.session() as session:
-            session.run(
-                "MATCH (e:Entry {id: $id}) DETACH DELETE e",
-                id=entry_id
-            )
-
-# Snapshot CRUD (Graph)
+    get_backend().delete_entry(entry_id)
+    get_versions().bump()
+
+# Snapshot CRUD (Graph): versions are stored as keyframes plus deltas (see snapshots.py)
 def create_snapshot(entry_id, created_at, payload):
-    with get_graph_driver() as driver:
-        with driver.session() as session:
-            result = session.run(
-                """
-                MATCH (e:Entry {id: $entry_id})
-                CREATE (s:Snapshot {id: randomUUID(), created_at: $created_at, payload: $payload})
-                CREATE (e)-[:HAS_SNAPSHOT]->(s)
-                RETURN s.id AS id
-                """,
-                entry_id=entry_id, created_at=created_at.isoformat(), payload=payload
-            )
-            return result.single()["id"]
+    snapshot_id = snapshots.create_snapshot(entry_id, created_at, payload)
+    get_versions().bump(SNAPSHOTS)
+    return snapshot_id
+
+def get_snapshot(snapshot_id):
+    return snapshots.get_snapshot(snapshot_id)
 
 def get_snapshots_by_entry(entry_id):
-    with get_graph_driver() as driver:
-        with driver.session() as session:
-            result = session.run(
-                """
-                MATCH (e:Entry {id: $entry_id})-[:HAS_SNAPSHOT]->(s:Snapshot)
-                RETURN s
-                """,
-                entry_id=entry_id
-            )
-            return [record["s"] for record in result]
+    """Return an entry's snapshots, payloads rebuilt, ordered by created_at."""
+    return snapshots.get_snapshots_by_entry(entry_id)
+
+def get_snapshot_history(entry_id, limit=DEFAULT_PAGE_SIZE, after=None, include_payload=True):
+    """Return `(snapshots, next_cursor)` for one page of an entry's history ordered by created_at."""
+    return snapshots.get_snapshot_history(entry_id, limit=limit, after=after, include_payload=include_payload)
+
+def compact_snapshots(entry_id, keep):
+    """Fold all but the newest `keep` versions of an entry into one keyframe. Returns the count removed."""
+    removed = snapshots.compact_snapshots(entry_id, keep)
+    get_versions().bump(SNAPSHOTS)
+    return removed
+
+def import_snapshots_batch(rows):
+    """Store raw snapshot records from an archive (see archive.py) as they are. Returns the number created."""
+    created = get_backend().import_snapshots_batch(rows)
+    get_versions().bump(SNAPSHOTS)
+    return created
+
+def iter_capsule_snapshots(capsule_id):
+    """Yield the raw (keyframe/delta) snapshot records of a capsule's entries, each with its `entry_id`."""
+    return get_backend().iter_capsule_snapshots(capsule_id)
 
 # Tag CRUD (Graph)
 def create_tag(name):
-    with get_graph_driver() as driver:
-        with driver.session() as session:
-            result = session.run(
-                """
-                CREATE (tag:Tag {id: randomUUID(), name: $name})
-                RETURN tag.id AS id
-                """,
-                name=name
-            )
-            return result.single()["id"]
+    return get_backend().create_tag(name)
 
 def get_tag_by_name(name):
-    with get_graph_driver() as driver:
-        with driver.session() as session:
-            result = session.run(
-                "MATCH (tag:Tag {name: $name}) RETURN tag",
-                name=name
-            )
-            record = result.single()
-            return record["tag"] if record else None
+    return get_backend().get_tag_by_name(name)
 
 # Template CRUD (Graph)
 def create_template(name, structure):
-    with get_graph_driver() as driver:
-        with driver.session() as session:
-            result = session.run(
-                """
-                CREATE (tpl:Template {id: randomUUID(), name: $name, structure: $structure})
-                RETURN tpl.id AS id
-                """,
-                name=name, structure=structure
-            )
-            return result.single()["id"]
+    """Create a template, or return the existing id when the name exists with the same structure.
+
+    Raises ValueError when the name is taken by a template with another structure.
+    """
+    return get_backend().create_template(name, structure)
 
 def get_template_by_name(name):
-    with get_graph_driver() as driver:
-        with driver.session() as session:
-            result = session.run(
-                "MATCH (tpl:Template {name: $name}) RETURN tpl",
-                name=name
-            )
-            record = result.single()
-            return record["tpl"] if record else None
+    return get_backend().get_template_by_name(name)
+
+def get_template(template_id):
+    return get_backend().get_template(template_id)
 
 # --- Relationship/Edge Creation Functions ---
 
 def link_entry_to_entry(source_entry_id, target_entry_id):
     """Create a LINKS_TO edge from one Entry to another."""
-    with get_graph_driver() as driver:
-        with driver.session() as session:
-            session.run(
-                """
-                MATCH (src:Entry {id: $source_entry_id}), (tgt:Entry {id: $target_entry_id})
-                MERGE (src)-[:LINKS_TO]->(tgt)
-                """,
-                source_entry_id=source_entry_id, target_entry_id=target_entry_id
-            )
+    get_backend().link_entry_to_entry(source_entry_id, target_entry_id)
+    get_versions().bump(LINKS)
 
 def tag_entry(entry_id, tag_name):
     """Tag an Entry with a Tag node (creates TAGGED_AS edge)."""
-    with get_graph_driver() as driver:
-        with driver.session() as session:
-            session.run(
-                """
-                MATCH (e:Entry {id: $entry_id})
-                MERGE (tag:Tag {name: $tag_name})
-                MERGE (e)-[:TAGGED_AS]->(tag)
-                """,
-                entry_id=entry_id, tag_name=tag_name
-            )
+    get_backend().tag_entry(entry_id, tag_name)
+    get_versions().bump(TAGS)
+
+DEFAULT_EDGE_BATCH_SIZE = 5000
+
+def _write_edges_batched(write, pairs, batch_size, scope):
+    """Dedupe pairs, write them in batches and sum the per-batch edge counts."""
+    seen = set()
+    unique = []
+    for pair in pairs:
+        pair = tuple(pair)
+        if pair not in seen:
+            seen.add(pair)
+            unique.append(pair)
+    totals = {'created': 0, 'existing': 0, 'missing': 0, 'duplicates': len(pairs) - len(unique), 'batches': 0}
+    for start in range(0, len(unique), batch_size):
+        counts = write(unique[start:start + batch_size])
+        for key, value in counts.items():
+            totals[key] += value
+        totals['batches'] += 1
+    if totals['created']:
+        get_versions().bump(scope)
+    return totals
+
+def tag_entries(pairs, batch_size=DEFAULT_EDGE_BATCH_SIZE):
+    """Tag many entries from `(entry_id, tag_name)` pairs, one UNWIND MERGE per batch.
+
+    Returns counts of TAGGED_AS edges `created` and already `existing`, pairs
+    whose entry is `missing`, repeated `duplicates` and the number of `batches`.
+    """
+    return _write_edges_batched(get_backend().tag_entries_batch, pairs, batch_size, TAGS)
+
+def link_entries(pairs, batch_size=DEFAULT_EDGE_BATCH_SIZE):
+    """Create LINKS_TO edges from `(source_id, target_id)` pairs in batches; counts as for tag_entries."""
+    return _write_edges_batched(get_backend().link_entries_batch, pairs, batch_size, LINKS)
 
 def assign_template_to_entry(entry_id, template_id):
     """Assign a Template to an Entry (USES_TEMPLATE edge)."""
-    with get_graph_driver() as driver:
-        with driver.session() as session:
-            session.run(
-                """
-                MATCH (e:Entry {id: $entry_id}), (tpl:Template {id: $template_id})
-                MERGE (e)-[:USES_TEMPLATE]->(tpl)
-                """,
-                entry_id=entry_id, template_id=template_id
-            )
+    get_backend().assign_template_to_entry(entry_id, template_id)
+    get_versions().bump(TEMPLATES)
+
+def assign_templates(pairs, batch_size=DEFAULT_EDGE_BATCH_SIZE):
+    """Create USES_TEMPLATE edges from `(entry_id, template_id)` pairs in batches; counts as for tag_entries."""
+    return _write_edges_batched(get_backend().assign_templates_batch, pairs, batch_size, TEMPLATES)
 
 # --- Traversal/Query Functions ---
 
 def get_linked_entries(entry_id):
     """Return all entries directly linked from the given entry."""
-    with get_graph_driver() as driver:
-        with driver.session() as session:
-            result = session.run(
-                """
-                MATCH (e:Entry {id: $entry_id})-[:LINKS_TO]->(linked:Entry)
-                RETURN linked
-                """,
-                entry_id=entry_id
-            )
-            return [record["linked"] for record in result]
+    return get_backend().get_linked_entries(entry_id)
 
 def get_tags_for_entry(entry_id):
     """Return all tags for an entry."""
-    with get_graph_driver() as driver:
-        with driver.session() as session:
-            result = session.run(
-                """
-                MATCH (e:Entry {id: $entry_id})-[:TAGGED_AS]->(tag:Tag)
-                RETURN tag
-                """,
-                entry_id=entry_id
-            )
-            return [record["tag"] for record in result]
+    return get_backend().get_tags_for_entry(entry_id)
 
 def get_template_for_entry(entry_id):
     """Return the template assigned to an entry, if any."""
-    with get_graph_driver() as driver:
-        with driver.session() as session:
-            result = session.run(
-                """
-                MATCH (e:Entry {id: $entry_id})-[:USES_TEMPLATE]->(tpl:Template)
-                RETURN tpl
-                """,
-                entry_id=entry_id
-            )
-            record = result.single()
-            return record["tpl"] if record else None
-
-def get_linked_entries_recursive(entry_id, max_depth=5, _visited=None):
-    """Recursively fetch all entries linked from the given entry (traverse LINKS_TO). Returns a flat list of unique entries."""
-    if _visited is None:
-        _visited = set()
-    if entry_id in _visited or max_depth <= 0:
+    return get_backend().get_template_for_entry(entry_id)
+
+def get_entry_details(entry_id):
+    """Return an entry with its tags, outgoing links and template (see async_db for the concurrent variant)."""
+    entry = get_entry_by_id(entry_id)
+    if entry is None:
+        return None
+    return {
+        'entry': entry,
+        'tags': get_tags_for_entry(entry_id),
+        'linked_entries': get_linked_entries(entry_id),
+        'template': get_template_for_entry(entry_id),
+    }
+
+def traverse_linked_entries(entry_id, max_depth=5, limit=None, fan_out=None):
+    """Breadth-first LINKS_TO traversal with one batched query per depth level.
+
+    Returns `(hits, truncated)`; each hit carries the linked `entry`, its `depth`
+    and the `path` of entry ids from the start. `limit` caps the number of nodes
+    returned and `fan_out` caps the links followed out of any single entry.
+    """
+    return get_backend().traverse_linked_entries(entry_id, max_depth=max_depth, limit=limit, fan_out=fan_out)
+
+def get_linked_entries_recursive(entry_id, max_depth=5):
+    """Fetch all entries reachable from the given entry via LINKS_TO. Returns a flat list of unique entries."""
+    if max_depth <= 0:
         return []
-    _visited.add(entry_id)
-    with get_graph_driver() as driver:
-        with driver.session() as session:
-            # Get directly linked entries
-            result = session.run(
-                """
-                MATCH (e:Entry {id: $entry_id})-[:LINKS_TO]->(linked:Entry)
-                RETURN linked
-                """,
-                entry_id=entry_id
-            )
-            linked_entries = [record["linked"] for record in result]
-            all_entries = []
-            for entry in linked_entries:
-                eid = entry["id"]
-                if eid not in _visited:
-                    all_entries.append(entry)
-                    # Recurse
-                    all_entries.extend(get_linked_entries_recursive(eid, max_depth-1, _visited))
-            return all_entries
-
-def search_entries_by_text(text):
-    """Search entries whose properties JSON contains the given text (case-insensitive substring match)."""
-    with get_graph_driver() as driver:
-        with driver.session() as session:
-            # Use CONTAINS for substring search on properties (stored as JSON string)
-            result = session.run(
-                """
-                MATCH (e:Entry)
-                WHERE toLower(e.properties) CONTAINS toLower($text)
-                RETURN e
-                """,
-                text=text
-            )
-            return [record["e"] for record in result]
+    hits, _ = traverse_linked_entries(entry_id, max_depth=max_depth)
+    return [hit['entry'] for hit in hits]
+
+def search_entries(query, skip=0, limit=None):
+    """Relevance-ranked full-text search over entry property values.
+
+    Supports free-text terms and `field:value` scoping (see search.parse_query).
+    Returns a list of `(entry, score)` pairs, best match first.
+    """
+    return get_backend().search_entries(query, skip=skip, limit=limit)
+
+def search_entries_by_text(text, skip=0, limit=None):
+    """Search entries whose property values match the query, best match first."""
+    return [entry for entry, _ in search_entries(text, skip=skip, limit=limit)]
+
+def search_entries_combined(text=None, tag=None, linked_to=None, mode='and', skip=0, limit=None):
+    """Evaluate text, tag and linked_to predicates as one composed query.
+
+    `text` uses the full-text index, `tag` matches a TAGGED_AS tag name and
+    `linked_to` matches entries joined to that entry id by a LINKS_TO edge in
+    either direction. With mode='and' an entry must satisfy every given
+    predicate; with mode='or' any one is enough. Returns `(entry, score)` pairs
+    ordered by relevance (score is 0 for non-text matches).
+    """
+    return get_backend().search_entries_combined(
+        text=text, tag=tag, linked_to=linked_to, mode=mode, skip=skip, limit=limit
+    )
 
 def filter_entries_by_tag(tag_name):
     """Return all entries tagged with the given tag name."""
-    with get_graph_driver() as driver:
-        with driver.session() as session:
-            result = session.run(
-                """
-                MATCH (e:Entry)-[:TAGGED_AS]->(tag:Tag {name: $tag_name})
-                RETURN e
-                """,
-                tag_name=tag_name
-            )
-            return [record["e"] for record in result]
-
-# Optionally, add filter by date or custom fields as needed
+    return get_backend().filter_entries_by_tag(tag_name)
+
+# Tag analytics: entry counts per tag are maintained on every tag write and entry removal
+def get_tag_counts(capsule_id=None, limit=None):
+    """Return `[{'name', 'entries'}]` for every tag in use, overall or in one capsule, most used first."""
+    return get_backend().get_tag_counts(capsule_id=capsule_id, limit=limit)
+
+def get_tag_cooccurrence(tag_name, capsule_id=None, limit=None):
+    """Return the tags found on entries tagged `tag_name`, with the number of entries they share, most first."""
+    return get_backend().get_tag_cooccurrence(tag_name, capsule_id=capsule_id, limit=limit)
+
+def get_entries_with_tags(tag_names, limit=DEFAULT_PAGE_SIZE, capsule_id=None, after=None):
+    """Return one page of the entries carrying every tag in `tag_names`, ordered by (timestamp, id).
+
+    The least used tag's entries are walked and checked for the others.
+    Returns `(entries, next_cursor)` like get_entries_page.
+    """
+    return get_backend().get_entries_with_tags(list(tag_names), limit, capsule_id=capsule_id, after=after)
+
+# Time and count every data-layer call (see metrics.py); connection plumbing is left unwrapped.
+instrument_module(globals(), exclude=('get_graph_driver', 'get_session', 'close_backend', 'init_app'))
 
 if __name__ == '__main__':
     # The database is initialized with the first capsule for testing purposes.
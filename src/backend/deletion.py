@@ -0,0 +1,122 @@
+"""Background capsule deletion.
+
+Deleting a capsule through the API marks it deleted, so it disappears from
+every read at once, and starts a DeletionJob that purges its entries and
+their snapshots (with all their edges) in batches of
+RECALL_DELETE_BATCH_SIZE entries (default 1000). Each batch is its own
+short transaction, and the job sleeps RECALL_DELETE_PAUSE_MS (default 20)
+between batches, so writers on other capsules are never held behind one
+large delete. Job progress is kept per capsule for the status endpoint;
+`python src/backend/purge_capsules.py` finishes purges interrupted by a
+restart.
+"""
+from collections import OrderedDict
+from datetime import datetime, UTC
+import os
+import threading
+from db import DEFAULT_PURGE_BATCH_SIZE, mark_capsule_deleted, purge_capsule
+
+DEFAULT_PAUSE_MS = 20
+# Finished jobs kept for status queries; running ones are never dropped.
+MAX_FINISHED_JOBS = 100
+
+
+class DeletionJob:
+    """Progress of one capsule's purge, updated from its worker thread."""
+
+    def __init__(self, capsule_id):
+        self.capsule_id = capsule_id
+        self.status = 'running'
+        self.entries = 0
+        self.snapshots = 0
+        self.batches = 0
+        self.error = None
+        self.started_at = datetime.now(UTC)
+        self.finished_at = None
+        self._done = threading.Event()
+
+    def progress(self, entries, snapshots):
+        self.entries = entries
+        self.snapshots = snapshots
+        self.batches += 1
+
+    def run(self, batch_size, pause):
+        try:
+            purge_capsule(self.capsule_id, batch_size=batch_size, pause=pause, progress=self.progress)
+            self.status = 'done'
+        except Exception as e:
+            self.status = 'failed'
+            self.error = str(e)
+            print(f"[Recall] Deleting capsule {self.capsule_id} failed after {self.entries} entries: {e}")
+        finally:
+            self.finished_at = datetime.now(UTC)
+            self._done.set()
+
+    def wait(self, timeout=None):
+        """Block until the job has finished; returns False on timeout."""
+        return self._done.wait(timeout)
+
+    def to_dict(self):
+        return {
+            'capsule_id': self.capsule_id,
+            'status': self.status,
+            'entries_deleted': self.entries,
+            'snapshots_deleted': self.snapshots,
+            'batches': self.batches,
+            'error': self.error,
+            'started_at': self.started_at.isoformat(),
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class DeletionJobs:
+    """Runs DeletionJobs on daemon threads and keeps them by capsule id."""
+
+    def __init__(self, batch_size=DEFAULT_PURGE_BATCH_SIZE, pause=DEFAULT_PAUSE_MS / 1000):
+        self.batch_size = batch_size
+        self.pause = pause
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(self, capsule_id):
+        job = DeletionJob(capsule_id)
+        with self._lock:
+            self._jobs.pop(capsule_id, None)
+            self._jobs[capsule_id] = job
+            finished = [key for key, other in self._jobs.items() if other.finished_at is not None]
+            for key in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+                del self._jobs[key]
+        threading.Thread(
+            target=job.run, args=(self.batch_size, self.pause), name=f'recall-delete-{capsule_id}', daemon=True
+        ).start()
+        return job
+
+    def get(self, capsule_id):
+        with self._lock:
+            return self._jobs.get(capsule_id)
+
+    def clear(self):
+        with self._lock:
+            self._jobs.clear()
+
+
+_jobs = None
+_jobs_lock = threading.Lock()
+
+
+def get_deletion_jobs():
+    global _jobs
+    with _jobs_lock:
+        if _jobs is None:
+            _jobs = DeletionJobs(
+                batch_size=int(os.getenv('RECALL_DELETE_BATCH_SIZE', str(DEFAULT_PURGE_BATCH_SIZE))),
+                pause=int(os.getenv('RECALL_DELETE_PAUSE_MS', str(DEFAULT_PAUSE_MS))) / 1000,
+            )
+        return _jobs
+
+
+def delete_capsule_in_background(capsule_id):
+    """Mark a capsule deleted and start purging it. Returns the DeletionJob, or None if there is no such capsule."""
+    if not mark_capsule_deleted(capsule_id):
+        return None
+    return get_deletion_jobs().start(capsule_id)
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+from search import field_key
+from validation import coerce_value
+
+# How entry properties are laid out on Entry nodes, per capsule (`storage_mode`):
+#   json   - everything in the `properties` JSON string (the original layout)
+#   native - schema-declared fields as typed node properties named `f_<field>`,
+#            with only undeclared keys left in the `properties` JSON overflow
+# A capsule being converted by migrate_entries.py is `migrating`: new entries are
+# already written natively, but filters still scan until every entry is moved.
+STORAGE_MODES = ('json', 'native')
+MIGRATING = 'migrating'
+NATIVE_PREFIX = 'f_'
+NATIVE_TYPES = ('int', 'boolean', 'string')
+
+
+def default_storage_mode():
+    """Storage mode for new capsules (RECALL_ENTRY_STORAGE, default native)."""
+    mode = os.getenv('RECALL_ENTRY_STORAGE', 'native').lower()
+    return mode if mode in STORAGE_MODES else 'native'
+
+
+def capsule_storage_mode(capsule):
+    """Capsules created before storage modes existed keep everything in JSON."""
+    return (capsule or {}).get('storage_mode') or 'json'
+
+
+def writes_native(capsule):
+    return capsule_storage_mode(capsule) in ('native', MIGRATING)
+
+
+def native_key(name):
+    """Node property holding a declared field's typed value."""
+    return NATIVE_PREFIX + name
+
+
+def field_index_name(name):
+    """Name of the range index over a declared field's node property.
+
+    `field_key` folds case and punctuation ("Temp C" and "temp_c" share a key),
+    so a short hash of the raw name keeps distinct fields on distinct indexes.
+    """
+    digest = hashlib.sha1(name.encode('utf-8')).hexdigest()[:8]
+    return f'entry_field_{field_key(name)}_{digest}'
+
+
+def native_fields(fields):
+    """Declared fields that can be stored as typed node properties, keyed by name."""
+    return {
+        field['name']: field.get('type', 'string')
+        for field in fields or []
+        if field.get('name') and field.get('type', 'string') in NATIVE_TYPES
+    }
+
+
+def _load(properties):
+    if isinstance(properties, str):
+        try:
+            properties = json.loads(properties)
+        except ValueError:
+            return {}
+    return properties if isinstance(properties, dict) else {}
+
+
+def is_typed(field_type, value):
+    if value is None or isinstance(value, (dict, list)):
+        return False
+    try:
+        coerced = coerce_value(field_type, value)
+    except ValueError:
+        return False
+    return type(coerced) is type(value) and coerced == value
+
+
+def split_properties(fields, properties):
+    """Split entry properties into `(overflow_json, native)` for a native-mode capsule.
+
+    Declared fields whose values already have their declared type move into
+    `native` (`{'f_<name>': value}`); everything else stays in the JSON
+    overflow, so reassembled properties always equal what was written.
+    """
+    declared = native_fields(fields)
+    overflow = {}
+    native = {}
+    for name, value in _load(properties).items():
+        field_type = declared.get(name)
+        if field_type is not None and is_typed(field_type, value):
+            native[native_key(name)] = value
+        else:
+            overflow[name] = value
+    return json.dumps(overflow), native
+
+
+def merge_properties(properties, native):
+    """Recombine a JSON overflow and native field values into one properties dict."""
+    merged = _load(properties)
+    for key, value in (native or {}).items():
+        merged[key[len(NATIVE_PREFIX):]] = value
+    return merged
+
+
+def assemble_entry(node):
+    """Turn stored Entry node properties back into the public entry shape.
+
+    Native `f_<field>` properties are folded into the `properties` JSON string,
+    so callers see the same payload whichever storage mode wrote the entry.
+    """
+    entry = dict(node)
+    native = {key: entry.pop(key) for key in list(entry) if key.startswith(NATIVE_PREFIX)}
+    if native:
+        entry['properties'] = json.dumps(merge_properties(entry.get('properties'), native))
+    return entry
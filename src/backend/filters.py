@@ -0,0 +1,117 @@
+import json
+import re
+from urllib.parse import unquote_plus
+from validation import coerce_value, parse_timestamp, to_utc
+
+# Comparison operators accepted in entry filter query strings, longest first so
+# `>=` is not read as `>` followed by `=30`.
+OPERATORS = ('>=', '<=', '!=', '>', '<', '=')
+CYPHER_OPERATORS = {'>=': '>=', '<=': '<=', '!=': '<>', '>': '>', '<': '<', '=': '='}
+
+# Time buckets for entry counts, as accepted by Cypher's datetime.truncate.
+BUCKETS = ('hour', 'day')
+
+_FILTER_RE = re.compile(r'^(?P<field>[^<>=!]+?)(?P<op>>=|<=|!=|>|<|=)(?P<value>.*)$')
+
+
+def parse_filters(query_string, fields, reserved=()):
+    """Parse `field<op>value` terms from a raw query string, e.g. `temperature>30&ok=true`.
+
+    Only schema-declared fields may be filtered; values are coerced to the
+    field's type. Parameters named in `reserved` (limit, after, ...) are
+    skipped. Returns a list of `(field, op, value)` or raises ValueError.
+    """
+    declared = {field['name']: field.get('type', 'string') for field in fields or [] if field.get('name')}
+    filters = []
+    for part in (query_string or '').split('&'):
+        if not part:
+            continue
+        term = unquote_plus(part)
+        match = _FILTER_RE.match(term)
+        if not match:
+            raise ValueError(f"Invalid filter '{term}'")
+        name, op, value = match.group('field'), match.group('op'), match.group('value')
+        if op == '=' and name in reserved:
+            continue
+        if name not in declared:
+            raise ValueError(f"Unknown field '{name}'")
+        if declared[name] not in ('int', 'boolean', 'string'):
+            raise ValueError(f"Field '{name}' cannot be filtered")
+        if declared[name] == 'boolean' and op not in ('=', '!='):
+            raise ValueError(f"Field '{name}' only supports = and !=")
+        try:
+            filters.append((name, op, coerce_value(declared[name], value)))
+        except ValueError as e:
+            raise ValueError(f"Field '{name}': {e}")
+    return filters
+
+
+def _compare(left, op, right):
+    if left is None:
+        return False
+    try:
+        if op == '=':
+            return left == right
+        if op == '!=':
+            return left != right
+        if op == '>':
+            return left > right
+        if op == '<':
+            return left < right
+        if op == '>=':
+            return left >= right
+        return left <= right
+    except TypeError:
+        return False
+
+
+def entry_matches(entry, filters):
+    """Evaluate parsed filters against an entry's (JSON) properties."""
+    properties = entry.get('properties')
+    if isinstance(properties, str):
+        try:
+            properties = json.loads(properties)
+        except ValueError:
+            properties = {}
+    properties = properties or {}
+    return all(_compare(properties.get(name), op, value) for name, op, value in filters)
+
+
+def parse_time_range(args):
+    """Read `from` (inclusive) and `to` (exclusive) ISO timestamps from request args as UTC datetimes.
+
+    Either may be missing (None). Raises ValueError when one is malformed or
+    the range is empty.
+    """
+    bounds = []
+    for name in ('from', 'to'):
+        value = args.get(name)
+        try:
+            bounds.append(to_utc(parse_timestamp(value)) if value else None)
+        except ValueError:
+            raise ValueError(f"'{name}' must be an ISO-8601 timestamp")
+    start, end = bounds
+    if start is not None and end is not None and start >= end:
+        raise ValueError("'from' must be before 'to'")
+    return start, end
+
+
+def entry_time(entry):
+    """Return an entry's timestamp as a UTC datetime (None when it has none or it does not parse)."""
+    try:
+        return to_utc(parse_timestamp(entry.get('timestamp')))
+    except (ValueError, TypeError):
+        return None
+
+
+def in_range(moment, start=None, end=None):
+    if moment is None:
+        return False
+    return (start is None or moment >= start) and (end is None or moment < end)
+
+
+def truncate(moment, bucket):
+    """Truncate a UTC datetime to the start of its hour or day."""
+    if bucket == 'hour':
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
@@ -0,0 +1,134 @@
+"""Capsule graph export in Cytoscape.js `elements` format.
+
+The export is a handful of bulk reads, whatever the capsule size: one
+ordered entry stream plus one query per edge type (LINKS_TO, TAGGED_AS,
+USES_TEMPLATE and optionally HAS_SNAPSHOT). Elements are written as a flat
+array of `{"group": "nodes"|"edges", "data": {...}}` objects, each tag,
+template or snapshot node emitted just before its first edge, so the body
+can be streamed without holding it in memory.
+
+Large capsules are capped at `limit` entry nodes, chosen by `prune`:
+  none    the first entries in (timestamp, id) order
+  degree  the most connected entries (LINKS_TO and TAGGED_AS edges)
+  sample  a uniform reservoir sample (reproducible with `seed`)
+"""
+import heapq
+import json
+import random
+from storage import get_backend
+
+DEFAULT_NODE_LIMIT = 2000
+MAX_NODE_LIMIT = 50000
+PRUNE_MODES = ('none', 'degree', 'sample')
+CHUNK_SIZE = 64 * 1024
+
+
+def _label(entry, fields):
+    try:
+        properties = json.loads(entry.get('properties') or '{}')
+    except ValueError:
+        properties = {}
+    for field in fields or []:
+        value = properties.get(field.get('name'))
+        if value not in (None, ''):
+            return str(value)
+    return entry.get('timestamp')
+
+
+def select_entries(capsule_id, limit, prune='none', seed=None, state=None):
+    """Yield at most `limit` of a capsule's entries in (timestamp, id) order.
+
+    Sets `state['truncated']` once it is known whether entries were left out.
+    """
+    state = state if state is not None else {}
+    backend = get_backend()
+    entries = backend.iter_entries_by_capsule(capsule_id)
+    if prune == 'degree':
+        degrees = backend.get_capsule_degrees(capsule_id)
+        state['truncated'] = len(degrees) > limit
+        keep = set(heapq.nlargest(limit, degrees, key=lambda entry_id: (degrees[entry_id], entry_id)))
+        yield from (entry for entry in entries if entry['id'] in keep)
+    elif prune == 'sample':
+        rng = random.Random(seed)
+        sample = []
+        seen = 0
+        for index, entry in enumerate(entries):
+            seen += 1
+            if index < limit:
+                sample.append((index, entry))
+            else:
+                slot = rng.randint(0, index)
+                if slot < limit:
+                    sample[slot] = (index, entry)
+        state['truncated'] = seen > limit
+        yield from (entry for _, entry in sorted(sample, key=lambda item: item[0]))
+    else:
+        state['truncated'] = False
+        for index, entry in enumerate(entries):
+            if index == limit:
+                state['truncated'] = True
+                break
+            yield entry
+
+
+def _related_node(rel_type, node):
+    if rel_type == 'TAGGED_AS':
+        return f"tag:{node['name']}", {'type': 'tag', 'label': node['name']}
+    if rel_type == 'USES_TEMPLATE':
+        return f"template:{node['id']}", {'type': 'template', 'label': node.get('name')}
+    return node['id'], {'type': 'snapshot', 'label': node.get('created_at'), 'version': node.get('seq')}
+
+
+def iter_elements(capsule, limit=DEFAULT_NODE_LIMIT, prune='none', seed=None, snapshots=False, state=None):
+    """Yield the capsule's Cytoscape elements; `state` receives node/edge counts and `truncated`."""
+    state = state if state is not None else {}
+    state.update(nodes=0, edges=0)
+    backend = get_backend()
+    entry_ids = set()
+    for entry in select_entries(capsule['id'], limit, prune=prune, seed=seed, state=state):
+        entry_ids.add(entry['id'])
+        state['nodes'] += 1
+        yield {'group': 'nodes', 'data': {
+            'id': entry['id'], 'type': 'entry', 'label': _label(entry, capsule.get('fields')),
+            'timestamp': entry.get('timestamp'),
+        }}
+    rel_types = ['LINKS_TO', 'TAGGED_AS', 'USES_TEMPLATE'] + (['HAS_SNAPSHOT'] if snapshots else [])
+    for rel_type in rel_types:
+        emitted = set()
+        for entry_id, node in backend.iter_capsule_relations(capsule['id'], rel_type):
+            if entry_id not in entry_ids:
+                continue
+            if rel_type == 'LINKS_TO':
+                if node['id'] not in entry_ids:
+                    continue
+                target = node['id']
+            else:
+                target, data = _related_node(rel_type, node)
+                if target not in emitted:
+                    emitted.add(target)
+                    state['nodes'] += 1
+                    yield {'group': 'nodes', 'data': dict(data, id=target)}
+            state['edges'] += 1
+            yield {'group': 'edges', 'data': {
+                'id': f'{entry_id}-{rel_type}-{target}', 'source': entry_id, 'target': target, 'type': rel_type,
+            }}
+
+
+def stream_graph(capsule, **options):
+    """Yield the JSON document for a capsule graph in chunks of about CHUNK_SIZE characters."""
+    state = {}
+    buffer = [json.dumps({'capsule': {'id': capsule['id'], 'name': capsule.get('name')}})[:-1] + ', "elements": [']
+    size = len(buffer[0])
+    separator = ''
+    for element in iter_elements(capsule, state=state, **options):
+        text = separator + json.dumps(element, default=str)
+        separator = ', '
+        buffer.append(text)
+        size += len(text)
+        if size >= CHUNK_SIZE:
+            yield ''.join(buffer)
+            buffer, size = [], 0
+    buffer.append('], ' + json.dumps({
+        'node_count': state['nodes'], 'edge_count': state['edges'], 'truncated': state.get('truncated', False),
+    })[1:])
+    yield ''.join(buffer)
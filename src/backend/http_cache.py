@@ -0,0 +1,80 @@
+"""Conditional GET for read-only JSON endpoints.
+
+A response's strong ETag is derived from the version of the scope it reads
+(see cache.VersionCounters) plus the request variant, so an unchanged poll
+is answered with 304, or with a cached body, without touching the db.
+"""
+import hashlib
+from flask import Response, jsonify, request, stream_with_context
+from cache import get_response_cache, get_versions
+
+
+def scope_etag(scope, variant=''):
+    """Strong ETag for `scope`, or for a tuple of scopes when a response reads several."""
+    scopes = (scope,) if isinstance(scope, str) else tuple(scope)
+    versions = get_versions()
+    key = '|'.join(f'{name}:{versions.version(name)}' for name in scopes)
+    return hashlib.sha1(f'{key}|{variant}'.encode('utf-8')).hexdigest()
+
+
+def _with_etag(response, etag):
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def conditional_json(scope, build, variant=''):
+    """Serve `build()`'s JSON payload with an ETag for `scope`.
+
+    `build` returns a dict to send, or a ready response (e.g. a 404) which is
+    returned as is and never cached. The ETag is computed before `build` runs,
+    so a write during the build leaves the stored body under an outdated tag.
+    """
+    etag = scope_etag(scope, variant)
+    if request.if_none_match.contains(etag):
+        return _with_etag(Response(status=304), etag)
+    cache = get_response_cache()
+    body = cache.get(etag) if cache is not None else None
+    if body is not None:
+        return _with_etag(Response(body, mimetype='application/json'), etag)
+    payload = build()
+    if not isinstance(payload, dict):
+        return payload
+    response = jsonify(payload)
+    if cache is not None:
+        cache.set(etag, response.get_data())
+    return _with_etag(response, etag)
+
+
+def conditional_stream(scope, build, variant='', mimetype='application/json'):
+    """Like conditional_json for a body streamed as text chunks.
+
+    `build` returns an iterable of `str` chunks, or a ready response. The
+    ETag is sent with the first chunk; the body is stored in the response
+    cache once fully streamed, unless it outgrows the cache's body limit.
+    """
+    etag = scope_etag(scope, variant)
+    if request.if_none_match.contains(etag):
+        return _with_etag(Response(status=304), etag)
+    cache = get_response_cache()
+    body = cache.get(etag) if cache is not None else None
+    if body is not None:
+        return _with_etag(Response(body, mimetype=mimetype), etag)
+    chunks = build()
+    if isinstance(chunks, (Response, tuple)):
+        return chunks
+
+    def generate():
+        parts = [] if cache is not None else None
+        size = 0
+        for chunk in chunks:
+            data = chunk.encode('utf-8')
+            if parts is not None:
+                parts.append(data)
+                size += len(data)
+                if size > cache.max_body_bytes:
+                    parts = None
+            yield data
+        if parts is not None:
+            cache.set(etag, b''.join(parts))
+    return _with_etag(Response(stream_with_context(generate()), mimetype=mimetype), etag)
@@ -0,0 +1,102 @@
+from datetime import datetime, UTC
+import json
+import time
+from db import create_entries_batch
+from validation import validate_properties, parse_timestamp
+
+DEFAULT_BATCH_SIZE = 2000
+MAX_BATCH_SIZE = 20000
+
+
+def prepare_row(fields, record, now=None):
+    """Turn one submitted record into a `(timestamp, properties_json)` row.
+
+    A record is either `{"properties": {...}, "timestamp": "..."}` or a bare
+    properties object. Raises ValueError when it fails validation.
+    """
+    if not isinstance(record, dict):
+        raise ValueError('entry must be an object')
+    if 'properties' in record:
+        properties = record['properties']
+        if isinstance(properties, str):
+            try:
+                properties = json.loads(properties)
+            except ValueError:
+                raise ValueError('properties is not valid JSON')
+        timestamp = parse_timestamp(record['timestamp']) if record.get('timestamp') else (now or datetime.now(UTC))
+    else:
+        properties = record
+        timestamp = now or datetime.now(UTC)
+    return timestamp, json.dumps(validate_properties(fields, properties))
+
+
+def ingest_entries(capsule, records, batch_size=DEFAULT_BATCH_SIZE):
+    """Validate and write entries to a capsule in batches, yielding progress events.
+
+    Yields `{'event': 'batch', ...}` after each committed batch and a final
+    `{'event': 'done', ...}` summary. Rows that fail validation are skipped and
+    reported as `{'event': 'error', 'row': <index>, 'error': <message>}`;
+    records may also be ValueError instances (e.g. unparseable NDJSON lines),
+    which are reported the same way.
+    """
+    fields = capsule.get('fields', [])
+    started = time.perf_counter()
+    batch = []
+    batch_number = 0
+    created = 0
+    failed = 0
+    total = 0
+
+    def flush():
+        nonlocal batch, batch_number, created
+        batch_started = time.perf_counter()
+        ids = create_entries_batch(capsule['id'], batch)
+        batch_number += 1
+        created += len(ids)
+        event = {
+            'event': 'batch',
+            'batch': batch_number,
+            'rows': len(batch),
+            'created': len(ids),
+            'elapsed_ms': round((time.perf_counter() - batch_started) * 1000, 2),
+            'total_created': created,
+        }
+        batch = []
+        return event
+
+    for index, record in enumerate(records):
+        total += 1
+        try:
+            if isinstance(record, ValueError):
+                raise record
+            batch.append(prepare_row(fields, record))
+        except (ValueError, KeyError) as e:
+            failed += 1
+            yield {'event': 'error', 'row': index, 'error': str(e)}
+            continue
+        if len(batch) >= batch_size:
+            yield flush()
+    if batch:
+        yield flush()
+    elapsed = time.perf_counter() - started
+    yield {
+        'event': 'done',
+        'rows': total,
+        'created': created,
+        'failed': failed,
+        'batches': batch_number,
+        'elapsed_ms': round(elapsed * 1000, 2),
+        'entries_per_sec': round(created / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+def iter_ndjson(stream):
+    """Yield one parsed object per non-blank line of a binary NDJSON stream."""
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield ValueError(f'invalid JSON: {e}')
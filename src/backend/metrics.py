@@ -0,0 +1,472 @@
+"""Data-layer instrumentation: per-call and per-query timings, a slow-query log
+and per-request counters, exported in Prometheus text format at `/metrics`.
+
+Every public function in `db.py` and `async_db.py` is wrapped by
+`instrument_module`. A call records wall time, rows returned and the route
+it ran under; calls made from inside another data-layer call are attributed
+to the outer one. On Neo4j, sessions from both pools are wrapped by
+`track_session` (or `track_async_session`), so each Cypher statement also
+records the server's `result_available_after` and `result_consumed_after`
+and an estimate of connection acquisition time.
+
+Statements slower than RECALL_SLOW_QUERY_MS (default 500, 0 disables) are
+logged with their Cypher text and parameter shapes, never their values.
+RECALL_METRICS=off turns instrumentation off.
+"""
+from contextvars import ContextVar
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+
+DEFAULT_SLOW_QUERY_MS = 500.0
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# The outermost data-layer function running in this context, and the current request's counters.
+_current_call = ContextVar('recall_db_call', default=None)
+_current_request = ContextVar('recall_request', default=None)
+
+
+def metrics_enabled():
+    return os.getenv('RECALL_METRICS', 'on').lower() not in ('off', '0', 'false', 'no')
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a tuple of label values."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, labels, value):
+        counts, total = self.series.get(labels, ([0] * (len(self.buckets) + 1), 0.0))
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+        counts[-1] += 1
+        self.series[labels] = (counts, total + value)
+
+
+class RequestStats:
+    """Data-layer work done while serving one request."""
+
+    __slots__ = ('route', 'calls', 'queries', 'db_time')
+
+    def __init__(self, route):
+        self.route = route
+        self.calls = 0
+        self.queries = 0
+        self.db_time = 0.0
+
+
+class MetricsRegistry:
+    """Thread-safe store of data-layer counters and histograms."""
+
+    def __init__(self, slow_query_ms=DEFAULT_SLOW_QUERY_MS):
+        self.slow_query_ms = slow_query_ms
+        self._lock = threading.Lock()
+        self.clear()
+
+    @classmethod
+    def from_env(cls):
+        return cls(float(os.getenv('RECALL_SLOW_QUERY_MS', DEFAULT_SLOW_QUERY_MS)))
+
+    def clear(self):
+        with self._lock:
+            self.calls = {}
+            self.errors = {}
+            self.rows = {}
+            self.queries = {}
+            self.slow_queries = {}
+            self.call_seconds = Histogram()
+            self.query_available_seconds = Histogram()
+            self.query_consumed_seconds = Histogram()
+            self.acquire_seconds = Histogram()
+
+    def observe_call(self, function, route, seconds, rows, failed=False):
+        labels = (function, route)
+        with self._lock:
+            self.calls[labels] = self.calls.get(labels, 0) + 1
+            self.rows[labels] = self.rows.get(labels, 0) + rows
+            if failed:
+                self.errors[labels] = self.errors.get(labels, 0) + 1
+            self.call_seconds.observe(labels, seconds)
+
+    def observe_query(self, function, route, cypher, parameters, available_ms, consumed_ms, acquire_seconds=None):
+        labels = (function, route)
+        slow = self.slow_query_ms > 0 and available_ms + consumed_ms >= self.slow_query_ms
+        with self._lock:
+            self.queries[labels] = self.queries.get(labels, 0) + 1
+            self.query_available_seconds.observe(labels, available_ms / 1000)
+            self.query_consumed_seconds.observe(labels, consumed_ms / 1000)
+            if acquire_seconds is not None:
+                self.acquire_seconds.observe(labels, acquire_seconds)
+            if slow:
+                self.slow_queries[labels] = self.slow_queries.get(labels, 0) + 1
+        if slow:
+            print(
+                f"[Recall] Slow query in {function} ({route}): available after {available_ms} ms, "
+                f"consumed after {consumed_ms} ms\n    {' '.join(cypher.split())}\n"
+                f"    params: {json.dumps(param_shape(parameters))}"
+            )
+
+    def render(self, gauges=None):
+        """Return every metric in Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            _counter(lines, 'recall_db_calls_total', 'Data-layer function calls', self.calls)
+            _counter(lines, 'recall_db_errors_total', 'Data-layer calls that raised', self.errors)
+            _counter(lines, 'recall_db_rows_total', 'Rows returned by data-layer calls', self.rows)
+            _histogram(lines, 'recall_db_call_seconds', 'Data-layer call wall time', self.call_seconds)
+            _counter(lines, 'recall_neo4j_queries_total', 'Cypher statements run', self.queries)
+            _counter(lines, 'recall_neo4j_slow_queries_total', 'Cypher statements over the slow-query threshold',
+                     self.slow_queries)
+            _histogram(lines, 'recall_neo4j_result_available_seconds', 'Server time until the first record was available',
+                       self.query_available_seconds)
+            _histogram(lines, 'recall_neo4j_result_consumed_seconds', 'Server time until the result was consumed',
+                       self.query_consumed_seconds)
+            _histogram(lines, 'recall_neo4j_acquire_seconds',
+                       'Connection acquisition time, estimated from the first statement of each session',
+                       self.acquire_seconds)
+        for name, (help_text, value) in (gauges or {}).items():
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge', f'{name} {value}']
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels, extra=''):
+    function, route = labels
+    return f'{{function="{_escape(function)}",route="{_escape(route)}"{extra}}}'
+
+
+def _counter(lines, name, help_text, values):
+    lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+    lines += [f'{name}{_labels(labels)} {value}' for labels, value in sorted(values.items())]
+
+
+def _histogram(lines, name, help_text, histogram):
+    lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+    for labels, (counts, total) in sorted(histogram.series.items()):
+        for bound, count in zip(list(histogram.buckets) + ['+Inf'], counts):
+            le = f',le="{bound}"'
+            lines.append(f'{name}_bucket{_labels(labels, le)} {count}')
+        lines.append(f'{name}_sum{_labels(labels)} {total:.6f}')
+        lines.append(f'{name}_count{_labels(labels)} {counts[-1]}')
+
+
+def param_shape(value):
+    """Describe a query parameter without its contents, e.g. `{"rows": "list[500] of {...}"}`."""
+    if isinstance(value, dict):
+        return {key: param_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        if not value:
+            return 'list[0]'
+        return f'list[{len(value)}] of {json.dumps(param_shape(value[0]))}'
+    if isinstance(value, str):
+        return f'str[{len(value)}]'
+    return type(value).__name__
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics():
+    """Return the process-wide metrics registry, configured from the environment on first use."""
+    global _metrics
+    if _metrics is None:
+        with _metrics_lock:
+            if _metrics is None:
+                _metrics = MetricsRegistry.from_env()
+    return _metrics
+
+
+def current_route():
+    stats = _current_request.get()
+    return stats.route if stats is not None else 'none'
+
+
+def begin_request(route):
+    """Start counting data-layer work for a request; returns its RequestStats."""
+    stats = RequestStats(route)
+    _current_request.set(stats)
+    return stats
+
+
+def request_stats():
+    return _current_request.get()
+
+
+def end_request():
+    _current_request.set(None)
+
+
+def stats_headers(stats):
+    """X-DB-* response headers for a request's RequestStats."""
+    return {
+        'X-DB-Calls': str(stats.calls),
+        'X-DB-Queries': str(stats.queries),
+        'X-DB-Time': f'{stats.db_time * 1000:.3f}',
+    }
+
+
+def _row_count(result):
+    if isinstance(result, tuple) and result and isinstance(result[0], list):
+        return len(result[0])  # (page, cursor)
+    if isinstance(result, (list, tuple, set)):
+        return len(result)
+    return 0 if result is None else 1
+
+
+def _record_call(name, elapsed, rows, failed=False):
+    stats = _current_request.get()
+    get_metrics().observe_call(name, current_route(), elapsed, rows, failed)
+    if stats is not None:
+        stats.calls += 1
+        stats.db_time += elapsed
+
+
+def _timed_iter(name, iterator):
+    """Time a data-layer generator across its whole consumption, counting rows as they are yielded."""
+    rows, elapsed, failed = 0, 0.0, False
+    try:
+        while True:
+            token = _current_call.set(name)
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            except Exception:
+                failed = True
+                raise
+            finally:
+                elapsed += time.perf_counter() - started
+                _current_call.reset(token)
+            rows += 1
+            yield item
+    finally:
+        _record_call(name, elapsed, rows, failed)
+
+
+def instrumented(func):
+    """Wrap a data-layer function so each outermost call is timed and counted."""
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _current_call.get() is not None:
+            return func(*args, **kwargs)
+        token = _current_call.set(name)
+        started = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            _record_call(name, time.perf_counter() - started, 0, failed=True)
+            raise
+        finally:
+            _current_call.reset(token)
+        if inspect.isgenerator(result):
+            return _timed_iter(name, result)
+        _record_call(name, time.perf_counter() - started, _row_count(result))
+        return result
+
+    @functools.wraps(func)
+    async def async_wrapper(*args, **kwargs):
+        if _current_call.get() is not None:
+            return await func(*args, **kwargs)
+        token = _current_call.set(name)
+        started = time.perf_counter()
+        try:
+            result = await func(*args, **kwargs)
+        except Exception:
+            _record_call(name, time.perf_counter() - started, 0, failed=True)
+            raise
+        finally:
+            _current_call.reset(token)
+        _record_call(name, time.perf_counter() - started, _row_count(result))
+        return result
+
+    if inspect.iscoroutinefunction(func):
+        wrapper = async_wrapper
+    wrapper.__wrapped__ = func
+    return wrapper
+
+
+def instrument_module(namespace, exclude=()):
+    """Replace every public function defined in a module's namespace with its instrumented version."""
+    if not metrics_enabled():
+        return
+    module = namespace['__name__']
+    for name, value in list(namespace.items()):
+        if (inspect.isfunction(value) and value.__module__ == module and not name.startswith('_')
+                and name not in exclude and not hasattr(value, '__wrapped__')):
+            namespace[name] = instrumented(value)
+
+
+class TrackedSession:
+    """Proxy over a driver session that reports each statement's timings when the session ends.
+
+    Statements run through `execute_read`/`execute_write` are tracked too: the
+    work function gets a TrackedTransaction, and their summaries are read
+    before the transaction commits, while the results are still in scope.
+    """
+
+    def __init__(self, session):
+        self._session = session
+        self._pending = []
+
+    def run(self, query, parameters=None, **kwargs):
+        return self._run(self._session, query, parameters, kwargs)
+
+    def _run(self, runner, query, parameters, kwargs):
+        started = time.perf_counter()
+        result = runner.run(query, parameters, **kwargs)
+        self._pending.append((query, dict(parameters or {}, **kwargs), time.perf_counter() - started, result, None))
+        return result
+
+    def execute_read(self, work, *args, **kwargs):
+        return self._session.execute_read(self._tracked_work(work), *args, **kwargs)
+
+    def execute_write(self, work, *args, **kwargs):
+        return self._session.execute_write(self._tracked_work(work), *args, **kwargs)
+
+    def _tracked_work(self, work):
+        def tracked(tx, *args, **kwargs):
+            start = len(self._pending)
+            value = work(TrackedTransaction(tx, self), *args, **kwargs)
+            for index in range(start, len(self._pending)):
+                self._settle(index, _consume(self._pending[index][3]))
+            return value
+        return tracked
+
+    def _settle(self, index, summary):
+        query, parameters, run_seconds, result, _ = self._pending[index]
+        self._pending[index] = (query, parameters, run_seconds, result, summary)
+
+    def finish(self):
+        """Read the summaries of the session's results (consuming any left unread) and record them."""
+        self._record([summary or _consume(result) for _, _, _, result, summary in self._pending])
+
+    def _record(self, summaries):
+        metrics = get_metrics()
+        function = _current_call.get() or 'unknown'
+        route = current_route()
+        stats = _current_request.get()
+        for index, ((query, parameters, run_seconds, _, _), summary) in enumerate(zip(self._pending, summaries)):
+            if summary is None:
+                continue
+            available = summary.result_available_after or 0
+            consumed = summary.result_consumed_after or 0
+            # The first run() waits for a connection, one round trip and the server's planning.
+            acquire = max(run_seconds - available / 1000, 0.0) if index == 0 else None
+            metrics.observe_query(function, route, query, parameters, available, consumed, acquire)
+            if stats is not None:
+                stats.queries += 1
+        self._pending = []
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+
+class TrackedTransaction:
+    """Proxy over a managed transaction that records its statements on the owning TrackedSession."""
+
+    def __init__(self, tx, session):
+        self._tx = tx
+        self._tracked = session
+
+    def run(self, query, parameters=None, **kwargs):
+        return self._tracked._run(self._tx, query, parameters, kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._tx, name)
+
+
+def _consume(result):
+    try:
+        return result.consume()
+    except Exception:
+        return None
+
+
+class AsyncTrackedSession(TrackedSession):
+    """TrackedSession for `neo4j.AsyncSession`: `run`, `finish` and transaction work are coroutines."""
+
+    async def run(self, query, parameters=None, **kwargs):
+        return await self._run(self._session, query, parameters, kwargs)
+
+    async def _run(self, runner, query, parameters, kwargs):
+        started = time.perf_counter()
+        result = await runner.run(query, parameters, **kwargs)
+        self._pending.append((query, dict(parameters or {}, **kwargs), time.perf_counter() - started, result, None))
+        return result
+
+    async def execute_read(self, work, *args, **kwargs):
+        return await self._session.execute_read(self._tracked_work(work), *args, **kwargs)
+
+    async def execute_write(self, work, *args, **kwargs):
+        return await self._session.execute_write(self._tracked_work(work), *args, **kwargs)
+
+    def _tracked_work(self, work):
+        async def tracked(tx, *args, **kwargs):
+            start = len(self._pending)
+            value = await work(AsyncTrackedTransaction(tx, self), *args, **kwargs)
+            for index in range(start, len(self._pending)):
+                self._settle(index, await _consume_async(self._pending[index][3]))
+            return value
+        return tracked
+
+    async def finish(self):
+        self._record([summary or await _consume_async(result) for _, _, _, result, summary in self._pending])
+
+
+class AsyncTrackedTransaction(TrackedTransaction):
+    """TrackedTransaction for `neo4j.AsyncManagedTransaction`."""
+
+    async def run(self, query, parameters=None, **kwargs):
+        return await self._tracked._run(self._tx, query, parameters, kwargs)
+
+
+async def _consume_async(result):
+    try:
+        return await result.consume()
+    except Exception:
+        return None
+
+
+def track_session(session):
+    """Wrap a pooled session for instrumentation (returned unchanged when metrics are off)."""
+    return TrackedSession(session) if metrics_enabled() else session
+
+
+def track_async_session(session):
+    """Async counterpart of track_session."""
+    return AsyncTrackedSession(session) if metrics_enabled() else session
+
+
+def init_app(app):
+    """Count data-layer work per request and report it in X-DB-Calls/X-DB-Queries/X-DB-Time headers."""
+    if not metrics_enabled():
+        return
+
+    @app.before_request
+    def _begin_db_stats():
+        from flask import request
+        begin_request(request.url_rule.rule if request.url_rule else 'unmatched')
+
+    @app.after_request
+    def _db_stats_headers(response):
+        stats = _current_request.get()
+        if stats is not None:
+            response.headers.update(stats_headers(stats))
+        return response
+
+    @app.teardown_request
+    def _end_db_stats(exc):
+        end_request()
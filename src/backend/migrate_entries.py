@@ -0,0 +1,35 @@
+"""Convert capsules from JSON-string entry properties to native typed properties.
+
+    python src/backend/migrate_entries.py                  # every JSON-mode capsule
+    python src/backend/migrate_entries.py --capsule <id>   # one capsule
+
+Entries are rewritten in keyset-ordered batches, one transaction each, and
+reads keep returning the same payload throughout. Re-running is safe.
+"""
+import argparse
+import db
+from entry_storage import capsule_storage_mode
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--capsule', action='append', help='capsule id (repeatable); default is all JSON-mode capsules')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    capsule_ids = args.capsule or [
+        capsule['id'] for capsule in db.get_all_capsules() if capsule_storage_mode(capsule) != 'native'
+    ]
+    try:
+        for capsule_id in capsule_ids:
+            count = db.migrate_capsule_storage(
+                capsule_id, batch_size=args.batch_size,
+                progress=lambda done: print(f"[Recall] {capsule_id}: {done} entries migrated", flush=True)
+            )
+            print(f"[Recall] Capsule {capsule_id} now stores {count} entries natively")
+    finally:
+        db.close_backend()
+
+
+if __name__ == '__main__':
+    main()
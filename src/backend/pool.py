@@ -0,0 +1,210 @@
+from neo4j import AsyncGraphDatabase, GraphDatabase
+from contextlib import asynccontextmanager, contextmanager
+import os
+import threading
+from metrics import track_async_session, track_session
+
+DEFAULT_MAX_POOL_SIZE = 50
+DEFAULT_ACQUISITION_TIMEOUT = 60.0
+DEFAULT_MAX_CONNECTION_LIFETIME = 3600.0
+
+
+class DriverPool:
+    """Long-lived Neo4j driver shared by every data-layer call in the process.
+
+    The driver keeps its own Bolt connection pool; this wrapper owns the driver's
+    lifetime and tracks how many sessions are checked out so the pool can be
+    observed from the health endpoint. The counters are kept here, not read
+    from the driver (which does not expose its pool): `sessions_high_water`
+    is the most sessions ever checked out at once, which bounds the
+    connections the driver has opened, and `saturated_requests` counts
+    sessions requested while every pool slot was already taken, i.e. that
+    probably had to wait for a connection.
+    """
+
+    def __init__(self, uri, user, password, max_pool_size=DEFAULT_MAX_POOL_SIZE,
+                 acquisition_timeout=DEFAULT_ACQUISITION_TIMEOUT,
+                 max_connection_lifetime=DEFAULT_MAX_CONNECTION_LIFETIME):
+        self.uri = uri
+        self.user = user
+        self.password = password
+        self.max_pool_size = max_pool_size
+        self.acquisition_timeout = acquisition_timeout
+        self.max_connection_lifetime = max_connection_lifetime
+        self._driver = None
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._high_water = 0
+        self._acquired = 0
+        self._saturated = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            os.getenv("NEO4J_URI"),
+            os.getenv("NEO4J_USER"),
+            os.getenv("NEO4J_PASSWORD"),
+            max_pool_size=int(os.getenv("NEO4J_MAX_POOL_SIZE", DEFAULT_MAX_POOL_SIZE)),
+            acquisition_timeout=float(os.getenv("NEO4J_ACQUISITION_TIMEOUT", DEFAULT_ACQUISITION_TIMEOUT)),
+            max_connection_lifetime=float(os.getenv("NEO4J_MAX_CONNECTION_LIFETIME", DEFAULT_MAX_CONNECTION_LIFETIME)),
+        )
+
+    @property
+    def driver(self):
+        """Return the shared driver, creating it on first use."""
+        if self._driver is None:
+            with self._lock:
+                if self._driver is None:
+                    self._driver = GraphDatabase.driver(
+                        self.uri,
+                        auth=(self.user, self.password),
+                        max_connection_pool_size=self.max_pool_size,
+                        connection_acquisition_timeout=self.acquisition_timeout,
+                        max_connection_lifetime=self.max_connection_lifetime,
+                    )
+        return self._driver
+
+    @contextmanager
+    def session(self, **kwargs):
+        """Borrow a session from the shared driver for the duration of the block."""
+        driver = self.driver
+        with self._lock:
+            if self._in_use >= self.max_pool_size:
+                self._saturated += 1
+            self._in_use += 1
+            self._acquired += 1
+            self._high_water = max(self._high_water, self._in_use)
+        try:
+            with driver.session(**kwargs) as session:
+                tracked = track_session(session)
+                try:
+                    yield tracked
+                finally:
+                    if tracked is not session:
+                        tracked.finish()
+        finally:
+            with self._lock:
+                self._in_use -= 1
+
+    def stats(self):
+        """Return a snapshot of pool usage counters (estimates kept by this wrapper, see the class docstring)."""
+        with self._lock:
+            return {
+                'max_pool_size': self.max_pool_size,
+                'acquisition_timeout': self.acquisition_timeout,
+                'max_connection_lifetime': self.max_connection_lifetime,
+                'in_use': self._in_use,
+                'sessions_high_water': self._high_water,
+                'acquired_total': self._acquired,
+                'saturated_requests': self._saturated,
+                'open': self._driver is not None,
+            }
+
+    def health(self):
+        """Check connectivity and return pool stats with a status flag."""
+        stats = self.stats()
+        try:
+            self.driver.verify_connectivity()
+            stats['status'] = 'ok'
+        except Exception as e:
+            stats['status'] = 'error'
+            stats['error'] = str(e)
+        return stats
+
+    def close(self):
+        """Close the shared driver; the next call re-opens it."""
+        with self._lock:
+            driver, self._driver = self._driver, None
+            self._high_water = 0
+        if driver is not None:
+            driver.close()
+
+
+class AsyncDriverPool(DriverPool):
+    """Async counterpart of DriverPool over `neo4j.AsyncGraphDatabase`.
+
+    Shares configuration and counters with DriverPool; it must only be used
+    from the event loop that first opened it.
+    """
+
+    @property
+    def driver(self):
+        if self._driver is None:
+            self._driver = AsyncGraphDatabase.driver(
+                self.uri,
+                auth=(self.user, self.password),
+                max_connection_pool_size=self.max_pool_size,
+                connection_acquisition_timeout=self.acquisition_timeout,
+                max_connection_lifetime=self.max_connection_lifetime,
+            )
+        return self._driver
+
+    @asynccontextmanager
+    async def session(self, **kwargs):
+        """Borrow an async session from the shared driver for the duration of the block."""
+        driver = self.driver
+        with self._lock:
+            if self._in_use >= self.max_pool_size:
+                self._saturated += 1
+            self._in_use += 1
+            self._acquired += 1
+            self._high_water = max(self._high_water, self._in_use)
+        try:
+            async with driver.session(**kwargs) as session:
+                tracked = track_async_session(session)
+                try:
+                    yield tracked
+                finally:
+                    if tracked is not session:
+                        await tracked.finish()
+        finally:
+            with self._lock:
+                self._in_use -= 1
+
+    async def health(self):
+        stats = self.stats()
+        try:
+            await self.driver.verify_connectivity()
+            stats['status'] = 'ok'
+        except Exception as e:
+            stats['status'] = 'error'
+            stats['error'] = str(e)
+        return stats
+
+    async def close(self):
+        with self._lock:
+            driver, self._driver = self._driver, None
+            self._high_water = 0
+        if driver is not None:
+            await driver.close()
+
+
+_pool = None
+_async_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide DriverPool, configured from the environment."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = DriverPool.from_env()
+    return _pool
+
+
+def get_async_pool():
+    """Return the process-wide AsyncDriverPool, configured from the environment."""
+    global _async_pool
+    if _async_pool is None:
+        with _pool_lock:
+            if _async_pool is None:
+                _async_pool = AsyncDriverPool.from_env()
+    return _async_pool
+
+
+def close_pool():
+    """Close the process-wide driver if it was opened."""
+    if _pool is not None:
+        _pool.close()
@@ -0,0 +1,30 @@
+"""Finish purging capsules that were deleted but still have entries (e.g. after a restart).
+
+    python src/backend/purge_capsules.py                 # every capsule marked deleted
+    python src/backend/purge_capsules.py --capsule <id>  # one capsule
+
+Entries are removed in batches, one transaction each.
+"""
+import argparse
+import db
+from storage import get_backend
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--capsule', action='append', help='capsule id (repeatable); default is every deleted capsule')
+    parser.add_argument('--batch-size', type=int, default=db.DEFAULT_PURGE_BATCH_SIZE)
+    args = parser.parse_args()
+
+    capsule_ids = args.capsule or get_backend().get_deleted_capsule_ids()
+    try:
+        for capsule_id in capsule_ids:
+            entries, snapshots = db.purge_capsule(capsule_id, batch_size=args.batch_size)
+            print(f"[Recall] {capsule_id}: {entries} entries and {snapshots} snapshots purged")
+    finally:
+        db.close_backend()
+    print(f"[Recall] Purged {len(capsule_ids)} capsules")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,27 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask import Flask, render_template, stream_template, request, redirect, url_for, flash, jsonify
 from db import (
-    create_capsule, get_all_capsules, get_capsule_by_id, delete_capsule,
-    create_entry, get_entries_by_capsule, get_entry_by_id, delete_entry,
+    create_capsule, get_all_capsules, get_capsule_by_id,
+    create_entry, get_entries_page, get_entry_by_id, delete_entry,
     create_tag, get_tag_by_name,
     link_entry_to_entry, get_linked_entries, get_linked_entries_recursive,
-    search_entries_by_text, filter_entries_by_tag
+    search_entries_by_text, filter_entries_by_tag, get_tag_counts, init_app
 )
 import json
 from datetime import datetime, UTC
 import os
 from flasgger import Swagger
+from deletion import delete_capsule_in_background
+from pagination import MAX_PAGE_SIZE, decode_cursor
 from controllers.capsule_controller import capsule_bp
 from controllers.entry_controller import entry_bp
+from controllers.health_controller import health_bp
+from controllers.snapshot_controller import snapshot_bp
+from controllers.graph_controller import graph_bp
+from controllers.metrics_controller import metrics_bp
+from controllers.template_controller import template_bp
+from controllers.tag_controller import tag_bp
+import metrics
+import write_buffer
 
 # Set the template folder to src/frontend/templates (robust, with debug print)
 TEMPLATE_DIR = os.path.realpath(os.path.join(os.path.dirname(__file__), '../frontend/templates'))
@@ -20,11 +30,24 @@ print(f"[Recall] Using template folder: {TEMPLATE_DIR}")
 print(f"[Recall] Using static folder: {STATIC_DIR}")
 app = Flask(__name__, template_folder=TEMPLATE_DIR, static_folder=STATIC_DIR)
 app.secret_key = 'recall-secret-key'
+# Entries rendered into the capsule page up front; later pages load as row fragments.
+VIEW_PAGE_SIZE = 50
+# Most used tags offered as suggestions by the capsule page's tag filter
+VIEW_TAG_SUGGESTIONS = 50
 swagger = Swagger(app)
+init_app(app)
+metrics.init_app(app)
+write_buffer.init_app(app)
 
 # Register blueprints
 app.register_blueprint(capsule_bp)
 app.register_blueprint(entry_bp)
+app.register_blueprint(health_bp)
+app.register_blueprint(snapshot_bp)
+app.register_blueprint(graph_bp)
+app.register_blueprint(metrics_bp)
+app.register_blueprint(template_bp)
+app.register_blueprint(tag_bp)
 
 @app.route('/create-capsule', methods=['GET', 'POST'])
 def create_capsule_route():
@@ -76,12 +99,42 @@ def view_capsule(capsule_id):
             else:
                 flash('Invalid entry ID.', 'danger')
         elif 'delete_capsule' in request.form:
-            delete_capsule(capsule_id)
+            delete_capsule_in_background(capsule_id)
             flash('Capsule deleted.', 'success')
             return redirect(url_for('home'))
-    entries = get_entries_by_capsule(capsule_id)
-    # Prepare entries for template: parse properties and avoid mutating Node objects
-    parsed_entries = []
+    entries, next_cursor = get_entries_page(capsule_id, limit=VIEW_PAGE_SIZE)
+    return render_template(
+        'view_capsule.html', capsule=capsule, entries=parse_entries(entries), fields=fields, after=None,
+        next_url=_entry_rows_url(capsule_id, next_cursor, VIEW_PAGE_SIZE),
+        tags=get_tag_counts(capsule_id=capsule_id, limit=VIEW_TAG_SUGGESTIONS), app_name='Recall'
+    )
+
+@app.route('/capsule/<capsule_id>/entries', methods=['GET'])
+def capsule_entry_rows(capsule_id):
+    """Table rows for the page of a capsule's entries after `after`, streamed as they render."""
+    capsule = get_capsule_by_id(capsule_id)
+    if not capsule:
+        return 'Capsule not found', 404
+    after = request.args.get('after')
+    limit = request.args.get('limit', VIEW_PAGE_SIZE, type=int)
+    try:
+        if after:
+            decode_cursor(after, 2)
+    except ValueError as e:
+        return str(e), 400
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return f"'limit' must be between 1 and {MAX_PAGE_SIZE}", 400
+    entries, next_cursor = get_entries_page(capsule_id, limit=limit, after=after)
+    return stream_template(
+        'entry_rows.html', capsule=capsule, entries=parse_entries(entries), fields=capsule.get('fields', []),
+        after=after, next_url=_entry_rows_url(capsule_id, next_cursor, limit)
+    )
+
+def _entry_rows_url(capsule_id, cursor, limit):
+    return url_for('capsule_entry_rows', capsule_id=capsule_id, after=cursor, limit=limit) if cursor else None
+
+def parse_entries(entries):
+    """Yield entries with `properties` decoded to a dict, one at a time as the template renders them."""
     for entry in entries:
         entry_dict = dict(entry) if not isinstance(entry, dict) else entry.copy()
         props = entry_dict.get('properties')
@@ -92,8 +145,7 @@ def view_capsule(capsule_id):
                 entry_dict['properties'] = {}
         elif props is None:
             entry_dict['properties'] = {}
-        parsed_entries.append(entry_dict)
-    return render_template('view_capsule.html', capsule=capsule, entries=parsed_entries, fields=fields, app_name='Recall')
+        yield entry_dict
 
 @app.route('/apidocs')
 def apidocs_redirect():
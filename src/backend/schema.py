@@ -0,0 +1,258 @@
+"""Versioned Neo4j schema: constraints and indexes for every lookup key the code uses.
+
+    python src/backend/schema.py            # apply pending migrations
+    python src/backend/schema.py --check    # exit 1 if migrations are pending or indexes are missing
+    python src/backend/schema.py --report   # list Cypher lookups in the source not backed by an index
+
+The applied version is kept on a `(:SchemaVersion {name: 'recall'})` node.
+Each migration's steps run in order and the version is only recorded once
+all of them succeed, so a failed migration is retried on the next start.
+At startup `db.init_app` migrates, checks or skips according to
+RECALL_SCHEMA (migrate, check, off).
+"""
+import argparse
+import os
+import re
+import sys
+from datetime import datetime, UTC
+from search import FULLTEXT_INDEX
+
+SCHEMA_MODES = ('migrate', 'check', 'off')
+
+# (version, description, steps); a step is a Cypher statement or a callable taking the backend.
+MIGRATIONS = [
+    (1, 'unique ids', [
+        "CREATE CONSTRAINT capsule_id_unique IF NOT EXISTS FOR (c:Capsule) REQUIRE c.id IS UNIQUE",
+        "CREATE CONSTRAINT thread_id_unique IF NOT EXISTS FOR (t:Thread) REQUIRE t.id IS UNIQUE",
+        "CREATE CONSTRAINT entry_id_unique IF NOT EXISTS FOR (e:Entry) REQUIRE e.id IS UNIQUE",
+        "CREATE CONSTRAINT snapshot_id_unique IF NOT EXISTS FOR (s:Snapshot) REQUIRE s.id IS UNIQUE",
+        "CREATE CONSTRAINT tag_id_unique IF NOT EXISTS FOR (tag:Tag) REQUIRE tag.id IS UNIQUE",
+        "CREATE CONSTRAINT template_id_unique IF NOT EXISTS FOR (tpl:Template) REQUIRE tpl.id IS UNIQUE",
+    ]),
+    (2, 'entry full-text search', [
+        f"CREATE FULLTEXT INDEX {FULLTEXT_INDEX} IF NOT EXISTS FOR (e:Entry) ON EACH [e.search_text, e.search_fields]",
+        lambda backend: backend.backfill_search_index(),
+    ]),
+    (3, 'unique tag and template names', [
+        lambda backend: backend.merge_duplicate_tags(),
+        lambda backend: backend.merge_duplicate_templates(),
+        "CREATE CONSTRAINT tag_name_unique IF NOT EXISTS FOR (tag:Tag) REQUIRE tag.name IS UNIQUE",
+        "CREATE CONSTRAINT template_name_unique IF NOT EXISTS FOR (tpl:Template) REQUIRE tpl.name IS UNIQUE",
+    ]),
+    (4, 'timestamp indexes', [
+        "CREATE INDEX entry_timestamp IF NOT EXISTS FOR (e:Entry) ON (e.timestamp)",
+        "CREATE INDEX snapshot_created_at IF NOT EXISTS FOR (s:Snapshot) ON (s.created_at)",
+    ]),
+    (5, 'native entry datetimes', [
+        "CREATE INDEX entry_ts IF NOT EXISTS FOR (e:Entry) ON (e.ts)",
+        """
+        MATCH (e:Entry) WHERE e.ts IS NULL AND e.timestamp IS NOT NULL
+        CALL { WITH e SET e.ts = datetime({datetime: datetime(e.timestamp), timezone: 'UTC'}) } IN TRANSACTIONS OF 10000 ROWS
+        """,
+    ]),
+    (6, 'deleted capsules', [
+        "CREATE CONSTRAINT deleted_capsule_id_unique IF NOT EXISTS FOR (c:DeletedCapsule) REQUIRE c.id IS UNIQUE",
+    ]),
+    (7, 'tag entry counts', [
+        lambda backend: backend.recount_tags(),
+    ]),
+    (8, 'snapshot sequence and tag count indexes', [
+        "CREATE INDEX snapshot_seq IF NOT EXISTS FOR (s:Snapshot) ON (s.seq)",
+        "CREATE INDEX tag_entries IF NOT EXISTS FOR (tag:Tag) ON (tag.entries)",
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+# (label, property) pairs that must be served by a range index or constraint.
+REQUIRED_INDEXES = [
+    ('Capsule', 'id'),
+    ('DeletedCapsule', 'id'),
+    ('Thread', 'id'),
+    ('Entry', 'id'),
+    ('Snapshot', 'id'),
+    ('Tag', 'id'),
+    ('Tag', 'name'),
+    ('Template', 'id'),
+    ('Template', 'name'),
+    ('Entry', 'timestamp'),
+    ('Entry', 'ts'),
+    ('Snapshot', 'created_at'),
+    ('Snapshot', 'seq'),
+    ('Tag', 'entries'),
+]
+
+# Files whose Cypher is scanned by `index_report`.
+CYPHER_SOURCES = ['storage/neo4j_backend.py', 'storage/async_backend.py']
+
+# A node pattern that starts a MATCH/MERGE pattern and looks the node up by a property,
+# e.g. `MATCH (e:Entry {id: $id})`. Patterns reached by expanding from a bound node are not anchors.
+_ANCHOR_RE = re.compile(r'(?:\bMATCH|\bMERGE|,)\s*\(\w*:(\w+)\s*\{\s*`?(\w+)`?\s*:')
+# A MATCH clause: its pattern and, up to the next clause, its WHERE predicates.
+_MATCH_RE = re.compile(
+    r'\bMATCH\b(?P<pattern>.*?)(?:\bWHERE\b(?P<where>.*?))?'
+    r'(?=\b(?:OPTIONAL|MATCH|WITH|RETURN|CALL|UNWIND|MERGE|CREATE|SET|DELETE|DETACH|REMOVE|FOREACH|ORDER)\b'
+    r'|//|"|\}|$)',
+    re.S,
+)
+# A node pattern: variable, label and whether it carries an inline property map.
+_NODE_RE = re.compile(r'\((\w*)(?::(\w+))?\s*(\{)?')
+# A full label scan is intended (listing every node of a label, one-off migrations) when marked so.
+FULL_SCAN_MARK = '// full scan'
+
+
+class SchemaError(RuntimeError):
+    """Raised when the schema is behind or missing indexes the code relies on."""
+
+
+def schema_mode():
+    mode = os.getenv('RECALL_SCHEMA', 'migrate').lower()
+    return mode if mode in SCHEMA_MODES else 'migrate'
+
+
+def applied_version(session):
+    record = session.run("MATCH (v:SchemaVersion {name: 'recall'}) RETURN v.version AS version").single()
+    return record["version"] if record and record["version"] is not None else 0
+
+
+def migrate(backend):
+    """Apply every migration newer than the recorded version. Returns the list of versions applied."""
+    with backend.session() as session:
+        current = applied_version(session)
+    applied = []
+    for version, description, steps in MIGRATIONS:
+        if version <= current:
+            continue
+        for step in steps:
+            if callable(step):
+                step(backend)
+            else:
+                with backend.session() as session:
+                    session.run(step).consume()
+        with backend.session() as session:
+            session.run(
+                """
+                MERGE (v:SchemaVersion {name: 'recall'})
+                SET v.version = $version, v.description = $description, v.applied_at = $applied_at
+                """,
+                version=version, description=description, applied_at=datetime.now(UTC).isoformat()
+            ).consume()
+        print(f"[Recall] Schema migrated to version {version} ({description})")
+        applied.append(version)
+    return applied
+
+
+def online_indexes(session):
+    """Return the set of (label, first property) pairs with an online range/btree index."""
+    result = session.run("SHOW INDEXES YIELD labelsOrTypes, properties, state, type")
+    covered = set()
+    for record in result:
+        if record["type"] in ('FULLTEXT', 'LOOKUP') or record["state"] != 'ONLINE':
+            continue
+        if record["labelsOrTypes"] and record["properties"]:
+            covered.add((record["labelsOrTypes"][0], record["properties"][0]))
+    return covered
+
+
+def check(backend):
+    """Return a list of problems (pending migrations, missing indexes); empty when the schema is current."""
+    with backend.session() as session:
+        version = applied_version(session)
+        covered = online_indexes(session)
+    problems = []
+    if version < LATEST_VERSION:
+        problems.append(f'schema version {version} is behind {LATEST_VERSION}')
+    problems += [f'missing index on :{label}({prop})' for label, prop in REQUIRED_INDEXES if (label, prop) not in covered]
+    return problems
+
+
+def cypher_lookups(path):
+    """Yield `(line_number, label, property)` for each anchored property lookup in a source file."""
+    with open(path, encoding='utf-8') as source:
+        text = source.read()
+    for match in _ANCHOR_RE.finditer(text):
+        yield text.count('\n', 0, match.start()) + 1, match.group(1), match.group(2)
+
+
+def cypher_scans(path, indexed):
+    """Yield `(line_number, label, property)` for MATCH clauses no inline-map anchor serves.
+
+    A MATCH that starts from nothing already bound is looked up through the
+    `WHERE var.prop` predicates on its labelled nodes; when none of them is
+    in `indexed`, each predicate is yielded, or `(line, label, None)` for a
+    full label scan without any. Clauses marked FULL_SCAN_MARK are skipped.
+    """
+    with open(path, encoding='utf-8') as source:
+        text = source.read()
+    for match in _MATCH_RE.finditer(text):
+        nodes = _NODE_RE.findall(match.group('pattern'))
+        if not nodes or any(var and not label or inline for var, label, inline in nodes):
+            continue  # expands from a bound node, or anchored by an inline map
+        line_end = text.find('\n', match.start())
+        if FULL_SCAN_MARK in text[match.start():line_end if line_end >= 0 else len(text)]:
+            continue
+        where = match.group('where') or ''
+        lookups = []
+        for var, label, _ in nodes:
+            if var and label:
+                lookups += [(label, prop) for prop in re.findall(
+                    rf'\b{var}\.`?(\w+)`?\s*(?:[=<>]|IN\b|IS\b|STARTS\s+WITH\b)', where)]
+        if any(lookup in indexed for lookup in lookups):
+            continue
+        line = text.count('\n', 0, match.start()) + 1
+        labels = [label for _, label, _ in nodes if label]
+        for label, prop in lookups or ([(labels[0], None)] if labels else []):
+            yield line, label, prop
+
+
+def index_report(paths=None, indexed=None):
+    """Return `(path, line, label, property)` for lookups with no index in `indexed`.
+
+    Covers inline-map anchors, `WHERE` predicates and full label scans
+    (property None; see cypher_scans). `indexed` defaults to
+    REQUIRED_INDEXES, i.e. what the migrations create.
+    """
+    base = os.path.dirname(os.path.abspath(__file__))
+    indexed = set(REQUIRED_INDEXES if indexed is None else indexed)
+    unindexed = []
+    for path in paths or CYPHER_SOURCES:
+        full_path = path if os.path.isabs(path) else os.path.join(base, path)
+        for line, label, prop in cypher_lookups(full_path):
+            if (label, prop) not in indexed:
+                unindexed.append((path, line, label, prop))
+        unindexed += [(path, line, label, prop) for line, label, prop in cypher_scans(full_path, indexed)]
+    return sorted(unindexed, key=lambda row: (row[0], row[1]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--check', action='store_true', help='verify only; exit 1 when the schema is not current')
+    group.add_argument('--report', action='store_true', help='list source lookups not backed by an index')
+    args = parser.parse_args()
+
+    if args.report:
+        unindexed = index_report()
+        for path, line, label, prop in unindexed:
+            if prop is None:
+                print(f"{path}:{line}: MATCH scans every :{label} node")
+            else:
+                print(f"{path}:{line}: lookup on :{label}({prop}) has no index")
+        print(f"[Recall] {len(unindexed)} unindexed lookups")
+        sys.exit(1 if unindexed else 0)
+
+    from storage import get_backend
+    backend = get_backend()
+    try:
+        if args.check:
+            problems = backend.check_schema()
+            for problem in problems:
+                print(f"[Recall] Schema check: {problem}")
+            sys.exit(1 if problems else 0)
+        backend.ensure_schema()
+    finally:
+        backend.close()
+
+
+if __name__ == '__main__':
+    main()
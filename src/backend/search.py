@@ -0,0 +1,164 @@
+from collections import defaultdict
+import json
+import math
+import re
+
+# Name of the Neo4j full-text index over entry property values.
+FULLTEXT_INDEX = 'entry_search'
+# Separator between a field name and a value token in `search_fields`; both halves
+# are word characters so the Lucene standard analyzer keeps them as one token.
+FIELD_SEPARATOR = '__'
+# How combined searches join their text/tag/linked_to predicates.
+SEARCH_MODES = ('and', 'or')
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+_QUERY_RE = re.compile(r'(\w+):"([^"]*)"|(\w+):(\S+)|"([^"]*)"|(\S+)', re.UNICODE)
+
+
+def tokenize(text):
+    """Lowercase word tokens of a string; punctuation is dropped."""
+    return [token.lower() for token in _TOKEN_RE.findall(str(text))]
+
+
+def field_key(name):
+    """Normalize a field name into the form used in field-scoped tokens."""
+    return '_'.join(tokenize(name)).replace(FIELD_SEPARATOR, '_')
+
+
+def _iter_values(value):
+    if isinstance(value, dict):
+        for item in value.values():
+            yield from _iter_values(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from _iter_values(item)
+    elif isinstance(value, bool):
+        yield 'true' if value else 'false'
+    elif value is not None:
+        yield str(value)
+
+
+def _load_properties(properties):
+    if isinstance(properties, str):
+        try:
+            properties = json.loads(properties)
+        except ValueError:
+            return {}
+    return properties if isinstance(properties, dict) else {}
+
+
+def document_tokens(properties):
+    """Return `(value_tokens, field_tokens)` for an entry's properties.
+
+    Only property values are indexed, never the JSON keys or punctuation; each
+    value token is also emitted as `<field>__<token>` for field-scoped queries.
+    """
+    value_tokens = []
+    field_tokens = []
+    for name, value in _load_properties(properties).items():
+        key = field_key(name)
+        for text in _iter_values(value):
+            for token in tokenize(text):
+                value_tokens.append(token)
+                if key:
+                    field_tokens.append(f'{key}{FIELD_SEPARATOR}{token}')
+    return value_tokens, field_tokens
+
+
+def index_properties(properties):
+    """Return the `search_text` and `search_fields` node properties for an entry."""
+    value_tokens, field_tokens = document_tokens(properties)
+    return {'search_text': ' '.join(value_tokens), 'search_fields': ' '.join(field_tokens)}
+
+
+def parse_query(query):
+    """Split a query into free-text tokens and field-scoped tokens.
+
+    `field:value` and `field:"several words"` restrict matches to that field;
+    everything else matches any property value. Returns `(terms, field_terms)`
+    where `field_terms` already uses the `<field>__<token>` form.
+    """
+    terms = []
+    field_terms = []
+    for quoted_field, quoted_value, field, value, phrase, word in _QUERY_RE.findall(query or ''):
+        if quoted_field or field:
+            key = field_key(quoted_field or field)
+            for token in tokenize(quoted_value if quoted_field else value):
+                field_terms.append(f'{key}{FIELD_SEPARATOR}{token}')
+        else:
+            terms.extend(tokenize(phrase or word))
+    return terms, field_terms
+
+
+def to_lucene(query):
+    """Translate a search query into a Lucene query for the full-text index.
+
+    Every term is required; relevance ranking is left to Lucene's scoring.
+    Returns None when the query has no searchable tokens.
+    """
+    terms, field_terms = parse_query(query)
+    clauses = [f'search_text:{term}' for term in terms]
+    clauses += [f'search_fields:{term}' for term in field_terms]
+    return ' AND '.join(clauses) if clauses else None
+
+
+class InvertedIndex:
+    """Pure-Python inverted index with the same query language as the Neo4j index.
+
+    Scores are summed TF-IDF weights, so results rank like the full-text index
+    closely enough for tests and small in-memory datasets.
+    """
+
+    def __init__(self):
+        self._postings = defaultdict(dict)
+        self._documents = {}
+
+    def __len__(self):
+        return len(self._documents)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._documents
+
+    def add(self, doc_id, properties):
+        """Index (or re-index) a document's property values."""
+        self.remove(doc_id)
+        value_tokens, field_tokens = document_tokens(properties)
+        counts = defaultdict(int)
+        for token in value_tokens:
+            counts[token] += 1
+        for token in field_tokens:
+            counts[token] += 1
+        for token, count in counts.items():
+            self._postings[token][doc_id] = count
+        self._documents[doc_id] = list(counts)
+
+    def remove(self, doc_id):
+        for token in self._documents.pop(doc_id, []):
+            postings = self._postings[token]
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[token]
+
+    def search(self, query, skip=0, limit=None):
+        """Return `[(doc_id, score), ...]` ranked by descending score."""
+        terms, field_terms = parse_query(query)
+        tokens = terms + field_terms
+        if not tokens:
+            return []
+        total = len(self._documents)
+        candidates = None
+        for token in tokens:
+            docs = set(self._postings.get(token, ()))
+            candidates = docs if candidates is None else candidates & docs
+            if not candidates:
+                return []
+        scored = []
+        for doc_id in candidates:
+            score = 0.0
+            for token in tokens:
+                postings = self._postings[token]
+                score += postings[doc_id] * math.log(1 + total / len(postings))
+            scored.append((doc_id, score))
+        scored.sort(key=lambda item: (-item[1], item[0]))
+        end = None if limit is None else skip + limit
+        return scored[skip:end]
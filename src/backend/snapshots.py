@@ -0,0 +1,247 @@
+"""Delta-compressed snapshot history.
+
+Each entry's snapshots form a version sequence (`seq`). Every
+RECALL_SNAPSHOT_KEYFRAME_INTERVAL-th version is a keyframe holding the full
+payload; the versions in between store a JSON delta against their
+predecessor. A snapshot is rebuilt by folding the deltas of its segment (all
+snapshots sharing its keyframe's `base`) onto the keyframe, and rebuilt
+records are kept in an LRU so the head of a history is never re-folded.
+The LRU is keyed on a record's id together with its `seq` and `base`, so once
+compaction (possibly run by another process) rebases or deletes a chain, its
+old rebuilds are never looked up again.
+Snapshots written before versioning have no `seq` and stay full keyframes.
+"""
+import json
+import os
+import threading
+from cache import LRUCache
+from pagination import DEFAULT_PAGE_SIZE
+from storage import get_backend
+
+DEFAULT_KEYFRAME_INTERVAL = 20
+DEFAULT_SNAPSHOT_CACHE_SIZE = 4096
+KEYFRAME = 'keyframe'
+DELTA = 'delta'
+
+_MISSING = object()
+
+
+def keyframe_interval():
+    return max(1, int(os.getenv('RECALL_SNAPSHOT_KEYFRAME_INTERVAL', DEFAULT_KEYFRAME_INTERVAL)))
+
+
+_state_cache = None
+_state_cache_lock = threading.Lock()
+
+
+def get_snapshot_cache():
+    """Return the process-wide LRU of reconstructed snapshot records, keyed by `_cache_key`."""
+    global _state_cache
+    if _state_cache is None:
+        with _state_cache_lock:
+            if _state_cache is None:
+                _state_cache = LRUCache(int(os.getenv('RECALL_SNAPSHOT_CACHE_SIZE', DEFAULT_SNAPSHOT_CACHE_SIZE)))
+    return _state_cache
+
+
+def _cache_key(record):
+    return record['id'], record.get('seq'), record.get('base')
+
+
+# --- Delta encoding ---
+
+def diff(old, new):
+    """Return a delta turning `old` into `new`; objects are diffed key by key, anything else is replaced."""
+    if not isinstance(old, dict) or not isinstance(new, dict):
+        return {'replace': new}
+    delta = {}
+    unset = [key for key in old if key not in new]
+    changed = {}
+    patch = {}
+    for key, value in new.items():
+        if key not in old:
+            changed[key] = value
+        elif old[key] != value:
+            if isinstance(old[key], dict) and isinstance(value, dict):
+                patch[key] = diff(old[key], value)
+            else:
+                changed[key] = value
+    if changed:
+        delta['set'] = changed
+    if unset:
+        delta['unset'] = unset
+    if patch:
+        delta['patch'] = patch
+    return delta
+
+
+def apply_delta(state, delta):
+    """Apply a delta produced by `diff`, returning the new state (the input is not modified)."""
+    if 'replace' in delta:
+        return delta['replace']
+    state = dict(state)
+    for key in delta.get('unset', ()):
+        state.pop(key, None)
+    state.update(delta.get('set', {}))
+    for key, sub_delta in delta.get('patch', {}).items():
+        state[key] = apply_delta(state.get(key, {}), sub_delta)
+    return state
+
+
+def _parse(payload):
+    try:
+        return json.loads(payload)
+    except (TypeError, ValueError):
+        return _MISSING
+
+
+def encode(previous_payload, payload, since_keyframe, interval):
+    """Choose how to store `payload` after `previous_payload`. Returns `(kind, stored_payload)`.
+
+    A keyframe is written when the segment is full, when either payload is
+    not JSON, or when the delta would not be smaller than the payload itself.
+    """
+    if previous_payload is None or since_keyframe + 1 >= interval:
+        return KEYFRAME, payload
+    old, new = _parse(previous_payload), _parse(payload)
+    if old is _MISSING or new is _MISSING:
+        return KEYFRAME, payload
+    delta = json.dumps(diff(old, new), separators=(',', ':'))
+    if len(delta) >= len(payload):
+        return KEYFRAME, payload
+    return DELTA, delta
+
+
+def _public(record, payload):
+    snapshot = {'id': record['id'], 'created_at': record['created_at'], 'payload': payload}
+    if record.get('seq') is not None:
+        snapshot['version'] = record['seq']
+    return snapshot
+
+
+def _fold(segment, state=_MISSING):
+    """Rebuild seq-ordered records starting from `state`, caching each one."""
+    cache = get_snapshot_cache()
+    results = []
+    for record in segment:
+        if record.get('kind', KEYFRAME) == KEYFRAME:
+            payload = record['payload']
+            state = _parse(payload)
+        else:
+            state = apply_delta(state, json.loads(record['payload']))
+            payload = json.dumps(state)
+        snapshot = _public(record, payload)
+        cache.set(_cache_key(record), snapshot)
+        results.append(snapshot)
+    return results
+
+
+def _cached_fold(segment):
+    """Rebuild a seq-ordered segment (keyframe first).
+
+    Folding resumes from the latest record already in the cache instead of the
+    keyframe when there is one. Returns the rebuilt records from that point on.
+    """
+    cache = get_snapshot_cache()
+    for index in range(len(segment) - 1, -1, -1):
+        cached = cache.get(_cache_key(segment[index]))
+        if cached is not None:
+            return [cached] + _fold(segment[index + 1:], _parse(cached['payload']))
+    return _fold(segment)
+
+
+# --- Operations used by db.py ---
+
+def create_snapshot(entry_id, created_at, payload, interval=None):
+    """Append a version to an entry's history, as a keyframe or a delta. Returns the snapshot id."""
+    interval = interval or keyframe_interval()
+
+    def build(head_segment):
+        previous = _cached_fold(head_segment)[-1]['payload'] if head_segment else None
+        head = head_segment[-1] if head_segment else {}
+        since_keyframe = head['seq'] - head['base'] if head.get('base') is not None else interval
+        return encode(previous, payload, since_keyframe, interval)
+
+    return get_backend().append_snapshot(entry_id, created_at, build)
+
+
+def get_snapshot(snapshot_id):
+    """Return one snapshot with its payload rebuilt, or None."""
+    segment = get_backend().get_snapshot_segment(snapshot_id)
+    return dict(_cached_fold(segment)[-1]) if segment else None
+
+
+def _rebuild(records):
+    """Rebuild raw records of one entry, one fold per segment, keyed by snapshot id."""
+    segments = {}
+    for record in records:
+        key = record['base'] if record.get('base') is not None else ('legacy', record['id'])
+        segments.setdefault(key, []).append(record)
+    cache = get_snapshot_cache()
+    rebuilt = {}
+    for segment in segments.values():
+        segment.sort(key=lambda record: record.get('seq') or 0)
+        folded = {snapshot['id']: snapshot for snapshot in _cached_fold(segment)}
+        for record in segment:
+            snapshot = folded.get(record['id']) or cache.get(_cache_key(record))
+            if snapshot is None:
+                # evicted while folding: rebuild the segment from its keyframe
+                folded = {snapshot['id']: snapshot for snapshot in _fold(segment)}
+                snapshot = folded[record['id']]
+            rebuilt[record['id']] = snapshot
+    return rebuilt
+
+
+def get_snapshots_by_entry(entry_id):
+    """Return an entry's snapshots with payloads rebuilt, ordered by created_at."""
+    records = get_backend().get_snapshots_by_entry(entry_id)
+    rebuilt = _rebuild(records)
+    records.sort(key=lambda record: (record['created_at'], record['id']))
+    return [dict(rebuilt[record['id']]) for record in records]
+
+
+def get_snapshot_history(entry_id, limit=DEFAULT_PAGE_SIZE, after=None, include_payload=True):
+    """Return one page of an entry's history ordered by (created_at, id).
+
+    Only the segments the page touches are loaded. Returns
+    `(snapshots, next_cursor)`; next_cursor is None on the last page.
+    """
+    page, next_cursor = get_backend().get_snapshot_page(entry_id, limit, after=after)
+    if not include_payload:
+        return [
+            {key: value for key, value in _public(record, None).items() if key != 'payload'} for record in page
+        ], next_cursor
+    cache = get_snapshot_cache()
+    missing = [record for record in page if cache.get(_cache_key(record)) is None]
+    bases = sorted({record['base'] for record in missing if record.get('base') is not None})
+    records = [record for record in missing if record.get('base') is None]
+    if bases:
+        records += get_backend().get_snapshot_segments(entry_id, bases)
+    rebuilt = _rebuild(records)
+    snapshots = []
+    for record in page:
+        snapshot = rebuilt.get(record['id']) or cache.get(_cache_key(record)) or get_snapshot(record['id'])
+        snapshots.append(dict(snapshot))
+    return snapshots, next_cursor
+
+
+def compact_snapshots(entry_id, keep):
+    """Fold everything older than the newest `keep` versions into one keyframe.
+
+    The oldest kept version becomes a keyframe carrying its full payload, the
+    deltas after it in the same segment are rebased onto it, and all earlier
+    versions are deleted. Pre-versioning snapshots are left alone. Returns the
+    number of snapshots removed.
+    """
+    records = [record for record in get_backend().get_snapshots_by_entry(entry_id) if record.get('seq') is not None]
+    if keep < 1 or len(records) <= keep:
+        return 0
+    records.sort(key=lambda record: record['seq'])
+    oldest_kept = records[-keep]
+    rebuilt = _rebuild([record for record in records if record['base'] == oldest_kept['base']])
+    payload = rebuilt[oldest_kept['id']]['payload']
+    removed = get_backend().compact_snapshots(entry_id, oldest_kept['id'], payload)
+    cache = get_snapshot_cache()
+    for record in records[:-keep]:
+        cache.delete(_cache_key(record))
+    return removed
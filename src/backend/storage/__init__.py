@@ -0,0 +1,62 @@
+"""Pluggable storage backends for the Recall data layer.
+
+`RECALL_STORAGE` selects the backend: `neo4j` (default) or `memory`.
+"""
+import os
+import threading
+from storage.base import StorageBackend
+
+BACKENDS = ('neo4j', 'memory')
+
+_backend = None
+_async_backend = None
+_backend_lock = threading.Lock()
+
+
+def create_backend(name):
+    """Build a backend by name."""
+    if name == 'neo4j':
+        from pool import get_pool
+        from storage.neo4j_backend import Neo4jBackend
+        return Neo4jBackend(get_pool())
+    if name == 'memory':
+        from storage.memory import MemoryBackend
+        return MemoryBackend()
+    raise ValueError(f"Unknown storage backend '{name}' (expected one of {', '.join(BACKENDS)})")
+
+
+def get_backend():
+    """Return the process-wide backend, created from RECALL_STORAGE on first use."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend(os.getenv('RECALL_STORAGE', 'neo4j').lower())
+    return _backend
+
+
+def set_backend(backend):
+    """Replace the process-wide backend (e.g. with a MemoryBackend in tests); returns the previous one."""
+    global _backend, _async_backend
+    with _backend_lock:
+        previous, _backend = _backend, backend
+        _async_backend = None
+    return previous
+
+
+def get_async_backend():
+    """Return the process-wide async read backend matching RECALL_STORAGE.
+
+    Neo4j gets a native `AsyncGraphDatabase` backend; other backends are
+    wrapped so their calls run off the event loop.
+    """
+    global _async_backend
+    if _async_backend is None:
+        from storage.async_backend import AsyncBackendAdapter, AsyncNeo4jBackend
+        backend = get_backend()
+        if backend.name == 'neo4j':
+            from pool import get_async_pool
+            _async_backend = AsyncNeo4jBackend(get_async_pool())
+        else:
+            _async_backend = AsyncBackendAdapter(backend)
+    return _async_backend
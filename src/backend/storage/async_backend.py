@@ -0,0 +1,80 @@
+import asyncio
+from storage.neo4j_backend import (
+    ALL_CAPSULES, CAPSULE_BY_ID, CAPSULE_ENTRIES, ENTRIES_PAGE, ENTRY_BY_ID, ENTRY_TAGS, ENTRY_TEMPLATE,
+    LINKED_ENTRIES, _capsule, _entry, _entries_page, _page_params,
+)
+
+# Read operations served on the async request path (see async_db.py).
+ASYNC_OPERATIONS = (
+    'get_all_capsules', 'get_capsule', 'get_entries_by_capsule', 'get_entries_page',
+    'get_entry_by_id', 'get_linked_entries', 'get_tags_for_entry', 'get_template_for_entry',
+)
+
+
+class AsyncNeo4jBackend:
+    """Async read path over `neo4j.AsyncGraphDatabase`, running Neo4jBackend's read queries."""
+
+    name = 'neo4j'
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def close(self):
+        await self.pool.close()
+
+    async def _fetch(self, query, key, convert, **params):
+        async with self.pool.session() as session:
+            result = await session.run(query, **params)
+            return [convert(record[key]) async for record in result]
+
+    async def get_all_capsules(self):
+        return await self._fetch(ALL_CAPSULES, "c", dict)
+
+    async def get_capsule(self, capsule_id):
+        rows = await self._fetch(CAPSULE_BY_ID, "c", _capsule, capsule_id=capsule_id)
+        return rows[0] if rows else None
+
+    async def get_entries_by_capsule(self, capsule_id):
+        return await self._fetch(CAPSULE_ENTRIES, "e", _entry, capsule_id=capsule_id)
+
+    async def get_entries_page(self, capsule_id, limit, after=None):
+        entries = await self._fetch(ENTRIES_PAGE, "e", _entry, **_page_params(capsule_id, limit, after))
+        return _entries_page(entries, limit)
+
+    async def get_entry_by_id(self, entry_id):
+        rows = await self._fetch(ENTRY_BY_ID, "e", _entry, id=entry_id)
+        return rows[0] if rows else None
+
+    async def get_linked_entries(self, entry_id):
+        return await self._fetch(LINKED_ENTRIES, "linked", _entry, entry_id=entry_id)
+
+    async def get_tags_for_entry(self, entry_id):
+        return await self._fetch(ENTRY_TAGS, "tag", dict, entry_id=entry_id)
+
+    async def get_template_for_entry(self, entry_id):
+        rows = await self._fetch(ENTRY_TEMPLATE, "tpl", dict, entry_id=entry_id)
+        return rows[0] if rows else None
+
+
+class AsyncBackendAdapter:
+    """Expose a synchronous StorageBackend's read path as coroutines.
+
+    Calls run in the default thread pool so a slow backend never blocks the
+    event loop; this is how the in-memory engine serves the async path.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.name = backend.name
+
+    async def close(self):
+        await asyncio.to_thread(self.backend.close)
+
+    def __getattr__(self, name):
+        if name not in ASYNC_OPERATIONS:
+            raise AttributeError(name)
+        method = getattr(self.backend, name)
+
+        async def call(*args, **kwargs):
+            return await asyncio.to_thread(method, *args, **kwargs)
+        return call
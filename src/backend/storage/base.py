@@ -0,0 +1,348 @@
+from abc import ABC, abstractmethod
+from aggregation import aggregate_columns, columnar_extract
+from entry_storage import split_properties
+from collections import Counter, defaultdict
+from filters import entry_matches, entry_time, in_range, truncate
+from pagination import encode_cursor
+from traversal import breadth_first
+
+# Edge types exported by iter_capsule_relations, with the label of the node they point to.
+GRAPH_RELATIONS = {
+    'LINKS_TO': 'Entry',
+    'TAGGED_AS': 'Tag',
+    'USES_TEMPLATE': 'Template',
+    'HAS_SNAPSHOT': 'Snapshot',
+}
+
+
+class StorageBackend(ABC):
+    """Operations the data layer (`db.py`) needs from a graph store.
+
+    Records come back as plain dicts: capsules with their `fields` schema
+    parsed, entries with `properties` as a JSON string (native field values
+    folded back in, see entry_storage).
+    """
+
+    name = None
+
+    def ensure_schema(self):
+        """Create whatever constraints/indexes the backend needs. No-op by default."""
+
+    def check_schema(self):
+        """Return a list of schema problems; empty when nothing is missing (the default)."""
+        return []
+
+    def close(self):
+        """Release connections or other resources. No-op by default."""
+
+    def health(self):
+        """Return a status dict for the health endpoint."""
+        return {'backend': self.name, 'status': 'ok'}
+
+    def clear(self):
+        """Remove all data. Only in-memory backends support this."""
+        raise NotImplementedError(f'{type(self).__name__} does not support clear()')
+
+    def ensure_field_indexes(self, fields):
+        """Create indexes over a capsule's native field properties. No-op by default."""
+
+    # Capsules
+    @abstractmethod
+    def create_capsule(self, name, description, created_at, fields=None, storage_mode='json', capsule_id=None,
+                       import_id=None):
+        """Create a capsule and return its id, a new one unless `capsule_id` is given (e.g. by an import).
+
+        `import_id`, when given, is stored on the capsule to mark the archive import that created it.
+        """
+
+    @abstractmethod
+    def get_all_capsules(self): ...
+
+    @abstractmethod
+    def get_capsule(self, capsule_id): ...
+
+    @abstractmethod
+    def mark_capsule_deleted(self, capsule_id):
+        """Hide a capsule from every capsule read, keeping its entries for purge_capsule_batch.
+
+        Returns False when there is no such capsule.
+        """
+
+    @abstractmethod
+    def purge_capsule_batch(self, capsule_id, batch_size):
+        """Delete up to `batch_size` entries of a deleted capsule, with their snapshots and edges.
+
+        Each call is one transaction. Returns `(entries, snapshots)` removed;
+        once no entries are left the capsule node itself is deleted and
+        `(0, 0)` is returned.
+        """
+
+    @abstractmethod
+    def get_deleted_capsule_ids(self):
+        """Ids of capsules marked deleted whose entries have not all been purged."""
+
+    @abstractmethod
+    def set_capsule_storage_mode(self, capsule_id, storage_mode): ...
+
+    # Entries
+    @abstractmethod
+    def create_entry(self, capsule_id, timestamp, properties, native=None): ...
+
+    @abstractmethod
+    def create_entries_batch(self, capsule_id, rows):
+        """Create entries from `(timestamp, properties_json, native)` rows; returns their ids."""
+
+    @abstractmethod
+    def import_entries_batch(self, capsule_id, rows):
+        """Create entries from `(entry_id, timestamp, properties_json, native)` rows, keeping their ids.
+
+        One transaction per call. Ids that already exist are left alone, so a
+        batch can be replayed; returns the number of entries created.
+        """
+
+    def create_entries_from_template(self, capsule_id, template_id, rows):
+        """Create entries from `(timestamp, properties_json, native, tags)` rows, each tagged and
+        linked to the template by USES_TEMPLATE; returns their ids.
+
+        The default composes the single-purpose writes; backends override it
+        to write a batch in one transaction.
+        """
+        ids = self.create_entries_batch(capsule_id, [row[:3] for row in rows])
+        self.tag_entries_batch([(entry_id, tag) for entry_id, row in zip(ids, rows) for tag in row[3]])
+        for entry_id in ids:
+            self.assign_template_to_entry(entry_id, template_id)
+        return ids
+
+    @abstractmethod
+    def get_entries_by_capsule(self, capsule_id): ...
+
+    @abstractmethod
+    def get_entries_page(self, capsule_id, limit, after=None): ...
+
+    @abstractmethod
+    def iter_entries_by_capsule(self, capsule_id, after=None): ...
+
+    @abstractmethod
+    def get_entry_by_id(self, entry_id): ...
+
+    @abstractmethod
+    def delete_entry(self, entry_id): ...
+
+    @abstractmethod
+    def update_entry_storage(self, rows):
+        """Rewrite entries' layout from `{'id', 'properties', 'native'}` rows (values unchanged)."""
+
+    def scan_entries_filtered(self, capsule_id, filters, limit, after=None, start=None, end=None):
+        """Filter a capsule's entries by decoding each one's properties, in (timestamp, id) order."""
+        timed = start is not None or end is not None
+        entries = []
+        for entry in self.iter_entries_by_capsule(capsule_id, after=after):
+            if not entry_matches(entry, filters) or (timed and not in_range(entry_time(entry), start, end)):
+                continue
+            if len(entries) == limit:
+                last = entries[-1]
+                return entries, encode_cursor(last['timestamp'], last['id'])
+            entries.append(entry)
+        return entries, None
+
+    def get_entries_filtered(self, capsule_id, filters, limit, after=None, start=None, end=None):
+        """Filter a native-mode capsule's entries on their field properties and time range.
+
+        `filters` are `(field, op, value)` triples from filters.parse_filters;
+        `start` (inclusive) and `end` (exclusive) are UTC datetimes or None.
+        Returns `(entries, next_cursor)`. Backends with typed property and
+        datetime indexes push this down; the default scans.
+        """
+        return self.scan_entries_filtered(capsule_id, filters, limit, after=after, start=start, end=end)
+
+    def count_entries_by_bucket(self, capsule_id, bucket, start=None, end=None):
+        """Count a capsule's entries per `bucket` ('hour' or 'day', UTC) within the time range.
+
+        Returns `[{'start': iso_timestamp, 'count': n}]` for non-empty buckets
+        in time order. The default scans the capsule.
+        """
+        counts = Counter()
+        for entry in self.iter_entries_by_capsule(capsule_id):
+            moment = entry_time(entry)
+            if in_range(moment, start, end):
+                counts[truncate(moment, bucket)] += 1
+        return [{'start': moment.isoformat(), 'count': count} for moment, count in sorted(counts.items())]
+
+    def scan_aggregate_entries(self, capsule_id, columns, group_by=None, start=None, end=None):
+        """Aggregate by decoding every entry in the range into a columnar extract (see aggregation.py)."""
+        entries = self.iter_entries_by_capsule(capsule_id)
+        if start is not None or end is not None:
+            entries = (entry for entry in entries if in_range(entry_time(entry), start, end))
+        tags = None
+        if group_by and group_by[0] == 'tag':
+            tags = defaultdict(list)
+            for entry_id, tag in self.iter_capsule_relations(capsule_id, 'TAGGED_AS'):
+                tags[entry_id].append(tag['name'])
+        keys, values = columnar_extract(entries, columns, group_by, tags)
+        return aggregate_columns(keys, values, columns)
+
+    def aggregate_entries(self, capsule_id, columns, group_by=None, start=None, end=None):
+        """Grouped count/sum/avg/min/max of a native-mode capsule's int and boolean fields.
+
+        `columns` and `group_by` come from aggregation.parse_aggregation.
+        Returns `[{'key', 'count', 'fields': {name: stats}}]` in key order.
+        Backends that store native fields as typed properties push this
+        down; the default scans.
+        """
+        return self.scan_aggregate_entries(capsule_id, columns, group_by, start=start, end=end)
+
+    def migrate_entries_batch(self, capsule_id, fields, batch_size, after=None):
+        """Move one page of a capsule's entries to the native layout. Returns `(count, next_cursor)`."""
+        entries, next_cursor = self.get_entries_page(capsule_id, batch_size, after=after)
+        rows = []
+        for entry in entries:
+            properties, native = split_properties(fields, entry.get('properties'))
+            rows.append({'id': entry['id'], 'properties': properties, 'native': native})
+        if rows:
+            self.update_entry_storage(rows)
+        return len(rows), next_cursor
+
+    # Snapshots (stored records; see snapshots.py for keyframes, deltas and rebuilding)
+    @abstractmethod
+    def append_snapshot(self, entry_id, created_at, build):
+        """Add the entry's next version atomically and return its id (None if the entry is missing).
+
+        `build(head_segment)` gets the current head's segment (keyframe through
+        head, seq-ordered; empty when there is no versioned head) and returns
+        `(kind, payload)` for the new snapshot.
+        """
+
+    @abstractmethod
+    def get_snapshots_by_entry(self, entry_id): ...
+
+    @abstractmethod
+    def get_snapshot_segment(self, snapshot_id):
+        """Return the snapshot's segment from its keyframe up to itself, seq-ordered ([] if missing)."""
+
+    @abstractmethod
+    def get_snapshot_segments(self, entry_id, bases):
+        """Return every snapshot of the entry whose keyframe `base` is in `bases`, ordered by (base, seq)."""
+
+    @abstractmethod
+    def get_snapshot_page(self, entry_id, limit, after=None):
+        """Return `(records, next_cursor)` for the entry's snapshots ordered by (created_at, id)."""
+
+    @abstractmethod
+    def compact_snapshots(self, entry_id, keyframe_id, payload):
+        """Turn `keyframe_id` into a keyframe, rebase its segment and delete older versions. Returns the count."""
+
+    @abstractmethod
+    def get_entries_with_snapshot_history(self, min_versions): ...
+
+    @abstractmethod
+    def import_snapshots_batch(self, rows):
+        """Store raw snapshot records (each with its `entry_id`) as they are, keeping ids, seq and base.
+
+        Snapshots whose id exists or whose entry is missing are skipped; the
+        entry's seq counter is raised to the highest seq stored. Returns the
+        number created.
+        """
+
+    @abstractmethod
+    def iter_capsule_snapshots(self, capsule_id):
+        """Yield the raw snapshot records of a capsule's entries, each with its `entry_id`."""
+
+    # Tags and templates
+    @abstractmethod
+    def create_tag(self, name): ...
+
+    @abstractmethod
+    def get_tag_by_name(self, name): ...
+
+    @abstractmethod
+    def create_template(self, name, structure):
+        """Return the id of the template named `name`, creating it if needed.
+
+        Raises ValueError when the name exists with a different structure.
+        """
+
+    @abstractmethod
+    def get_template_by_name(self, name): ...
+
+    @abstractmethod
+    def get_template(self, template_id): ...
+
+    # Edges
+    @abstractmethod
+    def link_entry_to_entry(self, source_entry_id, target_entry_id): ...
+
+    @abstractmethod
+    def tag_entry(self, entry_id, tag_name): ...
+
+    @abstractmethod
+    def tag_entries_batch(self, pairs):
+        """Tag entries from distinct `(entry_id, tag_name)` pairs in one transaction.
+
+        Returns `{'created', 'existing', 'missing'}` edge counts, where missing
+        counts pairs whose entry does not exist.
+        """
+
+    @abstractmethod
+    def link_entries_batch(self, pairs):
+        """Create LINKS_TO edges from distinct `(source_id, target_id)` pairs; counts as for tag_entries_batch."""
+
+    @abstractmethod
+    def assign_template_to_entry(self, entry_id, template_id): ...
+
+    @abstractmethod
+    def assign_templates_batch(self, pairs):
+        """Create USES_TEMPLATE edges from distinct `(entry_id, template_id)` pairs; counts as for tag_entries_batch."""
+
+    # Traversal and queries
+    @abstractmethod
+    def get_linked_entries(self, entry_id): ...
+
+    @abstractmethod
+    def get_linked_frontier(self, entry_ids, fan_out=None):
+        """Return {entry_id: [linked entries ordered by id]} for a whole BFS frontier."""
+
+    @abstractmethod
+    def get_tags_for_entry(self, entry_id): ...
+
+    @abstractmethod
+    def get_template_for_entry(self, entry_id): ...
+
+    @abstractmethod
+    def search_entries(self, query, skip=0, limit=None): ...
+
+    @abstractmethod
+    def search_entries_combined(self, text=None, tag=None, linked_to=None, mode='and', skip=0, limit=None): ...
+
+    @abstractmethod
+    def filter_entries_by_tag(self, tag_name): ...
+
+    # Tag analytics: per-tag entry counts are kept up to date by every TAGGED_AS write and entry
+    # removal, and only count entries of live (not deleted) capsules
+    @abstractmethod
+    def get_tag_counts(self, capsule_id=None, limit=None):
+        """Return `[{'name', 'entries'}]` for tags in use, overall or in one capsule, most used first."""
+
+    @abstractmethod
+    def get_tag_cooccurrence(self, tag_name, capsule_id=None, limit=None):
+        """Return `[{'name', 'entries'}]`: for each other tag, the entries it shares with `tag_name`."""
+
+    @abstractmethod
+    def get_entries_with_tags(self, tag_names, limit, capsule_id=None, after=None):
+        """Return `(entries, next_cursor)` for entries carrying every tag, ordered by (timestamp, id)."""
+
+    # Graph export
+    @abstractmethod
+    def iter_capsule_relations(self, capsule_id, rel_type):
+        """Yield `(entry_id, node)` for every `rel_type` edge out of the capsule's entries.
+
+        `rel_type` is one of GRAPH_RELATIONS. LINKS_TO only yields targets in the
+        same capsule; nodes carry just the keys a graph view needs (no payloads).
+        """
+
+    @abstractmethod
+    def get_capsule_degrees(self, capsule_id):
+        """Return {entry_id: number of LINKS_TO and TAGGED_AS edges} for the capsule's entries."""
+
+    def traverse_linked_entries(self, entry_id, max_depth=5, limit=None, fan_out=None):
+        """Breadth-first LINKS_TO traversal, one get_linked_frontier call per depth level."""
+        return breadth_first(entry_id, self.get_linked_frontier, max_depth=max_depth, limit=limit, fan_out=fan_out)
@@ -0,0 +1,622 @@
+from bisect import bisect_left, insort
+from collections import defaultdict
+import copy
+import threading
+import uuid
+from entry_storage import NATIVE_PREFIX, assemble_entry, merge_properties
+from pagination import encode_cursor, decode_cursor
+from search import SEARCH_MODES, InvertedIndex
+from storage.base import StorageBackend
+
+
+def _new_id():
+    return str(uuid.uuid4())
+
+
+class MemoryBackend(StorageBackend):
+    """In-process graph engine implementing the full storage interface.
+
+    Nodes live in per-label dicts keyed by id, with hash indexes on Tag and
+    Template names. Every edge type has forward and reverse adjacency indexes,
+    and each capsule keeps its entries sorted by (timestamp, id) so pages and
+    streams come out in the same order as the Neo4j backend. Records are
+    copied on the way out so callers cannot mutate the store.
+    """
+
+    name = 'memory'
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self.capsules = {}
+            # Capsules being purged in batches (see purge_capsule_batch)
+            self.deleted_capsules = {}
+            self.entries = {}
+            self.snapshots = {}
+            self.tags = {}
+            self.templates = {}
+            self.tag_ids_by_name = {}
+            self.template_ids_by_name = {}
+            # HAS_ENTRY: capsule id -> sorted [(timestamp, entry id)], plus the reverse lookup
+            self.has_entry = defaultdict(list)
+            self.entry_capsule = {}
+            # LINKS_TO, TAGGED_AS, HAS_SNAPSHOT, USES_TEMPLATE: forward and reverse adjacency
+            self.links_out = defaultdict(dict)
+            self.links_in = defaultdict(dict)
+            self.tagged = defaultdict(dict)
+            self.tag_entries = defaultdict(dict)
+            self.has_snapshot = defaultdict(dict)
+            self.snapshot_entry = {}
+            self.snapshot_seq = {}
+            self.uses_template = defaultdict(dict)
+            self.template_entries = defaultdict(dict)
+            # Entries per tag id, overall and per capsule, kept in step with TAGGED_AS (live capsules only)
+            self.tag_counts = defaultdict(int)
+            self.capsule_tag_counts = defaultdict(lambda: defaultdict(int))
+            self.search_index = InvertedIndex()
+
+    def _entry(self, entry_id):
+        return assemble_entry(copy.deepcopy(self.entries[entry_id]))
+
+    def _live(self, entry_id):
+        # Entries of a capsule marked deleted stay stored until the purge but are hidden from reads
+        return entry_id in self.entries and self.entry_capsule.get(entry_id) in self.capsules
+
+    def _entries(self, entry_ids):
+        return [self._entry(entry_id) for entry_id in entry_ids if self._live(entry_id)]
+
+    # Capsules
+    def create_capsule(self, name, description, created_at, fields=None, storage_mode='json', capsule_id=None,
+                       import_id=None):
+        capsule_id = capsule_id or _new_id()
+        with self._lock:
+            if capsule_id in self.capsules or capsule_id in self.deleted_capsules:
+                raise ValueError(f'capsule {capsule_id} already exists')
+            self.capsules[capsule_id] = {
+                'id': capsule_id,
+                'name': name,
+                'description': description,
+                'created_at': created_at.isoformat(),
+                'fields': copy.deepcopy(fields or []),
+                'storage_mode': storage_mode,
+            }
+            if import_id is not None:
+                self.capsules[capsule_id]['import_id'] = import_id
+        return capsule_id
+
+    def get_all_capsules(self):
+        with self._lock:
+            return [copy.deepcopy(capsule) for capsule in self.capsules.values()]
+
+    def get_capsule(self, capsule_id):
+        with self._lock:
+            capsule = self.capsules.get(capsule_id)
+            return copy.deepcopy(capsule) if capsule else None
+
+    def mark_capsule_deleted(self, capsule_id):
+        with self._lock:
+            capsule = self.capsules.pop(capsule_id, None)
+            if capsule is None:
+                return False
+            self.deleted_capsules[capsule_id] = capsule
+            for _, entry_id in self.has_entry.get(capsule_id, []):
+                self.search_index.remove(entry_id)
+            for tag_id, count in self.capsule_tag_counts.pop(capsule_id, {}).items():
+                self._adjust_count(self.tag_counts, tag_id, -count)
+            return True
+
+    def purge_capsule_batch(self, capsule_id, batch_size):
+        with self._lock:
+            if capsule_id not in self.deleted_capsules:
+                return 0, 0
+            entry_ids = [entry_id for _, entry_id in self.has_entry.get(capsule_id, [])[:batch_size]]
+            if not entry_ids:
+                self.deleted_capsules.pop(capsule_id)
+                self.has_entry.pop(capsule_id, None)
+                return 0, 0
+            snapshots = 0
+            for entry_id in entry_ids:
+                for snapshot_id in self.has_snapshot.get(entry_id, {}):
+                    self.snapshots.pop(snapshot_id, None)
+                    self.snapshot_entry.pop(snapshot_id, None)
+                    snapshots += 1
+                self.delete_entry(entry_id)
+            return len(entry_ids), snapshots
+
+    def get_deleted_capsule_ids(self):
+        with self._lock:
+            return list(self.deleted_capsules)
+
+    def set_capsule_storage_mode(self, capsule_id, storage_mode):
+        with self._lock:
+            if capsule_id in self.capsules:
+                self.capsules[capsule_id]['storage_mode'] = storage_mode
+
+    # Entries
+    def _add_entry(self, capsule_id, timestamp, properties, native, entry_id=None):
+        entry_id = entry_id or _new_id()
+        timestamp = timestamp.isoformat()
+        # Stored like the Neo4j node: native field values sit beside the JSON overflow
+        self.entries[entry_id] = dict(native or {}, id=entry_id, timestamp=timestamp, properties=properties)
+        insort(self.has_entry[capsule_id], (timestamp, entry_id))
+        self.entry_capsule[entry_id] = capsule_id
+        self.search_index.add(entry_id, merge_properties(properties, native))
+        return entry_id
+
+    def create_entry(self, capsule_id, timestamp, properties, native=None):
+        with self._lock:
+            if capsule_id not in self.capsules:
+                return None
+            return self._add_entry(capsule_id, timestamp, properties, native)
+
+    def create_entries_batch(self, capsule_id, rows):
+        with self._lock:
+            if capsule_id not in self.capsules:
+                return []
+            return [self._add_entry(capsule_id, timestamp, properties, native) for timestamp, properties, native in rows]
+
+    def import_entries_batch(self, capsule_id, rows):
+        with self._lock:
+            if capsule_id not in self.capsules:
+                return 0
+            created = 0
+            for entry_id, timestamp, properties, native in rows:
+                if entry_id not in self.entries:
+                    self._add_entry(capsule_id, timestamp, properties, native, entry_id=entry_id)
+                    created += 1
+            return created
+
+    def create_entries_from_template(self, capsule_id, template_id, rows):
+        with self._lock:
+            if capsule_id not in self.capsules:
+                return []
+            template = template_id in self.templates
+            ids = []
+            for timestamp, properties, native, tags in rows:
+                entry_id = self._add_entry(capsule_id, timestamp, properties, native)
+                for tag_name in tags:
+                    self._tag(entry_id, self._merge_tag(tag_name))
+                if template:
+                    self.uses_template[entry_id][template_id] = True
+                    self.template_entries[template_id][entry_id] = True
+                ids.append(entry_id)
+            return ids
+
+    def get_entries_by_capsule(self, capsule_id):
+        with self._lock:
+            return self._entries(entry_id for _, entry_id in self.has_entry.get(capsule_id, []))
+
+    def _keys_after(self, capsule_id, after):
+        keys = self.has_entry.get(capsule_id, [])
+        if not after:
+            return keys, 0
+        after_ts, after_id = decode_cursor(after, 2)
+        return keys, bisect_left(keys, (after_ts, after_id + '\0'))
+
+    def get_entries_page(self, capsule_id, limit, after=None):
+        with self._lock:
+            keys, start = self._keys_after(capsule_id, after)
+            page = keys[start:start + limit]
+            entries = self._entries(entry_id for _, entry_id in page)
+            more = start + limit < len(keys)
+        if not more or not entries:
+            return entries, None
+        last = entries[-1]
+        return entries, encode_cursor(last['timestamp'], last['id'])
+
+    def iter_entries_by_capsule(self, capsule_id, after=None):
+        with self._lock:
+            keys, start = self._keys_after(capsule_id, after)
+            keys = keys[start:]
+        for _, entry_id in keys:
+            with self._lock:
+                entry = self._entry(entry_id) if self._live(entry_id) else None
+            if entry:
+                yield entry
+
+    def get_entry_by_id(self, entry_id):
+        with self._lock:
+            return self._entry(entry_id) if self._live(entry_id) else None
+
+    def delete_entry(self, entry_id):
+        with self._lock:
+            if entry_id not in self.entries:
+                return
+            for tag_id in self.tagged.pop(entry_id, {}):
+                self.tag_entries[tag_id].pop(entry_id, None)
+                self._count_tag(entry_id, tag_id, -1)
+            entry = self.entries.pop(entry_id)
+            capsule_id = self.entry_capsule.pop(entry_id, None)
+            if capsule_id is not None:
+                keys = self.has_entry[capsule_id]
+                index = bisect_left(keys, (entry['timestamp'], entry_id))
+                if index < len(keys) and keys[index] == (entry['timestamp'], entry_id):
+                    del keys[index]
+            for target_id in self.links_out.pop(entry_id, {}):
+                self.links_in[target_id].pop(entry_id, None)
+            for source_id in self.links_in.pop(entry_id, {}):
+                self.links_out[source_id].pop(entry_id, None)
+            for template_id in self.uses_template.pop(entry_id, {}):
+                self.template_entries[template_id].pop(entry_id, None)
+            # DETACH DELETE leaves snapshot nodes behind; only the edges go.
+            self.has_snapshot.pop(entry_id, None)
+            self.snapshot_seq.pop(entry_id, None)
+            self.search_index.remove(entry_id)
+
+    def update_entry_storage(self, rows):
+        with self._lock:
+            for row in rows:
+                entry = self.entries.get(row['id'])
+                if entry is None:
+                    continue
+                for key in [key for key in entry if key.startswith(NATIVE_PREFIX)]:
+                    del entry[key]
+                entry.update(row['native'], properties=row['properties'])
+
+    # Snapshots
+    def _snapshot_records(self, entry_id, predicate=None):
+        records = (self.snapshots[sid] for sid in self.has_snapshot.get(entry_id, {}))
+        return [copy.deepcopy(record) for record in records if predicate is None or predicate(record)]
+
+    def append_snapshot(self, entry_id, created_at, build):
+        with self._lock:
+            if entry_id not in self.entries:
+                return None
+            seq = self.snapshot_seq.get(entry_id, 0) + 1
+            self.snapshot_seq[entry_id] = seq
+            head = next(iter(self._snapshot_records(entry_id, lambda r: r.get('seq') == seq - 1)), None)
+            segment = []
+            if head is not None and head.get('base') is not None:
+                segment = sorted(
+                    self._snapshot_records(entry_id, lambda r: r.get('base') == head['base'] and r['seq'] <= head['seq']),
+                    key=lambda r: r['seq']
+                )
+            kind, payload = build(segment)
+            snapshot_id = _new_id()
+            self.snapshots[snapshot_id] = {
+                'id': snapshot_id, 'created_at': created_at.isoformat(), 'payload': payload,
+                'kind': kind, 'seq': seq, 'base': seq if kind == 'keyframe' else segment[-1]['base'],
+            }
+            self.has_snapshot[entry_id][snapshot_id] = True
+            self.snapshot_entry[snapshot_id] = entry_id
+            return snapshot_id
+
+    def get_snapshots_by_entry(self, entry_id):
+        with self._lock:
+            return self._snapshot_records(entry_id)
+
+    def get_snapshot_segment(self, snapshot_id):
+        with self._lock:
+            target = self.snapshots.get(snapshot_id)
+            if target is None:
+                return []
+            if target.get('base') is None:
+                return [copy.deepcopy(target)]
+            entry_id = self.snapshot_entry.get(snapshot_id)
+            return sorted(
+                self._snapshot_records(entry_id, lambda r: r.get('base') == target['base'] and r['seq'] <= target['seq']),
+                key=lambda r: r['seq']
+            )
+
+    def get_snapshot_segments(self, entry_id, bases):
+        bases = set(bases)
+        with self._lock:
+            return sorted(
+                self._snapshot_records(entry_id, lambda r: r.get('base') in bases),
+                key=lambda r: (r['base'], r['seq'])
+            )
+
+    def get_snapshot_page(self, entry_id, limit, after=None):
+        after_key = tuple(decode_cursor(after, 2)) if after else None
+        with self._lock:
+            records = sorted(self._snapshot_records(entry_id), key=lambda r: (r['created_at'], r['id']))
+        if after_key is not None:
+            records = [r for r in records if (r['created_at'], r['id']) > after_key]
+        if len(records) <= limit:
+            return records, None
+        records = records[:limit]
+        return records, encode_cursor(records[-1]['created_at'], records[-1]['id'])
+
+    def compact_snapshots(self, entry_id, keyframe_id, payload):
+        with self._lock:
+            keyframe = self.snapshots.get(keyframe_id)
+            if keyframe is None or keyframe_id not in self.has_snapshot.get(entry_id, {}):
+                return 0
+            removed = 0
+            for snapshot_id in list(self.has_snapshot[entry_id]):
+                record = self.snapshots[snapshot_id]
+                if record.get('seq') is None:
+                    continue
+                if record['base'] == keyframe['base'] and record['seq'] > keyframe['seq']:
+                    record['base'] = keyframe['seq']
+                elif record['seq'] < keyframe['seq']:
+                    del self.has_snapshot[entry_id][snapshot_id]
+                    del self.snapshots[snapshot_id]
+                    self.snapshot_entry.pop(snapshot_id, None)
+                    removed += 1
+            keyframe.update(kind='keyframe', payload=payload, base=keyframe['seq'])
+            return removed
+
+    def get_entries_with_snapshot_history(self, min_versions):
+        with self._lock:
+            return [
+                entry_id for entry_id, snapshot_ids in self.has_snapshot.items()
+                if sum(1 for sid in snapshot_ids if self.snapshots[sid].get('seq') is not None) > min_versions
+            ]
+
+    def import_snapshots_batch(self, rows):
+        created = 0
+        with self._lock:
+            for row in rows:
+                entry_id = row['entry_id']
+                if row['id'] in self.snapshots or entry_id not in self.entries:
+                    continue
+                self.snapshots[row['id']] = {key: copy.deepcopy(row.get(key))
+                                             for key in ('id', 'created_at', 'payload', 'kind', 'seq', 'base')}
+                self.has_snapshot[entry_id][row['id']] = True
+                self.snapshot_entry[row['id']] = entry_id
+                if row.get('seq') is not None:
+                    self.snapshot_seq[entry_id] = max(self.snapshot_seq.get(entry_id, 0), row['seq'])
+                created += 1
+        return created
+
+    def iter_capsule_snapshots(self, capsule_id):
+        with self._lock:
+            entry_ids = [entry_id for _, entry_id in self.has_entry.get(capsule_id, [])]
+        for entry_id in entry_ids:
+            with self._lock:
+                records = self._snapshot_records(entry_id)
+            for record in records:
+                yield dict(record, entry_id=entry_id)
+
+    # Tags and templates
+    def _merge_tag(self, name):
+        tag_id = self.tag_ids_by_name.get(name)
+        if tag_id is None:
+            tag_id = _new_id()
+            self.tags[tag_id] = {'id': tag_id, 'name': name}
+            self.tag_ids_by_name[name] = tag_id
+        return tag_id
+
+    @staticmethod
+    def _adjust_count(counts, key, delta):
+        counts[key] += delta
+        if counts[key] <= 0:
+            del counts[key]
+
+    def _count_tag(self, entry_id, tag_id, delta):
+        capsule_id = self.entry_capsule.get(entry_id)
+        if capsule_id in self.capsules:
+            self._adjust_count(self.tag_counts, tag_id, delta)
+            self._adjust_count(self.capsule_tag_counts[capsule_id], tag_id, delta)
+
+    def _tag(self, entry_id, tag_id):
+        """Add a TAGGED_AS edge and count it; returns False when it already existed."""
+        if tag_id in self.tagged[entry_id]:
+            return False
+        self.tagged[entry_id][tag_id] = True
+        self.tag_entries[tag_id][entry_id] = True
+        self._count_tag(entry_id, tag_id, 1)
+        return True
+
+    def create_tag(self, name):
+        with self._lock:
+            return self._merge_tag(name)
+
+    def get_tag_by_name(self, name):
+        with self._lock:
+            tag_id = self.tag_ids_by_name.get(name)
+            return copy.deepcopy(self.tags[tag_id]) if tag_id else None
+
+    def create_template(self, name, structure):
+        with self._lock:
+            template_id = self.template_ids_by_name.get(name)
+            if template_id is None:
+                template_id = _new_id()
+                self.templates[template_id] = {'id': template_id, 'name': name, 'structure': structure}
+                self.template_ids_by_name[name] = template_id
+            elif self.templates[template_id]['structure'] != structure:
+                raise ValueError(f'template {name!r} already exists with a different structure')
+            return template_id
+
+    def get_template_by_name(self, name):
+        with self._lock:
+            template_id = self.template_ids_by_name.get(name)
+            return copy.deepcopy(self.templates[template_id]) if template_id else None
+
+    def get_template(self, template_id):
+        with self._lock:
+            template = self.templates.get(template_id)
+            return copy.deepcopy(template) if template else None
+
+    # Edges
+    def link_entry_to_entry(self, source_entry_id, target_entry_id):
+        with self._lock:
+            if source_entry_id in self.entries and target_entry_id in self.entries:
+                self.links_out[source_entry_id][target_entry_id] = True
+                self.links_in[target_entry_id][source_entry_id] = True
+
+    def tag_entry(self, entry_id, tag_name):
+        with self._lock:
+            if entry_id not in self.entries:
+                return
+            self._tag(entry_id, self._merge_tag(tag_name))
+
+    def tag_entries_batch(self, pairs):
+        counts = {'created': 0, 'existing': 0, 'missing': 0}
+        with self._lock:
+            for entry_id, tag_name in pairs:
+                if entry_id not in self.entries:
+                    counts['missing'] += 1
+                    continue
+                counts['created' if self._tag(entry_id, self._merge_tag(tag_name)) else 'existing'] += 1
+        return counts
+
+    def link_entries_batch(self, pairs):
+        counts = {'created': 0, 'existing': 0, 'missing': 0}
+        with self._lock:
+            for source_id, target_id in pairs:
+                if source_id not in self.entries or target_id not in self.entries:
+                    counts['missing'] += 1
+                    continue
+                counts['existing' if target_id in self.links_out[source_id] else 'created'] += 1
+                self.links_out[source_id][target_id] = True
+                self.links_in[target_id][source_id] = True
+        return counts
+
+    def assign_template_to_entry(self, entry_id, template_id):
+        with self._lock:
+            if entry_id in self.entries and template_id in self.templates:
+                self.uses_template[entry_id][template_id] = True
+                self.template_entries[template_id][entry_id] = True
+
+    def assign_templates_batch(self, pairs):
+        counts = {'created': 0, 'existing': 0, 'missing': 0}
+        with self._lock:
+            for entry_id, template_id in pairs:
+                if entry_id not in self.entries or template_id not in self.templates:
+                    counts['missing'] += 1
+                    continue
+                counts['existing' if template_id in self.uses_template[entry_id] else 'created'] += 1
+                self.uses_template[entry_id][template_id] = True
+                self.template_entries[template_id][entry_id] = True
+        return counts
+
+    # Traversal and queries
+    def get_linked_entries(self, entry_id):
+        with self._lock:
+            return self._entries(self.links_out.get(entry_id, {}))
+
+    def get_linked_frontier(self, entry_ids, fan_out=None):
+        with self._lock:
+            frontier = {}
+            for entry_id in entry_ids:
+                linked = sorted(self.links_out.get(entry_id, {}))
+                if linked:
+                    frontier[entry_id] = self._entries(linked[:fan_out] if fan_out is not None else linked)
+            return frontier
+
+    def get_tags_for_entry(self, entry_id):
+        with self._lock:
+            return [copy.deepcopy(self.tags[tag_id]) for tag_id in self.tagged.get(entry_id, {})]
+
+    def get_template_for_entry(self, entry_id):
+        with self._lock:
+            for template_id in self.uses_template.get(entry_id, {}):
+                return copy.deepcopy(self.templates[template_id])
+            return None
+
+    def search_entries(self, query, skip=0, limit=None):
+        with self._lock:
+            hits = self.search_index.search(query, skip=skip, limit=limit)
+            return [(self._entry(entry_id), score) for entry_id, score in hits]
+
+    def _tagged_ids(self, tag_name):
+        tag_id = self.tag_ids_by_name.get(tag_name)
+        return set(self.tag_entries.get(tag_id, {})) if tag_id else set()
+
+    def search_entries_combined(self, text=None, tag=None, linked_to=None, mode='and', skip=0, limit=None):
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"mode must be one of {', '.join(SEARCH_MODES)}")
+        with self._lock:
+            scores = {}
+            matches = []
+            if text:
+                hits = self.search_index.search(text)
+                scores = dict(hits)
+                matches.append(set(scores))
+            if tag:
+                matches.append(self._tagged_ids(tag))
+            if linked_to:
+                matches.append(set(self.links_out.get(linked_to, {})) | set(self.links_in.get(linked_to, {})))
+            if not matches:
+                return []
+            ids = set.intersection(*matches) if mode == 'and' else set.union(*matches)
+            ids = {entry_id for entry_id in ids if self._live(entry_id)}
+            ranked = sorted(ids, key=lambda entry_id: (-scores.get(entry_id, 0.0), entry_id))
+            end = None if limit is None else skip + limit
+            return [(self._entry(entry_id), scores.get(entry_id, 0.0)) for entry_id in ranked[skip:end]]
+
+    def filter_entries_by_tag(self, tag_name):
+        with self._lock:
+            return self._entries(sorted(self._tagged_ids(tag_name)))
+
+    # Tag analytics
+    def _ranked_tags(self, counts, limit):
+        rows = sorted(({'name': self.tags[tag_id]['name'], 'entries': count} for tag_id, count in counts.items()),
+                      key=lambda row: (-row['entries'], row['name']))
+        return rows[:limit] if limit is not None else rows
+
+    def get_tag_counts(self, capsule_id=None, limit=None):
+        with self._lock:
+            counts = self.capsule_tag_counts.get(capsule_id, {}) if capsule_id else self.tag_counts
+            return self._ranked_tags(counts, limit)
+
+    def get_tag_cooccurrence(self, tag_name, capsule_id=None, limit=None):
+        with self._lock:
+            tag_id = self.tag_ids_by_name.get(tag_name)
+            counts = defaultdict(int)
+            for entry_id in self.tag_entries.get(tag_id, {}):
+                owner = self.entry_capsule.get(entry_id)
+                if owner not in self.capsules or (capsule_id and owner != capsule_id):
+                    continue
+                for other_id in self.tagged[entry_id]:
+                    if other_id != tag_id:
+                        counts[other_id] += 1
+            return self._ranked_tags(counts, limit)
+
+    def get_entries_with_tags(self, tag_names, limit, capsule_id=None, after=None):
+        with self._lock:
+            tag_ids = [self.tag_ids_by_name.get(name) for name in tag_names]
+            if None in tag_ids:
+                return [], None
+            # Walk the least used tag's entries and probe the others
+            tag_ids.sort(key=lambda tag_id: len(self.tag_entries.get(tag_id, {})))
+            keys = sorted(
+                (self.entries[entry_id]['timestamp'], entry_id) for entry_id in self.tag_entries.get(tag_ids[0], {})
+                if all(tag_id in self.tagged[entry_id] for tag_id in tag_ids[1:])
+                and self.entry_capsule.get(entry_id) in self.capsules
+                and (not capsule_id or self.entry_capsule[entry_id] == capsule_id)
+            )
+            start = 0
+            if after:
+                after_ts, after_id = decode_cursor(after, 2)
+                start = bisect_left(keys, (after_ts, after_id + '\0'))
+            entries = self._entries(entry_id for _, entry_id in keys[start:start + limit])
+            more = start + limit < len(keys)
+        if not more or not entries:
+            return entries, None
+        return entries, encode_cursor(entries[-1]['timestamp'], entries[-1]['id'])
+
+    # Graph export
+    def iter_capsule_relations(self, capsule_id, rel_type):
+        with self._lock:
+            entry_ids = [entry_id for _, entry_id in self.has_entry.get(capsule_id, [])]
+            rows = []
+            for entry_id in entry_ids:
+                if rel_type == 'LINKS_TO':
+                    rows += [(entry_id, {'id': target}) for target in self.links_out.get(entry_id, {})
+                             if self.entry_capsule.get(target) == capsule_id]
+                elif rel_type == 'TAGGED_AS':
+                    rows += [(entry_id, {'id': self.tags[tag_id].get('id'), 'name': self.tags[tag_id]['name']})
+                             for tag_id in self.tagged.get(entry_id, {})]
+                elif rel_type == 'USES_TEMPLATE':
+                    rows += [(entry_id, {'id': template_id, 'name': self.templates[template_id]['name']})
+                             for template_id in self.uses_template.get(entry_id, {})]
+                elif rel_type == 'HAS_SNAPSHOT':
+                    rows += [(entry_id, {key: self.snapshots[sid].get(key) for key in ('id', 'created_at', 'seq')})
+                             for sid in self.has_snapshot.get(entry_id, {})]
+                else:
+                    raise KeyError(rel_type)
+        yield from rows
+
+    def get_capsule_degrees(self, capsule_id):
+        with self._lock:
+            return {
+                entry_id: len(self.links_out.get(entry_id, {})) + len(self.links_in.get(entry_id, {}))
+                + len(self.tagged.get(entry_id, {}))
+                for _, entry_id in self.has_entry.get(capsule_id, [])
+            }
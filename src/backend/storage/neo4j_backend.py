@@ -0,0 +1,1108 @@
+import json
+from datetime import datetime, UTC
+import schema
+from aggregation import field_stats
+from entry_storage import NATIVE_PREFIX, assemble_entry, field_index_name, merge_properties, native_fields, native_key
+from filters import CYPHER_OPERATORS
+from pagination import encode_cursor, decode_cursor
+from search import FULLTEXT_INDEX, SEARCH_MODES, index_properties, to_lucene
+from storage.base import GRAPH_RELATIONS, StorageBackend
+from validation import to_utc
+
+SEARCH_BACKFILL_BATCH_SIZE = 1000
+# Node projections for graph export: enough to label a node, never a payload.
+GRAPH_PROJECTIONS = {
+    'Entry': 'n {.id}',
+    'Tag': 'n {.id, .name}',
+    'Template': 'n {.id, .name}',
+    'Snapshot': 'n {.id, .created_at, .seq}',
+}
+# Counts a TAGGED_AS edge from `e` to `tag` unless it `existed`: on the tag (Tag.entries, over
+# live capsules) and on the capsule's TAG_COUNT edge to it. Leaves `e`, `tag` and `existed` in scope.
+COUNT_NEW_TAG = """
+WITH e, tag, existed
+OPTIONAL MATCH (c:Capsule)-[:HAS_ENTRY]->(e)
+FOREACH (_ IN CASE WHEN existed OR c IS NULL THEN [] ELSE [1] END |
+    SET tag.entries = coalesce(tag.entries, 0) + 1
+    MERGE (c)-[tc:TAG_COUNT]->(tag)
+    SET tc.entries = coalesce(tc.entries, 0) + 1)
+"""
+# Node properties that only exist to feed indexes and are not part of an entry's payload.
+INTERNAL_ENTRY_KEYS = ('search_text', 'search_fields', 'snapshot_seq', 'ts')
+
+# Read queries shared with AsyncNeo4jBackend (storage/async_backend.py), so both paths run the same Cypher.
+ALL_CAPSULES = "MATCH (c:Capsule) RETURN c  // full scan: lists every capsule"
+CAPSULE_BY_ID = "MATCH (c:Capsule {id: $capsule_id}) RETURN c"
+CAPSULE_ENTRIES = """
+MATCH (c:Capsule {id: $capsule_id})-[:HAS_ENTRY]->(e:Entry)
+RETURN e
+"""
+# `$fetch` is the page size plus one, so _entries_page can tell whether another page follows.
+ENTRIES_PAGE = """
+MATCH (c:Capsule {id: $capsule_id})-[:HAS_ENTRY]->(e:Entry)
+WHERE $after_ts IS NULL OR e.timestamp > $after_ts OR (e.timestamp = $after_ts AND e.id > $after_id)
+RETURN e
+ORDER BY e.timestamp, e.id
+LIMIT $fetch
+"""
+ENTRY_BY_ID = "MATCH (:Capsule)-[:HAS_ENTRY]->(e:Entry {id: $id}) RETURN e"
+LINKED_ENTRIES = """
+MATCH (e:Entry {id: $entry_id})-[:LINKS_TO]->(linked:Entry)
+WHERE (:Capsule)-[:HAS_ENTRY]->(linked)
+RETURN linked
+"""
+ENTRY_TAGS = """
+MATCH (e:Entry {id: $entry_id})-[:TAGGED_AS]->(tag:Tag)
+RETURN tag {.id, .name} AS tag
+"""
+ENTRY_TEMPLATE = """
+MATCH (e:Entry {id: $entry_id})-[:USES_TEMPLATE]->(tpl:Template)
+RETURN tpl
+"""
+
+
+def _entry(node):
+    entry = dict(node)
+    for key in INTERNAL_ENTRY_KEYS:
+        entry.pop(key, None)
+    return assemble_entry(entry)
+
+
+def _property(name):
+    """Backtick-quote a native field property name for use in Cypher."""
+    return '`' + native_key(name).replace('`', '``') + '`'
+
+
+def _page_params(capsule_id, limit, after):
+    """Parameters for ENTRIES_PAGE."""
+    after_ts, after_id = decode_cursor(after, 2) if after else (None, None)
+    return {'capsule_id': capsule_id, 'after_ts': after_ts, 'after_id': after_id, 'fetch': limit + 1}
+
+
+def _entries_page(entries, limit):
+    """Turn the rows of ENTRIES_PAGE into `(entries, next_cursor)`."""
+    if len(entries) <= limit:
+        return entries, None
+    entries = entries[:limit]
+    last = entries[-1]
+    return entries, encode_cursor(last["timestamp"], last["id"])
+
+
+def _capsule(node):
+    capsule = dict(node)
+    if 'fields' in capsule and isinstance(capsule['fields'], str):
+        try:
+            capsule['fields'] = json.loads(capsule['fields'])
+        except Exception:
+            capsule['fields'] = []
+    return capsule
+
+
+class Neo4jBackend(StorageBackend):
+    """Storage backend over a pooled Neo4j driver."""
+
+    name = 'neo4j'
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def session(self, **kwargs):
+        return self.pool.session(**kwargs)
+
+    def close(self):
+        self.pool.close()
+
+    def health(self):
+        return dict(self.pool.health(), backend=self.name)
+
+    def ensure_schema(self):
+        """Apply pending schema migrations (constraints, indexes, backfills; see schema.py)."""
+        schema.migrate(self)
+
+    def check_schema(self):
+        """Return schema problems (pending migrations, missing indexes) without changing anything."""
+        return schema.check(self)
+
+    def merge_duplicate_tags(self):
+        """Fold Tag nodes sharing a name into the one with the lowest id, moving their TAGGED_AS edges.
+
+        Returns the count removed.
+        """
+        with self.session() as session:
+            result = session.run(
+                """
+                MATCH (t:Tag)  // full scan: one-off migration
+                WITH t ORDER BY t.id
+                WITH t.name AS name, collect(t) AS tags WHERE size(tags) > 1
+                WITH head(tags) AS keep, tail(tags) AS duplicates
+                UNWIND duplicates AS duplicate
+                CALL {
+                    WITH keep, duplicate
+                    MATCH (n)-[r:TAGGED_AS]->(duplicate)
+                    MERGE (n)-[:TAGGED_AS]->(keep)
+                    DELETE r
+                }
+                DETACH DELETE duplicate
+                RETURN count(*) AS removed
+                """
+            )
+            return result.single()["removed"]
+
+    def merge_duplicate_templates(self):
+        """Fold Template nodes sharing a name into the one with the lowest id, moving their USES_TEMPLATE edges.
+
+        Returns the count removed.
+        """
+        with self.session() as session:
+            result = session.run(
+                """
+                MATCH (tpl:Template)  // full scan: one-off migration
+                WITH tpl ORDER BY tpl.id
+                WITH tpl.name AS name, collect(tpl) AS templates WHERE size(templates) > 1
+                WITH head(templates) AS keep, tail(templates) AS duplicates
+                UNWIND duplicates AS duplicate
+                CALL {
+                    WITH keep, duplicate
+                    MATCH (n)-[r:USES_TEMPLATE]->(duplicate)
+                    MERGE (n)-[:USES_TEMPLATE]->(keep)
+                    DELETE r
+                }
+                DETACH DELETE duplicate
+                RETURN count(*) AS removed
+                """
+            )
+            return result.single()["removed"]
+
+    def recount_tags(self):
+        """Rebuild the per-tag entry counters (Tag.entries, TAG_COUNT edges) from the TAGGED_AS edges."""
+        with self.session() as session:
+            session.run("MATCH ()-[tc:TAG_COUNT]->() DELETE tc").consume()
+            session.run("MATCH (tag:Tag) SET tag.entries = 0  // full scan: rebuild").consume()
+            session.run(
+                """
+                MATCH (c:Capsule)-[:HAS_ENTRY]->(:Entry)-[:TAGGED_AS]->(tag:Tag)  // full scan: rebuild
+                WITH c, tag, count(*) AS entries
+                MERGE (c)-[tc:TAG_COUNT]->(tag)
+                SET tc.entries = entries
+                WITH tag, sum(entries) AS total
+                SET tag.entries = total
+                """
+            ).consume()
+
+    def ensure_field_indexes(self, fields):
+        """Create a range index for each declared field stored as a native property."""
+        with self.session() as session:
+            for name in native_fields(fields):
+                session.run(
+                    f"CREATE INDEX {field_index_name(name)} IF NOT EXISTS FOR (e:Entry) ON (e.{_property(name)})"
+                ).consume()
+
+    def backfill_search_index(self, batch_size=SEARCH_BACKFILL_BATCH_SIZE):
+        """Populate `search_text`/`search_fields` on entries created before the full-text index. Returns the count.
+
+        One keyset walk over the entry id index: each batch resumes after the
+        last id seen instead of rescanning the entries already filled in.
+        """
+        updated = 0
+        after = ''
+        with self.session() as session:
+            while True:
+                result = session.run(
+                    """
+                    MATCH (e:Entry) WHERE e.id > $after
+                    WITH e ORDER BY e.id LIMIT $batch_size
+                    RETURN e.id AS id, e.search_text IS NULL AS missing,
+                           CASE WHEN e.search_text IS NULL THEN e.properties END AS properties
+                    """,
+                    after=after, batch_size=batch_size
+                )
+                records = list(result)
+                if not records:
+                    return updated
+                after = records[-1]["id"]
+                rows = [dict(id=record["id"], **index_properties(record["properties"]))
+                        for record in records if record["missing"]]
+                if rows:
+                    session.run(
+                        """
+                        UNWIND $rows AS row
+                        MATCH (e:Entry {id: row.id})
+                        SET e.search_text = row.search_text, e.search_fields = row.search_fields
+                        """,
+                        rows=rows
+                    ).consume()
+                    updated += len(rows)
+
+    # Capsule CRUD (Graph)
+    def create_capsule(self, name, description, created_at, fields=None, storage_mode='json', capsule_id=None,
+                       import_id=None):
+        with self.session() as session:
+            result = session.run(
+                """
+                CREATE (c:Capsule {id: coalesce($capsule_id, randomUUID()), name: $name, description: $description, created_at: $created_at,
+                                   fields: $fields, storage_mode: $storage_mode, import_id: $import_id})
+                RETURN c.id AS id
+                """,
+                name=name, description=description, created_at=created_at.isoformat(), fields=json.dumps(fields or []),
+                storage_mode=storage_mode, capsule_id=capsule_id, import_id=import_id
+            )
+            return result.single()["id"]
+
+    def get_all_capsules(self):
+        with self.session() as session:
+            result = session.run(ALL_CAPSULES)
+            return [dict(record["c"]) for record in result]
+
+    def get_capsule(self, capsule_id):
+        with self.session() as session:
+            result = session.run(CAPSULE_BY_ID, capsule_id=capsule_id)
+            record = result.single()
+            return _capsule(record["c"]) if record else None
+
+    def mark_capsule_deleted(self, capsule_id):
+        # Relabelling takes the capsule out of every (:Capsule) match at once,
+        # and entry reads are anchored on (:Capsule)-[:HAS_ENTRY]->(e), so its
+        # entries vanish with it; the HAS_ENTRY edges stay so the purge can
+        # find them. Its entries stop counting towards tag totals right away.
+        with self.session() as session:
+            record = session.run(
+                """
+                MATCH (c:Capsule {id: $id})
+                OPTIONAL MATCH (c)-[tc:TAG_COUNT]->(tag:Tag)
+                SET tag.entries = tag.entries - tc.entries
+                DELETE tc
+                WITH DISTINCT c
+                REMOVE c:Capsule SET c:DeletedCapsule, c.deleted_at = $deleted_at
+                RETURN count(c) AS count
+                """,
+                id=capsule_id, deleted_at=datetime.now(UTC).isoformat()
+            ).single()
+            return record["count"] > 0
+
+    def purge_capsule_batch(self, capsule_id, batch_size):
+        def write(tx):
+            record = tx.run(
+                """
+                MATCH (c:DeletedCapsule {id: $id})-[:HAS_ENTRY]->(e:Entry)
+                WITH e LIMIT $batch_size
+                OPTIONAL MATCH (e)-[:HAS_SNAPSHOT]->(s:Snapshot)
+                WITH e, collect(s) AS snapshots
+                FOREACH (s IN snapshots | DETACH DELETE s)
+                WITH e, size(snapshots) AS snapshot_count
+                DETACH DELETE e
+                RETURN count(*) AS entries, coalesce(sum(snapshot_count), 0) AS snapshots
+                """,
+                id=capsule_id, batch_size=batch_size
+            ).single()
+            if record["entries"] == 0:
+                tx.run("MATCH (c:DeletedCapsule {id: $id}) DETACH DELETE c", id=capsule_id).consume()
+            return record["entries"], record["snapshots"]
+        with self.session() as session:
+            return session.execute_write(write)
+
+    def get_deleted_capsule_ids(self):
+        with self.session() as session:
+            result = session.run("MATCH (c:DeletedCapsule) RETURN c.id AS id ORDER BY c.deleted_at  // full scan: the purge queue")
+            return [record["id"] for record in result]
+
+    def set_capsule_storage_mode(self, capsule_id, storage_mode):
+        with self.session() as session:
+            session.run(
+                "MATCH (c:Capsule {id: $id}) SET c.storage_mode = $storage_mode",
+                id=capsule_id, storage_mode=storage_mode
+            ).consume()
+
+    # Entry CRUD (Graph)
+    def create_entry(self, capsule_id, timestamp, properties, native=None):
+        native = native or {}
+        with self.session() as session:
+            result = session.run(
+                """
+                MATCH (c:Capsule {id: $capsule_id})
+                CREATE (e:Entry {id: randomUUID(), timestamp: $timestamp, ts: $ts, properties: $properties,
+                                 search_text: $search_text, search_fields: $search_fields})
+                SET e += $native
+                CREATE (c)-[:HAS_ENTRY]->(e)
+                RETURN e.id AS id
+                """,
+                capsule_id=capsule_id, timestamp=timestamp.isoformat(), ts=to_utc(timestamp), properties=properties,
+                native=native,
+                **index_properties(merge_properties(properties, native))
+            )
+            return result.single()["id"]
+
+    def create_entries_batch(self, capsule_id, rows):
+        params = [
+            dict(timestamp=timestamp.isoformat(), ts=to_utc(timestamp), properties=properties, native=native or {},
+                 **index_properties(merge_properties(properties, native)))
+            for timestamp, properties, native in rows
+        ]
+
+        def write(tx):
+            result = tx.run(
+                """
+                MATCH (c:Capsule {id: $capsule_id})
+                UNWIND $rows AS row
+                CREATE (e:Entry {id: randomUUID(), timestamp: row.timestamp, ts: row.ts, properties: row.properties,
+                                 search_text: row.search_text, search_fields: row.search_fields})
+                SET e += row.native
+                CREATE (c)-[:HAS_ENTRY]->(e)
+                RETURN e.id AS id
+                """,
+                capsule_id=capsule_id, rows=params
+            )
+            return [record["id"] for record in result]
+
+        with self.session() as session:
+            return session.execute_write(write)
+
+    def import_entries_batch(self, capsule_id, rows):
+        params = [
+            dict(id=entry_id, timestamp=timestamp.isoformat(), ts=to_utc(timestamp), properties=properties,
+                 native=native or {}, **index_properties(merge_properties(properties, native)))
+            for entry_id, timestamp, properties, native in rows
+        ]
+
+        def write(tx):
+            # Ids already in the graph are skipped, so a replayed batch creates nothing twice
+            record = tx.run(
+                """
+                MATCH (c:Capsule {id: $capsule_id})
+                UNWIND $rows AS row
+                OPTIONAL MATCH (existing:Entry {id: row.id})
+                WITH c, row WHERE existing IS NULL
+                CREATE (e:Entry {id: row.id, timestamp: row.timestamp, ts: row.ts, properties: row.properties,
+                                 search_text: row.search_text, search_fields: row.search_fields})
+                SET e += row.native
+                CREATE (c)-[:HAS_ENTRY]->(e)
+                RETURN count(e) AS created
+                """,
+                capsule_id=capsule_id, rows=params
+            ).single()
+            return record["created"]
+
+        with self.session() as session:
+            return session.execute_write(write)
+
+    def create_entries_from_template(self, capsule_id, template_id, rows):
+        params = [
+            dict(timestamp=timestamp.isoformat(), ts=to_utc(timestamp), properties=properties, native=native or {},
+                 tags=list(tags),
+                 **index_properties(merge_properties(properties, native)))
+            for timestamp, properties, native, tags in rows
+        ]
+
+        def write(tx):
+            result = tx.run(
+                """
+                MATCH (c:Capsule {id: $capsule_id})
+                OPTIONAL MATCH (tpl:Template {id: $template_id})
+                UNWIND $rows AS row
+                CREATE (e:Entry {id: randomUUID(), timestamp: row.timestamp, ts: row.ts, properties: row.properties,
+                                 search_text: row.search_text, search_fields: row.search_fields})
+                SET e += row.native
+                CREATE (c)-[:HAS_ENTRY]->(e)
+                FOREACH (_ IN CASE WHEN tpl IS NULL THEN [] ELSE [1] END | CREATE (e)-[:USES_TEMPLATE]->(tpl))
+                FOREACH (name IN row.tags |
+                    MERGE (tag:Tag {name: name}) ON CREATE SET tag.id = randomUUID()
+                    CREATE (e)-[:TAGGED_AS]->(tag)
+                    SET tag.entries = coalesce(tag.entries, 0) + 1
+                    MERGE (c)-[tc:TAG_COUNT]->(tag)
+                    SET tc.entries = coalesce(tc.entries, 0) + 1)
+                RETURN e.id AS id
+                """,
+                capsule_id=capsule_id, template_id=template_id, rows=params
+            )
+            return [record["id"] for record in result]
+
+        with self.session() as session:
+            return session.execute_write(write)
+
+    def get_entries_by_capsule(self, capsule_id):
+        with self.session() as session:
+            result = session.run(CAPSULE_ENTRIES, capsule_id=capsule_id)
+            return [_entry(record["e"]) for record in result]
+
+    def get_entries_page(self, capsule_id, limit, after=None):
+        with self.session() as session:
+            result = session.run(ENTRIES_PAGE, _page_params(capsule_id, limit, after))
+            entries = [_entry(record["e"]) for record in result]
+        return _entries_page(entries, limit)
+
+    def iter_entries_by_capsule(self, capsule_id, after=None):
+        after_ts, after_id = decode_cursor(after, 2) if after else (None, None)
+        with self.session() as session:
+            result = session.run(
+                """
+                MATCH (c:Capsule {id: $capsule_id})-[:HAS_ENTRY]->(e:Entry)
+                WHERE $after_ts IS NULL OR e.timestamp > $after_ts OR (e.timestamp = $after_ts AND e.id > $after_id)
+                RETURN e
+                ORDER BY e.timestamp, e.id
+                """,
+                capsule_id=capsule_id, after_ts=after_ts, after_id=after_id
+            )
+            for record in result:
+                yield _entry(record["e"])
+
+    def get_entry_by_id(self, entry_id):
+        with self.session() as session:
+            result = session.run(ENTRY_BY_ID, id=entry_id)
+            record = result.single()
+            return _entry(record["e"]) if record else None
+
+    def delete_entry(self, entry_id):
+        def write(tx):
+            tx.run(
+                """
+                MATCH (c:Capsule)-[:HAS_ENTRY]->(e:Entry {id: $id})-[:TAGGED_AS]->(tag:Tag)
+                MATCH (c)-[tc:TAG_COUNT]->(tag)
+                SET tag.entries = tag.entries - 1, tc.entries = tc.entries - 1
+                WITH tc WHERE tc.entries <= 0
+                DELETE tc
+                """,
+                id=entry_id
+            ).consume()
+            tx.run("MATCH (e:Entry {id: $id}) DETACH DELETE e", id=entry_id).consume()
+
+        with self.session() as session:
+            session.execute_write(write)
+
+    def update_entry_storage(self, rows):
+        def write(tx):
+            # Native keys the new layout no longer writes are set to null, which
+            # removes them in the same SET as the rewrite.
+            result = tx.run(
+                f"""
+                MATCH (e:Entry) WHERE e.id IN $ids
+                RETURN e.id AS id, [key IN keys(e) WHERE key STARTS WITH '{NATIVE_PREFIX}'] AS native_keys
+                """,
+                ids=[row['id'] for row in rows]
+            )
+            stale = {record['id']: record['native_keys'] for record in result}
+            rows_with_removals = [
+                {**row, 'native': {**{key: None for key in stale.get(row['id'], [])}, **row['native']}}
+                for row in rows
+            ]
+            tx.run(
+                """
+                UNWIND $rows AS row
+                MATCH (e:Entry {id: row.id})
+                SET e.properties = row.properties, e += row.native
+                """,
+                rows=rows_with_removals
+            ).consume()
+
+        with self.session() as session:
+            session.execute_write(write)
+
+    def get_entries_filtered(self, capsule_id, filters, limit, after=None, start=None, end=None):
+        after_ts, after_id = decode_cursor(after, 2) if after else (None, None)
+        params = {}
+        conditions = []
+        for i, (name, op, value) in enumerate(filters):
+            params[f'f{i}'] = value
+            conditions.append(f"e.{_property(name)} {CYPHER_OPERATORS[op]} $f{i}")
+        if start is not None:
+            params['start'] = start
+            conditions.append("e.ts >= $start")
+        if end is not None:
+            params['end'] = end
+            conditions.append("e.ts < $end")
+        where = ''.join(f" AND {condition}" for condition in conditions)
+        with self.session() as session:
+            result = session.run(
+                f"""
+                MATCH (c:Capsule {{id: $capsule_id}})-[:HAS_ENTRY]->(e:Entry)
+                WHERE ($after_ts IS NULL OR e.timestamp > $after_ts OR (e.timestamp = $after_ts AND e.id > $after_id)){where}
+                RETURN e
+                ORDER BY e.timestamp, e.id
+                LIMIT $fetch
+                """,
+                capsule_id=capsule_id, after_ts=after_ts, after_id=after_id, fetch=limit + 1, **params
+            )
+            entries = [_entry(record["e"]) for record in result]
+        if len(entries) <= limit:
+            return entries, None
+        entries = entries[:limit]
+        last = entries[-1]
+        return entries, encode_cursor(last["timestamp"], last["id"])
+
+    def count_entries_by_bucket(self, capsule_id, bucket, start=None, end=None):
+        with self.session() as session:
+            result = session.run(
+                """
+                MATCH (c:Capsule {id: $capsule_id})-[:HAS_ENTRY]->(e:Entry)
+                WHERE e.ts IS NOT NULL AND ($start IS NULL OR e.ts >= $start) AND ($end IS NULL OR e.ts < $end)
+                RETURN datetime.truncate($bucket, e.ts) AS bucket, count(*) AS count
+                ORDER BY bucket
+                """,
+                capsule_id=capsule_id, bucket=bucket, start=start, end=end
+            )
+            return [{'start': record["bucket"].to_native().isoformat(), 'count': record["count"]} for record in result]
+
+    def aggregate_entries(self, capsule_id, columns, group_by=None, start=None, end=None):
+        kind, key = group_by or (None, None)
+        tagged = ""
+        if kind == 'tag':
+            tagged = "OPTIONAL MATCH (e)-[:TAGGED_AS]->(t:Tag)"
+            group = "t.name"
+        elif kind == 'bucket':
+            group = "datetime.truncate($bucket, e.ts)"
+        elif kind == 'field':
+            group = f"e.{_property(key[0])}"
+        else:
+            group = "null"
+        values = ", ".join(
+            (f"CASE e.{_property(name)} WHEN true THEN 1 WHEN false THEN 0 END" if field_type == 'boolean'
+             else f"e.{_property(name)}") + f" AS v{i}"
+            for i, (name, field_type) in enumerate(columns)
+        )
+        stats = ", ".join(
+            f"count(v{i}) AS n{i}, sum(v{i}) AS s{i}, min(v{i}) AS lo{i}, max(v{i}) AS hi{i}"
+            for i in range(len(columns))
+        )
+        with self.session() as session:
+            result = session.run(
+                f"""
+                MATCH (c:Capsule {{id: $capsule_id}})-[:HAS_ENTRY]->(e:Entry)
+                WHERE ($start IS NULL OR e.ts >= $start) AND ($end IS NULL OR e.ts < $end)
+                {tagged}
+                WITH {group} AS key, {values}
+                RETURN key, count(*) AS count, {stats}
+                ORDER BY key
+                """,
+                capsule_id=capsule_id, bucket=key if kind == 'bucket' else None, start=start, end=end
+            )
+            rows = []
+            for record in result:
+                group_key = record["key"]
+                rows.append({
+                    'key': group_key.to_native().isoformat() if kind == 'bucket' and group_key is not None else group_key,
+                    'count': record["count"],
+                    'fields': {
+                        name: field_stats(record[f"n{i}"], record[f"s{i}"], record[f"lo{i}"], record[f"hi{i}"])
+                        for i, (name, _) in enumerate(columns)
+                    },
+                })
+            return rows
+
+    # Snapshot CRUD (Graph)
+    def append_snapshot(self, entry_id, created_at, build):
+        def write(tx):
+            # Bumping the entry's counter locks it, so concurrent appends serialize
+            record = tx.run(
+                """
+                MATCH (e:Entry {id: $entry_id})
+                SET e.snapshot_seq = coalesce(e.snapshot_seq, 0) + 1
+                WITH e
+                OPTIONAL MATCH (e)-[:HAS_SNAPSHOT]->(head:Snapshot {seq: e.snapshot_seq - 1})
+                OPTIONAL MATCH (e)-[:HAS_SNAPSHOT]->(s:Snapshot {base: head.base}) WHERE s.seq <= head.seq
+                WITH e, s ORDER BY s.seq
+                RETURN e.snapshot_seq AS seq, collect(s) AS segment
+                """,
+                entry_id=entry_id
+            ).single()
+            if record is None:
+                return None
+            segment = [dict(node) for node in record["segment"]]
+            kind, payload = build(segment)
+            seq = record["seq"]
+            result = tx.run(
+                """
+                MATCH (e:Entry {id: $entry_id})
+                CREATE (s:Snapshot {id: randomUUID(), created_at: $created_at, payload: $payload,
+                                    kind: $kind, seq: $seq, base: $base})
+                CREATE (e)-[:HAS_SNAPSHOT]->(s)
+                RETURN s.id AS id
+                """,
+                entry_id=entry_id, created_at=created_at.isoformat(), payload=payload, kind=kind, seq=seq,
+                base=seq if kind == 'keyframe' else segment[-1]["base"]
+            )
+            return result.single()["id"]
+
+        with self.session() as session:
+            return session.execute_write(write)
+
+    def get_snapshots_by_entry(self, entry_id):
+        with self.session() as session:
+            result = session.run(
+                """
+                MATCH (e:Entry {id: $entry_id})-[:HAS_SNAPSHOT]->(s:Snapshot)
+                RETURN s
+                """,
+                entry_id=entry_id
+            )
+            return [dict(record["s"]) for record in result]
+
+    def get_snapshot_segment(self, snapshot_id):
+        with self.session() as session:
+            result = session.run(
+                """
+                MATCH (t:Snapshot {id: $id})
+                OPTIONAL MATCH (e:Entry)-[:HAS_SNAPSHOT]->(t)
+                OPTIONAL MATCH (e)-[:HAS_SNAPSHOT]->(s:Snapshot {base: t.base}) WHERE s.seq <= t.seq
+                WITH t, s ORDER BY s.seq
+                RETURN t, collect(s) AS segment
+                """,
+                id=snapshot_id
+            )
+            record = result.single()
+        if record is None:
+            return []
+        target = dict(record["t"])
+        if target.get("base") is None:
+            return [target]
+        return [dict(node) for node in record["segment"]]
+
+    def get_snapshot_segments(self, entry_id, bases):
+        with self.session() as session:
+            result = session.run(
+                """
+                MATCH (e:Entry {id: $entry_id})-[:HAS_SNAPSHOT]->(s:Snapshot)
+                WHERE s.base IN $bases
+                RETURN s
+                ORDER BY s.base, s.seq
+                """,
+                entry_id=entry_id, bases=list(bases)
+            )
+            return [dict(record["s"]) for record in result]
+
+    def get_snapshot_page(self, entry_id, limit, after=None):
+        after_ts, after_id = decode_cursor(after, 2) if after else (None, None)
+        with self.session() as session:
+            result = session.run(
+                """
+                MATCH (e:Entry {id: $entry_id})-[:HAS_SNAPSHOT]->(s:Snapshot)
+                WHERE $after_ts IS NULL OR s.created_at > $after_ts OR (s.created_at = $after_ts AND s.id > $after_id)
+                RETURN s
+                ORDER BY s.created_at, s.id
+                LIMIT $fetch
+                """,
+                entry_id=entry_id, after_ts=after_ts, after_id=after_id, fetch=limit + 1
+            )
+            snapshots = [dict(record["s"]) for record in result]
+        if len(snapshots) <= limit:
+            return snapshots, None
+        snapshots = snapshots[:limit]
+        last = snapshots[-1]
+        return snapshots, encode_cursor(last["created_at"], last["id"])
+
+    def compact_snapshots(self, entry_id, keyframe_id, payload):
+        def write(tx):
+            result = tx.run(
+                """
+                MATCH (e:Entry {id: $entry_id})-[:HAS_SNAPSHOT]->(k:Snapshot {id: $keyframe_id})
+                OPTIONAL MATCH (e)-[:HAS_SNAPSHOT]->(later:Snapshot {base: k.base}) WHERE later.seq > k.seq
+                SET later.base = k.seq
+                WITH DISTINCT e, k
+                SET k.kind = 'keyframe', k.payload = $payload, k.base = k.seq
+                WITH e, k
+                OPTIONAL MATCH (e)-[:HAS_SNAPSHOT]->(old:Snapshot) WHERE old.seq < k.seq
+                DETACH DELETE old
+                RETURN count(old) AS removed
+                """,
+                entry_id=entry_id, keyframe_id=keyframe_id, payload=payload
+            )
+            record = result.single()
+            return record["removed"] if record else 0
+
+        with self.session() as session:
+            return session.execute_write(write)
+
+    def get_entries_with_snapshot_history(self, min_versions):
+        with self.session() as session:
+            result = session.run(
+                """
+                MATCH (e:Entry)-[:HAS_SNAPSHOT]->(s:Snapshot) WHERE s.seq IS NOT NULL
+                WITH e, count(s) AS versions WHERE versions > $min_versions
+                RETURN e.id AS id
+                """,
+                min_versions=min_versions
+            )
+            return [record["id"] for record in result]
+
+    def import_snapshots_batch(self, rows):
+        params = [{key: row.get(key) for key in ('id', 'entry_id', 'created_at', 'payload', 'kind', 'seq', 'base')}
+                  for row in rows]
+        seqs = {}
+        for row in params:
+            if row['seq'] is not None:
+                seqs[row['entry_id']] = max(seqs.get(row['entry_id'], 0), row['seq'])
+
+        def write(tx):
+            record = tx.run(
+                """
+                UNWIND $rows AS row
+                MATCH (e:Entry {id: row.entry_id})
+                OPTIONAL MATCH (existing:Snapshot {id: row.id})
+                WITH e, row WHERE existing IS NULL
+                CREATE (s:Snapshot {id: row.id, created_at: row.created_at, payload: row.payload,
+                                    kind: row.kind, seq: row.seq, base: row.base})
+                CREATE (e)-[:HAS_SNAPSHOT]->(s)
+                RETURN count(s) AS created
+                """,
+                rows=params
+            ).single()
+            # Later appends continue after the highest imported version
+            tx.run(
+                """
+                UNWIND $seqs AS row
+                MATCH (e:Entry {id: row.entry_id})
+                SET e.snapshot_seq = CASE WHEN coalesce(e.snapshot_seq, 0) < row.seq THEN row.seq
+                                          ELSE e.snapshot_seq END
+                """,
+                seqs=[{'entry_id': entry_id, 'seq': seq} for entry_id, seq in seqs.items()]
+            )
+            return record["created"]
+
+        with self.session() as session:
+            return session.execute_write(write)
+
+    def iter_capsule_snapshots(self, capsule_id):
+        with self.session() as session:
+            result = session.run(
+                """
+                MATCH (c:Capsule {id: $capsule_id})-[:HAS_ENTRY]->(e:Entry)-[:HAS_SNAPSHOT]->(s:Snapshot)
+                RETURN e.id AS entry_id, s
+                """,
+                capsule_id=capsule_id
+            )
+            for record in result:
+                yield dict(record["s"], entry_id=record["entry_id"])
+
+    # Tag CRUD (Graph)
+    def create_tag(self, name):
+        with self.session() as session:
+            result = session.run(
+                """
+                MERGE (tag:Tag {name: $name})
+                SET tag.id = coalesce(tag.id, randomUUID())
+                RETURN tag.id AS id
+                """,
+                name=name
+            )
+            return result.single()["id"]
+
+    def get_tag_by_name(self, name):
+        with self.session() as session:
+            result = session.run(
+                "MATCH (tag:Tag {name: $name}) RETURN tag {.id, .name} AS tag",
+                name=name
+            )
+            record = result.single()
+            return dict(record["tag"]) if record else None
+
+    # Template CRUD (Graph)
+    def create_template(self, name, structure):
+        with self.session() as session:
+            result = session.run(
+                """
+                MERGE (tpl:Template {name: $name})
+                ON CREATE SET tpl.id = randomUUID(), tpl.structure = $structure
+                RETURN tpl.id AS id, tpl.structure = $structure AS same
+                """,
+                name=name, structure=structure
+            )
+            record = result.single()
+            if not record["same"]:
+                raise ValueError(f'template {name!r} already exists with a different structure')
+            return record["id"]
+
+    def get_template_by_name(self, name):
+        with self.session() as session:
+            result = session.run(
+                "MATCH (tpl:Template {name: $name}) RETURN tpl",
+                name=name
+            )
+            record = result.single()
+            return dict(record["tpl"]) if record else None
+
+    def get_template(self, template_id):
+        with self.session() as session:
+            result = session.run(
+                "MATCH (tpl:Template {id: $template_id}) RETURN tpl",
+                template_id=template_id
+            )
+            record = result.single()
+            return dict(record["tpl"]) if record else None
+
+    # --- Relationship/Edge Creation Functions ---
+
+    def link_entry_to_entry(self, source_entry_id, target_entry_id):
+        with self.session() as session:
+            session.run(
+                """
+                MATCH (src:Entry {id: $source_entry_id}), (tgt:Entry {id: $target_entry_id})
+                MERGE (src)-[:LINKS_TO]->(tgt)
+                """,
+                source_entry_id=source_entry_id, target_entry_id=target_entry_id
+            )
+
+    def tag_entry(self, entry_id, tag_name):
+        with self.session() as session:
+            session.run(
+                """
+                MATCH (e:Entry {id: $entry_id})
+                MERGE (tag:Tag {name: $tag_name})
+                ON CREATE SET tag.id = randomUUID()
+                WITH e, tag, size([(e)-[:TAGGED_AS]->(tag) | 1]) > 0 AS existed
+                MERGE (e)-[:TAGGED_AS]->(tag)
+                """ + COUNT_NEW_TAG,
+                entry_id=entry_id, tag_name=tag_name
+            ).consume()
+
+    def tag_entries_batch(self, pairs):
+        def write(tx):
+            record = tx.run(
+                """
+                UNWIND $rows AS row
+                MATCH (e:Entry {id: row.entry_id})
+                MERGE (tag:Tag {name: row.tag})
+                ON CREATE SET tag.id = randomUUID()
+                WITH e, tag, size([(e)-[:TAGGED_AS]->(tag) | 1]) > 0 AS existed
+                MERGE (e)-[:TAGGED_AS]->(tag)
+                """ + COUNT_NEW_TAG + """
+                RETURN count(*) AS matched, sum(CASE WHEN existed THEN 1 ELSE 0 END) AS existing
+                """,
+                rows=[{'entry_id': entry_id, 'tag': tag} for entry_id, tag in pairs]
+            ).single()
+            return {'created': record["matched"] - record["existing"], 'existing': record["existing"],
+                    'missing': len(pairs) - record["matched"]}
+
+        with self.session() as session:
+            return session.execute_write(write)
+
+    def link_entries_batch(self, pairs):
+        def write(tx):
+            record = tx.run(
+                """
+                UNWIND $rows AS row
+                MATCH (src:Entry {id: row.source}), (tgt:Entry {id: row.target})
+                WITH src, tgt, size([(src)-[:LINKS_TO]->(tgt) | 1]) > 0 AS existed
+                MERGE (src)-[:LINKS_TO]->(tgt)
+                RETURN count(*) AS matched, sum(CASE WHEN existed THEN 1 ELSE 0 END) AS existing
+                """,
+                rows=[{'source': source, 'target': target} for source, target in pairs]
+            ).single()
+            return {'created': record["matched"] - record["existing"], 'existing': record["existing"],
+                    'missing': len(pairs) - record["matched"]}
+
+        with self.session() as session:
+            return session.execute_write(write)
+
+    def assign_template_to_entry(self, entry_id, template_id):
+        with self.session() as session:
+            session.run(
+                """
+                MATCH (e:Entry {id: $entry_id}), (tpl:Template {id: $template_id})
+                MERGE (e)-[:USES_TEMPLATE]->(tpl)
+                """,
+                entry_id=entry_id, template_id=template_id
+            )
+
+    def assign_templates_batch(self, pairs):
+        def write(tx):
+            record = tx.run(
+                """
+                UNWIND $rows AS row
+                MATCH (e:Entry {id: row.entry_id}), (tpl:Template {id: row.template_id})
+                WITH e, tpl, size([(e)-[:USES_TEMPLATE]->(tpl) | 1]) > 0 AS existed
+                MERGE (e)-[:USES_TEMPLATE]->(tpl)
+                RETURN count(*) AS matched, sum(CASE WHEN existed THEN 1 ELSE 0 END) AS existing
+                """,
+                rows=[{'entry_id': entry_id, 'template_id': template_id} for entry_id, template_id in pairs]
+            ).single()
+            return {'created': record["matched"] - record["existing"], 'existing': record["existing"],
+                    'missing': len(pairs) - record["matched"]}
+
+        with self.session() as session:
+            return session.execute_write(write)
+
+    # --- Traversal/Query Functions ---
+
+    def get_linked_entries(self, entry_id):
+        with self.session() as session:
+            result = session.run(LINKED_ENTRIES, entry_id=entry_id)
+            return [_entry(record["linked"]) for record in result]
+
+    def get_linked_frontier(self, entry_ids, fan_out=None):
+        with self.session() as session:
+            result = session.run(
+                """
+                UNWIND $ids AS src_id
+                MATCH (src:Entry {id: src_id})-[:LINKS_TO]->(linked:Entry)
+                WHERE (:Capsule)-[:HAS_ENTRY]->(linked)
+                WITH src_id, linked ORDER BY linked.id
+                WITH src_id, collect(linked) AS linked
+                RETURN src_id, CASE WHEN $fan_out IS NULL THEN linked ELSE linked[..$fan_out] END AS linked
+                """,
+                ids=entry_ids, fan_out=fan_out
+            )
+            return {record["src_id"]: [_entry(node) for node in record["linked"]] for record in result}
+
+    def get_tags_for_entry(self, entry_id):
+        with self.session() as session:
+            result = session.run(ENTRY_TAGS, entry_id=entry_id)
+            return [dict(record["tag"]) for record in result]
+
+    def get_template_for_entry(self, entry_id):
+        with self.session() as session:
+            result = session.run(ENTRY_TEMPLATE, entry_id=entry_id)
+            record = result.single()
+            return dict(record["tpl"]) if record else None
+
+    def search_entries(self, query, skip=0, limit=None):
+        lucene = to_lucene(query)
+        if lucene is None:
+            return []
+        with self.session() as session:
+            result = session.run(
+                f"""
+                CALL db.index.fulltext.queryNodes('{FULLTEXT_INDEX}', $lucene) YIELD node, score
+                WHERE (:Capsule)-[:HAS_ENTRY]->(node)
+                RETURN node AS e, score
+                ORDER BY score DESC, e.id
+                SKIP $skip
+                {'LIMIT $limit' if limit is not None else ''}
+                """,
+                lucene=lucene, skip=skip, limit=limit
+            )
+            return [(_entry(record["e"]), record["score"]) for record in result]
+
+    def search_entries_combined(self, text=None, tag=None, linked_to=None, mode='and', skip=0, limit=None):
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"mode must be one of {', '.join(SEARCH_MODES)}")
+        lucene = to_lucene(text) if text else None
+        if text and lucene is None and mode == 'and':
+            return []
+        sources = []
+        if lucene:
+            sources.append(f"CALL db.index.fulltext.queryNodes('{FULLTEXT_INDEX}', $lucene) YIELD node AS e, score")
+        if tag:
+            sources.append("MATCH (:Tag {name: $tag})<-[:TAGGED_AS]-(e:Entry) WITH e, 0.0 AS score")
+        if linked_to:
+            sources.append("MATCH (:Entry {id: $linked_to})-[:LINKS_TO]-(e:Entry) WITH DISTINCT e, 0.0 AS score")
+        if not sources:
+            return []
+        if mode == 'and':
+            filters = []
+            if tag and lucene:
+                filters.append("(e)-[:TAGGED_AS]->(:Tag {name: $tag})")
+            if linked_to and (lucene or tag):
+                filters.append("(e)-[:LINKS_TO]-(:Entry {id: $linked_to})")
+            match = sources[0]
+            if filters:
+                match += "\nWITH e, score WHERE " + " AND ".join(filters)
+        else:
+            branches = [f"{source}\nRETURN e, score" for source in sources]
+            match = "CALL {\n" + "\nUNION ALL\n".join(branches) + "\n}\nWITH e, max(score) AS score"
+        query = f"""
+            {match}
+            WITH e, score WHERE (:Capsule)-[:HAS_ENTRY]->(e)
+            RETURN e, score
+            ORDER BY score DESC, e.id
+            SKIP $skip
+            {'LIMIT $limit' if limit is not None else ''}
+        """
+        with self.session() as session:
+            result = session.run(query, lucene=lucene, tag=tag, linked_to=linked_to, skip=skip, limit=limit)
+            return [(_entry(record["e"]), record["score"]) for record in result]
+
+    def filter_entries_by_tag(self, tag_name):
+        with self.session() as session:
+            result = session.run(
+                """
+                MATCH (:Capsule)-[:HAS_ENTRY]->(e:Entry)-[:TAGGED_AS]->(tag:Tag {name: $tag_name})
+                RETURN e
+                """,
+                tag_name=tag_name
+            )
+            return [_entry(record["e"]) for record in result]
+
+    # --- Tag analytics ---
+
+    def get_tag_counts(self, capsule_id=None, limit=None):
+        if capsule_id is None:
+            match = "MATCH (tag:Tag) WHERE tag.entries > 0 WITH tag, tag.entries AS entries"
+        else:
+            match = "MATCH (:Capsule {id: $capsule_id})-[tc:TAG_COUNT]->(tag:Tag) WITH tag, tc.entries AS entries"
+        with self.session() as session:
+            result = session.run(
+                f"""
+                {match}
+                RETURN tag.name AS name, entries
+                ORDER BY entries DESC, name
+                {'LIMIT $limit' if limit is not None else ''}
+                """,
+                capsule_id=capsule_id, limit=limit
+            )
+            return [{'name': record["name"], 'entries': record["entries"]} for record in result]
+
+    def get_tag_cooccurrence(self, tag_name, capsule_id=None, limit=None):
+        owner = "(:Capsule)" if capsule_id is None else "(:Capsule {id: $capsule_id})"
+        with self.session() as session:
+            result = session.run(
+                f"""
+                MATCH (:Tag {{name: $tag_name}})<-[:TAGGED_AS]-(e:Entry)-[:TAGGED_AS]->(other:Tag)
+                WHERE {owner}-[:HAS_ENTRY]->(e)
+                RETURN other.name AS name, count(DISTINCT e) AS entries
+                ORDER BY entries DESC, name
+                {'LIMIT $limit' if limit is not None else ''}
+                """,
+                tag_name=tag_name, capsule_id=capsule_id, limit=limit
+            )
+            return [{'name': record["name"], 'entries': record["entries"]} for record in result]
+
+    def get_entries_with_tags(self, tag_names, limit, capsule_id=None, after=None):
+        after_ts, after_id = decode_cursor(after, 2) if after else (None, None)
+        owner = "(:Capsule)" if capsule_id is None else "(:Capsule {id: $capsule_id})"
+        with self.session() as session:
+            # Start from the least used tag and probe each entry for the others
+            result = session.run(
+                f"""
+                MATCH (tag:Tag) WHERE tag.name IN $names
+                WITH tag ORDER BY coalesce(tag.entries, 0) LIMIT 1
+                MATCH (tag)<-[:TAGGED_AS]-(e:Entry)
+                WHERE all(name IN $names WHERE (e)-[:TAGGED_AS]->(:Tag {{name: name}}))
+                  AND {owner}-[:HAS_ENTRY]->(e)
+                  AND ($after_ts IS NULL OR e.timestamp > $after_ts OR (e.timestamp = $after_ts AND e.id > $after_id))
+                WITH DISTINCT e
+                ORDER BY e.timestamp, e.id
+                LIMIT $fetch
+                RETURN e
+                """,
+                names=list(tag_names), capsule_id=capsule_id, after_ts=after_ts, after_id=after_id, fetch=limit + 1
+            )
+            entries = [_entry(record["e"]) for record in result]
+        if len(entries) <= limit:
+            return entries, None
+        entries = entries[:limit]
+        last = entries[-1]
+        return entries, encode_cursor(last["timestamp"], last["id"])
+
+    # --- Graph export ---
+
+    def iter_capsule_relations(self, capsule_id, rel_type):
+        label = GRAPH_RELATIONS[rel_type]
+        same_capsule = "<-[:HAS_ENTRY]-(c)" if rel_type == 'LINKS_TO' else ""
+        with self.session() as session:
+            result = session.run(
+                f"""
+                MATCH (c:Capsule {{id: $capsule_id}})-[:HAS_ENTRY]->(e:Entry)-[:{rel_type}]->(n:{label}){same_capsule}
+                RETURN e.id AS entry_id, {GRAPH_PROJECTIONS[label]} AS node
+                """,
+                capsule_id=capsule_id
+            )
+            for record in result:
+                yield record["entry_id"], dict(record["node"])
+
+    def get_capsule_degrees(self, capsule_id):
+        with self.session() as session:
+            result = session.run(
+                """
+                MATCH (c:Capsule {id: $capsule_id})-[:HAS_ENTRY]->(e:Entry)
+                RETURN e.id AS id, size([(e)-[:LINKS_TO|TAGGED_AS]-() | 1]) AS degree
+                """,
+                capsule_id=capsule_id
+            )
+            return {record["id"]: record["degree"] for record in result}
@@ -0,0 +1,211 @@
+"""Template application: stamp out entries from a template's `structure`.
+
+A structure is a JSON document such as
+
+    {"entries": [{"properties": {"title": "Step {n}", "done": false}, "tags": ["checklist"]}],
+     "tags": ["onboarding"]}
+
+Items of `entries` may also be bare property objects, and a bare JSON list
+is read as `entries`. Top-level `tags` are added to every generated entry.
+In string property values `{n}` becomes the entry's 1-based number within
+its capsule for this application and `{capsule}` the capsule name.
+
+Structures are parsed once per distinct text and cached. An application
+streams rows for each capsule (`repeat` copies of the entry list) into
+batches written by `db.create_entries_from_template`: one transaction per
+batch creates the entries with their TAGGED_AS and USES_TEMPLATE edges.
+Entries without placeholders are validated and serialized once per
+capsule. `dry_run` walks the same rows without writing and reports the
+counts and payload size the application would produce.
+"""
+from datetime import datetime, timedelta, UTC
+import hashlib
+import json
+import re
+import time
+from cache import LRUCache
+from db import create_entries_from_template
+from validation import validate_properties
+
+DEFAULT_BATCH_SIZE = 2000
+MAX_BATCH_SIZE = 20000
+MAX_APPLY_ENTRIES = 500000
+DEFAULT_PARSED_CACHE_SIZE = 256
+
+_PLACEHOLDER_RE = re.compile(r'\{(n|capsule)\}')
+
+_parsed_cache = LRUCache(DEFAULT_PARSED_CACHE_SIZE)
+
+
+def get_parsed_cache():
+    return _parsed_cache
+
+
+class EntrySpec:
+    """One entry of a parsed structure; `dynamic` lists the properties holding placeholders."""
+
+    __slots__ = ('properties', 'tags', 'dynamic')
+
+    def __init__(self, properties, tags):
+        self.properties = properties
+        self.tags = tags
+        self.dynamic = [
+            key for key, value in properties.items() if isinstance(value, str) and _PLACEHOLDER_RE.search(value)
+        ]
+
+    def render(self, n, capsule_name):
+        if not self.dynamic:
+            return self.properties
+        values = {'n': str(n), 'capsule': capsule_name or ''}
+        rendered = dict(self.properties)
+        for key in self.dynamic:
+            rendered[key] = _PLACEHOLDER_RE.sub(lambda match: values[match.group(1)], rendered[key])
+        return rendered
+
+
+def _tag_list(value, where):
+    if value is None:
+        return []
+    if not isinstance(value, list) or not all(isinstance(tag, str) and tag for tag in value):
+        raise ValueError(f'{where}: tags must be a list of non-empty strings')
+    return value
+
+
+def parse_structure(structure):
+    """Parse a template structure into a list of EntrySpec, raising ValueError when it is malformed."""
+    try:
+        document = json.loads(structure) if isinstance(structure, str) else structure
+    except ValueError as e:
+        raise ValueError(f'template structure is not valid JSON: {e}')
+    if isinstance(document, list):
+        document = {'entries': document}
+    if not isinstance(document, dict) or not isinstance(document.get('entries'), list) or not document['entries']:
+        raise ValueError("template structure has no 'entries' list")
+    common = _tag_list(document.get('tags'), 'structure')
+    specs = []
+    for index, item in enumerate(document['entries']):
+        if not isinstance(item, dict):
+            raise ValueError(f'entry {index}: must be an object')
+        if 'properties' in item:
+            properties, tags = item['properties'], _tag_list(item.get('tags'), f'entry {index}')
+        else:
+            properties, tags = item, []
+        if not isinstance(properties, dict):
+            raise ValueError(f'entry {index}: properties must be an object')
+        tags = list(dict.fromkeys(common + tags))
+        specs.append(EntrySpec(properties, tags))
+    return specs
+
+
+def parsed_template(template):
+    """Return the template's parsed entry specs, parsing each distinct structure text only once."""
+    structure = template.get('structure') or ''
+    key = hashlib.sha1(structure.encode('utf-8')).hexdigest()
+    specs = _parsed_cache.get(key)
+    if specs is None:
+        specs = parse_structure(structure)
+        _parsed_cache.set(key, specs)
+    return specs
+
+
+def iter_rows(specs, capsule, repeat, errors):
+    """Yield `(timestamp, properties_json, tags)` rows for one capsule.
+
+    Specs whose properties fail the capsule's schema are reported once in
+    `errors` as `(entry_index, message)` and skipped from then on.
+    """
+    fields = capsule.get('fields', [])
+    started = datetime.now(UTC)
+    static = {}
+    skipped = set()
+    n = 0
+    for _ in range(repeat):
+        for index, spec in enumerate(specs):
+            if index in skipped:
+                continue
+            n += 1
+            properties = static.get(index)
+            if properties is None:
+                try:
+                    properties = json.dumps(validate_properties(fields, spec.render(n, capsule.get('name'))))
+                except ValueError as e:
+                    skipped.add(index)
+                    errors.append((index, str(e)))
+                    n -= 1
+                    continue
+                if not spec.dynamic:
+                    static[index] = properties
+            # Microsecond steps keep generated entries in structure order under (timestamp, id) paging
+            yield started + timedelta(microseconds=n), properties, spec.tags
+
+
+def estimate(specs, capsule_count, repeat):
+    """Upper bound on the entries an application creates, before validation."""
+    return len(specs) * repeat * capsule_count
+
+
+def apply_template(template, capsules, repeat=1, batch_size=DEFAULT_BATCH_SIZE, dry_run=False):
+    """Generate a template's entries in each capsule, yielding progress events.
+
+    Yields `{'event': 'batch', ...}` after each committed batch (none on a dry
+    run), `{'event': 'error', 'capsule_id', 'entry', 'error'}` for entries
+    skipped by validation, and a final `{'event': 'done', ...}` summary with
+    entry, tag edge and template edge counts and the properties size in bytes.
+    Raises ValueError when the structure is malformed or the application is
+    larger than MAX_APPLY_ENTRIES.
+    """
+    specs = parsed_template(template)
+    if estimate(specs, len(capsules), repeat) > MAX_APPLY_ENTRIES:
+        raise ValueError(f'application would create more than {MAX_APPLY_ENTRIES} entries')
+    started = time.perf_counter()
+    totals = {'entries': 0, 'created': 0, 'tag_edges': 0, 'template_edges': 0, 'bytes': 0, 'batches': 0}
+    tag_names = set()
+
+    def flush(capsule_id, batch):
+        batch_started = time.perf_counter()
+        ids = create_entries_from_template(capsule_id, template['id'], batch)
+        totals['batches'] += 1
+        totals['created'] += len(ids)
+        return {
+            'event': 'batch',
+            'capsule_id': capsule_id,
+            'batch': totals['batches'],
+            'rows': len(batch),
+            'created': len(ids),
+            'elapsed_ms': round((time.perf_counter() - batch_started) * 1000, 2),
+            'total_created': totals['created'],
+        }
+
+    for capsule in capsules:
+        errors = []
+        batch = []
+        count = 0
+        for row in iter_rows(specs, capsule, repeat, errors):
+            count += 1
+            totals['entries'] += 1
+            totals['tag_edges'] += len(row[2])
+            totals['template_edges'] += 1
+            totals['bytes'] += len(row[1])
+            tag_names.update(row[2])
+            if dry_run:
+                if (count - 1) % batch_size == 0:
+                    totals['batches'] += 1
+                continue
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield flush(capsule['id'], batch)
+                batch = []
+        if batch:
+            yield flush(capsule['id'], batch)
+        for index, message in errors:
+            yield {'event': 'error', 'capsule_id': capsule['id'], 'entry': index, 'error': message}
+    elapsed = time.perf_counter() - started
+    yield dict(
+        totals,
+        event='done',
+        dry_run=dry_run,
+        tags=len(tag_names),
+        capsules=len(capsules),
+        elapsed_ms=round(elapsed * 1000, 2),
+        entries_per_sec=round(totals['created'] / elapsed, 1) if elapsed > 0 and not dry_run else None,
+    )
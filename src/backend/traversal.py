@@ -0,0 +1,43 @@
+from collections import deque
+
+# Frontiers larger than this are split across several queries so a single
+# UNWIND parameter list stays a reasonable size.
+FRONTIER_BATCH_SIZE = 1000
+
+
+def breadth_first(start_id, fetch_children, max_depth=5, limit=None, fan_out=None):
+    """Walk outgoing links level by level from `start_id`.
+
+    `fetch_children(ids, fan_out)` receives a whole frontier at once and returns a
+    mapping of parent id -> list of child nodes (anything indexable by 'id'), so
+    callers can serve each level with one batched query. The walk is iterative,
+    so deep graphs never touch Python's recursion limit.
+
+    Returns `(hits, truncated)` where each hit is a dict with the node (`entry`),
+    its shortest-path `depth` from the start and the `path` of ids leading to it.
+    `truncated` is True when `limit` cut the walk short.
+    """
+    visited = {start_id}
+    paths = {start_id: [start_id]}
+    hits = []
+    frontier = deque([start_id])
+    depth = 0
+    while frontier and depth < max_depth:
+        depth += 1
+        level = list(frontier)
+        frontier = deque()
+        for i in range(0, len(level), FRONTIER_BATCH_SIZE):
+            batch = level[i:i + FRONTIER_BATCH_SIZE]
+            children = fetch_children(batch, fan_out)
+            for parent_id in batch:
+                for node in children.get(parent_id, []):
+                    node_id = node['id']
+                    if node_id in visited:
+                        continue
+                    visited.add(node_id)
+                    paths[node_id] = paths[parent_id] + [node_id]
+                    hits.append({'entry': node, 'depth': depth, 'path': paths[node_id]})
+                    if limit is not None and len(hits) >= limit:
+                        return hits, True
+                    frontier.append(node_id)
+    return hits, False
@@ -0,0 +1,72 @@
+from datetime import datetime, UTC
+
+TRUE_VALUES = ('true', 'on', '1', 'yes')
+FALSE_VALUES = ('false', 'off', '0', 'no', '')
+
+
+def coerce_value(field_type, value):
+    """Convert a value to a capsule field type, raising ValueError if it does not fit."""
+    if field_type == 'int':
+        if isinstance(value, bool):
+            raise ValueError(f'expected int, got {value!r}')
+        if isinstance(value, int):
+            return value
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        if isinstance(value, str):
+            return int(value.strip())
+        raise ValueError(f'expected int, got {value!r}')
+    if field_type == 'boolean':
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, str) and value.strip().lower() in TRUE_VALUES + FALSE_VALUES:
+            return value.strip().lower() in TRUE_VALUES
+        raise ValueError(f'expected boolean, got {value!r}')
+    if isinstance(value, (dict, list)):
+        raise ValueError(f'expected {field_type}, got {type(value).__name__}')
+    return value if isinstance(value, str) else str(value)
+
+
+def validate_properties(fields, properties):
+    """Validate entry properties against a capsule's `fields` schema.
+
+    Declared fields are coerced to their type and missing ones take their
+    `defaultValue` when it has one; undeclared keys are kept as-is. Returns the
+    coerced dict or raises ValueError naming the offending field.
+    """
+    if not isinstance(properties, dict):
+        raise ValueError('properties must be an object')
+    validated = dict(properties)
+    for field in fields or []:
+        name = field.get('name')
+        if not name:
+            continue
+        if name not in properties:
+            default = field.get('defaultValue')
+            if default in (None, ''):
+                continue
+            value = default
+        else:
+            value = properties[name]
+        if value is None:
+            validated[name] = None
+            continue
+        try:
+            validated[name] = coerce_value(field.get('type', 'string'), value)
+        except ValueError as e:
+            raise ValueError(f"field '{name}': {e}")
+    return validated
+
+
+def parse_timestamp(value):
+    """Parse an ISO-8601 timestamp, raising ValueError if it is not one."""
+    if isinstance(value, datetime):
+        return value
+    if not isinstance(value, str):
+        raise ValueError(f'timestamp must be an ISO-8601 string, got {value!r}')
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def to_utc(value):
+    """Return `value` as an aware UTC datetime; naive values are taken to be UTC already."""
+    return value.replace(tzinfo=UTC) if value.tzinfo is None else value.astimezone(UTC)
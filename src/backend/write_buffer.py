@@ -0,0 +1,285 @@
+"""Write-behind buffer for high-frequency entry and snapshot writes.
+
+Enabled with RECALL_WRITE_BEHIND=on. `POST /api/capsule/<id>/add_entry`
+and `POST /api/entries/<id>/snapshots` then queue the write in process and
+answer 202; a flusher thread commits the queue once RECALL_WRITE_FLUSH_ROWS
+writes (default 500) are waiting or every RECALL_WRITE_FLUSH_MS (default
+200). Queued entries are grouped per capsule into one create_entries_batch
+transaction each; snapshots are appended in arrival order, since each one
+is encoded against the previous version. Queued writes are not visible to
+reads until they are flushed.
+
+The queue holds at most RECALL_WRITE_BUFFER_SIZE writes (default 10000);
+beyond that writes are refused with BufferFull, which the API turns into
+429 with Retry-After. The buffer is drained on shutdown.
+
+With RECALL_WRITE_WAL=<path> every accepted write is appended and fsynced
+to a write-ahead file before it is acknowledged. Each worker process keeps
+its own file, `<path>.<pid>`, and holds an exclusive lock on
+`<path>.<pid>.lock` for as long as it runs. The file is rotated to
+`<path>.<pid>.flushing` while its writes are committed and removed
+afterwards. At startup a worker commits the files of every worker whose
+lock is free, i.e. that died without draining, before requests are
+served; files of live workers are left alone. A crash between a commit
+and the removal replays those writes again, so delivery is at least once.
+"""
+from collections import deque
+from datetime import datetime
+import atexit
+import fcntl
+import glob
+import json
+import os
+import threading
+import time
+from db import create_entries_batch, create_snapshot
+
+DEFAULT_BUFFER_SIZE = 10000
+DEFAULT_FLUSH_ROWS = 500
+DEFAULT_FLUSH_MS = 200
+RETRY_AFTER_SECONDS = 1
+
+
+class BufferFull(Exception):
+    """The write buffer cannot take more writes right now."""
+
+
+def write_behind_enabled():
+    return os.getenv('RECALL_WRITE_BEHIND', 'off').lower() in ('on', 'true', '1', 'yes')
+
+
+class WriteBuffer:
+    """Bounded in-process queue of entry and snapshot writes with a background flusher."""
+
+    def __init__(self, max_size=DEFAULT_BUFFER_SIZE, flush_rows=DEFAULT_FLUSH_ROWS,
+                 flush_interval=DEFAULT_FLUSH_MS / 1000, wal_path=None):
+        self.max_size = max_size
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.wal_path = wal_path
+        self._queue = deque()
+        self._pending = []
+        self._cond = threading.Condition()
+        # Serializes write-ahead appends and rotation; taken before _cond, never while holding it,
+        # so an fsync never blocks the flusher or stats readers
+        self._wal_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self._wal = None
+        self._wal_file = None
+        self._wal_owner = None
+        self._stats = {'accepted': 0, 'rejected': 0, 'committed': 0, 'dropped': 0, 'flushes': 0, 'errors': 0}
+        if wal_path:
+            self._replay()
+            self._wal_file = f'{wal_path}.{os.getpid()}'
+            self._wal_owner = self._claim(self._wal_file + '.lock')
+            self._wal = open(self._wal_file, 'a', encoding='utf-8')
+        self._thread = threading.Thread(target=self._run, name='recall-write-behind', daemon=True)
+        self._thread.start()
+
+    # Accepting writes
+    def add_entry(self, capsule_id, timestamp, properties):
+        self._accept({'kind': 'entry', 'capsule_id': capsule_id, 'timestamp': timestamp.isoformat(),
+                      'properties': properties})
+
+    def add_snapshot(self, entry_id, created_at, payload):
+        self._accept({'kind': 'snapshot', 'entry_id': entry_id, 'created_at': created_at.isoformat(),
+                      'payload': payload})
+
+    def _accept(self, record):
+        # Holding _wal_lock from the checks to the append keeps the queue and the
+        # write-ahead file in step: a rotation cannot fall between the two.
+        with self._wal_lock:
+            with self._cond:
+                if self._closed:
+                    raise BufferFull('write buffer is shutting down')
+                if len(self._queue) >= self.max_size:
+                    self._stats['rejected'] += 1
+                    raise BufferFull(f'write buffer is full ({self.max_size} writes waiting)')
+            if self._wal is not None:
+                self._wal.write(json.dumps(record) + '\n')
+                self._wal.flush()
+                os.fsync(self._wal.fileno())
+            with self._cond:
+                self._queue.append(record)
+                self._stats['accepted'] += 1
+                if len(self._queue) >= self.flush_rows:
+                    self._cond.notify()
+
+    # Flushing
+    def flush(self):
+        """Commit everything queued so far (or retry a failed batch). Returns the number of writes flushed."""
+        with self._flush_lock:
+            if not self._pending:
+                with self._wal_lock:
+                    with self._cond:
+                        self._pending = list(self._queue)
+                        self._queue.clear()
+                    if self._pending and self._wal is not None:
+                        self._rotate_wal()
+            if not self._pending:
+                return 0
+            flushed = len(self._pending)
+            self._pending = self._commit(self._pending)
+            self._stats['flushes'] += 1
+            if self._wal_file and os.path.exists(self._wal_file + '.flushing'):
+                os.remove(self._wal_file + '.flushing')
+            return flushed
+
+    def _commit(self, records):
+        """Write `records`; on failure, raises with the uncommitted ones left in self._pending."""
+        entries = {}
+        snapshots = []
+        for record in records:
+            if record['kind'] == 'entry':
+                entries.setdefault(record['capsule_id'], []).append(record)
+            else:
+                snapshots.append(record)
+        done = set()
+        try:
+            for capsule_id, group in entries.items():
+                rows = [(datetime.fromisoformat(r['timestamp']), r['properties']) for r in group]
+                ids = create_entries_batch(capsule_id, rows)
+                # A capsule deleted while its writes were queued creates nothing
+                self._stats['dropped'] += len(rows) - len(ids)
+                self._stats['committed'] += len(ids)
+                done.update(id(r) for r in group)
+            for record in snapshots:
+                if create_snapshot(record['entry_id'], datetime.fromisoformat(record['created_at']),
+                                   record['payload']) is None:
+                    self._stats['dropped'] += 1
+                else:
+                    self._stats['committed'] += 1
+                done.add(id(record))
+        except Exception:
+            self._pending = [record for record in records if id(record) not in done]
+            raise
+        return []
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed or len(self._queue) >= self.flush_rows,
+                                    timeout=self.flush_interval)
+                if self._closed:
+                    return
+            try:
+                self.flush()
+            except Exception as e:
+                self._stats['errors'] += 1
+                print(f"[Recall] Write-behind flush failed, {len(self._pending)} writes kept for retry: {e}")
+                time.sleep(self.flush_interval)
+
+    # Write-ahead file
+    @staticmethod
+    def _claim(lock_path):
+        """Create and lock this process's lock file; it only appears under its name once locked."""
+        claiming = f'{lock_path}.{threading.get_ident()}'
+        lock = open(claiming, 'w', encoding='utf-8')
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        os.replace(claiming, lock_path)
+        return lock
+
+    def _rotate_wal(self):
+        self._wal.close()
+        os.replace(self._wal_file, self._wal_file + '.flushing')
+        self._wal = open(self._wal_file, 'a', encoding='utf-8')
+
+    def _replay(self):
+        """Commit the write-ahead files of workers that died, taking over each one's free lock."""
+        for lock_path in glob.glob(glob.escape(self.wal_path) + '.*.lock'):
+            try:
+                lock = open(lock_path, 'r', encoding='utf-8')
+            except FileNotFoundError:
+                continue
+            with lock:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    continue  # its worker is alive
+                try:
+                    if os.stat(lock_path).st_ino != os.fstat(lock.fileno()).st_ino:
+                        continue  # replayed and removed by another worker meanwhile
+                except FileNotFoundError:
+                    continue
+                self._replay_files(lock_path[:-len('.lock')])
+                os.remove(lock_path)
+
+    def _replay_files(self, wal_file):
+        paths = [wal_file + '.flushing', wal_file]
+        records = []
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            with open(path, encoding='utf-8') as wal:
+                for line in wal:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        # A write torn by the crash was never acknowledged
+                        continue
+        if records:
+            self._commit(records)
+            print(f"[Recall] Replayed {len(records)} writes from {wal_file}")
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def close(self):
+        """Stop the flusher and commit whatever is still queued."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout=max(self.flush_interval * 2, 1))
+        try:
+            self.flush()
+        except Exception as e:
+            kept = len(self._pending) + len(self._queue)
+            where = f'kept in {self._wal_file}' if self._wal_file else 'lost'
+            print(f"[Recall] Write-behind shutdown flush failed, {kept} writes {where}: {e}")
+        with self._wal_lock:
+            if self._wal is None:
+                return
+            self._wal.close()
+            if not self._pending and not self._queue:
+                # Drained: drop this worker's files while still holding the lock
+                for path in (self._wal_file, self._wal_file + '.lock'):
+                    if os.path.exists(path):
+                        os.remove(path)
+            self._wal_owner.close()
+
+    def stats(self):
+        with self._cond:
+            return dict(self._stats, queued=len(self._queue), pending=len(self._pending), max_size=self.max_size)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_write_buffer():
+    """The process-wide WriteBuffer, or None when write-behind is off."""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None and write_behind_enabled():
+            _buffer = WriteBuffer(
+                max_size=int(os.getenv('RECALL_WRITE_BUFFER_SIZE', str(DEFAULT_BUFFER_SIZE))),
+                flush_rows=int(os.getenv('RECALL_WRITE_FLUSH_ROWS', str(DEFAULT_FLUSH_ROWS))),
+                flush_interval=int(os.getenv('RECALL_WRITE_FLUSH_MS', str(DEFAULT_FLUSH_MS))) / 1000,
+                wal_path=os.getenv('RECALL_WRITE_WAL') or None,
+            )
+            atexit.register(_buffer.close)
+        return _buffer
+
+
+def set_write_buffer(buffer):
+    """Install `buffer` as the process-wide write buffer (None turns write-behind off); returns the previous one."""
+    global _buffer
+    with _buffer_lock:
+        previous, _buffer = _buffer, buffer
+        return previous
+
+
+def init_app(app):
+    """Create the buffer at startup, so a write-ahead file left by a crash is replayed before serving."""
+    get_write_buffer()
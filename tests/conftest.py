@@ -0,0 +1,27 @@
+import os
+import sys
+import pytest
+
+# The backend modules import each other by their flat names (e.g. `from pool import ...`).
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src/backend')))
+
+# Run against the in-memory graph engine unless RECALL_STORAGE=neo4j is set explicitly.
+os.environ.setdefault('RECALL_STORAGE', 'memory')
+# Keep ETags stable within a test; VersionCounters' rollover is covered in test_cache.py.
+os.environ.setdefault('RECALL_VERSION_TTL', '0')
+
+@pytest.fixture(autouse=True)
+def reset_memory_backend():
+    from storage import get_backend
+    from cache import get_capsule_cache, get_response_cache, get_versions
+    from snapshots import get_snapshot_cache
+    from deletion import get_deletion_jobs
+    yield
+    backend = get_backend()
+    if backend.name == 'memory':
+        backend.clear()
+    get_capsule_cache().clear()
+    get_snapshot_cache().clear()
+    get_versions().clear()
+    get_response_cache().clear()
+    get_deletion_jobs().clear()
@@ -0,0 +1,84 @@
+import json
+from datetime import datetime, timedelta, UTC
+import pytest
+import aggregation
+import db
+from recall import app
+
+FIELDS = [
+    {"name": "temperature", "type": "int"},
+    {"name": "ok", "type": "boolean"},
+    {"name": "sensor", "type": "string"},
+]
+
+def make_capsule(storage_mode):
+    capsule_id = db.create_capsule("Aggregate Capsule", "desc", datetime.now(UTC), FIELDS, storage_mode=storage_mode)
+    start = datetime(2025, 5, 1, 22, tzinfo=UTC)
+    ids = []
+    for i in range(6):
+        properties = {"temperature": i * 10, "ok": i % 3 != 0, "sensor": f"s{i % 2}"}
+        if i == 5:
+            properties = {"temperature": "hot", "sensor": "s1"}
+        ids.append(db.create_entry(capsule_id, start + timedelta(hours=i), json.dumps(properties)))
+    return capsule_id, ids
+
+def groups(response):
+    assert response.status_code == 200, response.get_json()
+    return {group["key"]: group for group in response.get_json()["groups"]}
+
+@pytest.mark.parametrize("storage_mode", ["native", "json"])
+def test_aggregate_by_field(storage_mode):
+    capsule_id, _ = make_capsule(storage_mode)
+    with app.test_client() as client:
+        total = groups(client.get(f"/api/capsule/{capsule_id}/aggregate"))[None]
+        assert total["count"] == 6
+        assert total["fields"]["temperature"] == {"count": 5, "sum": 100, "avg": 20.0, "min": 0, "max": 40}
+        assert total["fields"]["ok"]["sum"] == 3 and total["fields"]["ok"]["count"] == 5
+        by_sensor = groups(client.get(f"/api/capsule/{capsule_id}/aggregate?field=temperature&group_by=sensor"))
+        assert list(by_sensor) == ["s0", "s1"]
+        assert by_sensor["s1"]["count"] == 3 and by_sensor["s1"]["fields"]["temperature"]["sum"] == 40
+        assert list(by_sensor["s0"]["fields"]) == ["temperature"]
+
+def test_aggregate_by_tag_and_day():
+    capsule_id, ids = make_capsule("native")
+    db.tag_entry(ids[0], "hot")
+    with app.test_client() as client:
+        url = f"/api/capsule/{capsule_id}/aggregate?field=temperature&group_by=tag"
+        assert list(groups(client.get(url))) == ["hot", None]
+        db.tag_entries([(ids[1], "hot"), (ids[1], "cold")])
+        by_tag = groups(client.get(url))
+        assert by_tag["hot"]["fields"]["temperature"]["sum"] == 10 and by_tag["cold"]["count"] == 1
+        by_day = groups(client.get(f"/api/capsule/{capsule_id}/aggregate?group_by=day&to=2025-05-02T02:00:00Z"))
+        assert [(key[:10], group["count"]) for key, group in by_day.items()] == [("2025-05-01", 2), ("2025-05-02", 2)]
+
+def test_results_follow_capsule_writes():
+    capsule_id, _ = make_capsule("native")
+    with app.test_client() as client:
+        url = f"/api/capsule/{capsule_id}/aggregate?field=temperature"
+        etag = client.get(url).headers["ETag"]
+        assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+        db.create_entry(capsule_id, datetime.now(UTC), json.dumps({"temperature": 100}))
+        changed = client.get(url, headers={"If-None-Match": etag})
+        assert groups(changed)[None]["fields"]["temperature"]["max"] == 100
+
+def test_invalid_requests():
+    capsule_id, _ = make_capsule("native")
+    with app.test_client() as client:
+        assert client.get(f"/api/capsule/{capsule_id}/aggregate?field=sensor").status_code == 400
+        assert client.get(f"/api/capsule/{capsule_id}/aggregate?group_by=week").status_code == 400
+        assert client.get("/api/capsule/missing/aggregate").status_code == 404
+    empty = db.create_capsule("No Numbers", "desc", datetime.now(UTC), [{"name": "label", "type": "string"}])
+    with app.test_client() as client:
+        assert client.get(f"/api/capsule/{empty}/aggregate").status_code == 400
+
+def test_aggregate_columns():
+    keys = ["b", None, "a", "b", "a"]
+    values = [[3, 4, None, -2, 7], [1, 0, 1, None, None]]
+    rows = aggregation.aggregate_columns(keys, values, [("n", "int"), ("flag", "boolean")])
+    assert [row["key"] for row in rows] == ["a", "b", None]
+    assert rows[0]["fields"]["n"] == {"count": 1, "sum": 7, "avg": 7.0, "min": 7, "max": 7}
+    assert rows[1]["fields"]["n"] == {"count": 2, "sum": 1, "avg": 0.5, "min": -2, "max": 3}
+    assert rows[0]["fields"]["flag"] == {"count": 1, "sum": 1, "avg": 1.0, "min": 1, "max": 1}
+    assert rows[2]["count"] == 1 and rows[2]["fields"]["flag"]["sum"] == 0
+    big = aggregation.aggregate_columns([None, None], [[2 ** 62, 2 ** 62]], [("n", "int")])
+    assert big[0]["fields"]["n"]["sum"] == 2 ** 63
@@ -0,0 +1,115 @@
+import io
+import json
+from datetime import datetime, timedelta, UTC
+import pytest
+import archive
+import db
+from archive import ImportInterrupted, export_records, import_archive, iter_records
+from recall import app
+
+def make_capsule():
+    capsule_id = db.create_capsule("Archived", "desc", datetime(2025, 1, 1, tzinfo=UTC),
+                                   [{"name": "n", "type": "int"}], storage_mode="native")
+    start = datetime(2025, 1, 1, tzinfo=UTC)
+    ids = db.create_entries_batch(capsule_id, [(start + timedelta(seconds=i), json.dumps({"n": i, "note": f"e{i}"}))
+                                               for i in range(5)])
+    for version in range(3):
+        db.create_snapshot(ids[0], start + timedelta(minutes=version), {"n": 0, "version": version})
+    db.tag_entries([(ids[0], "red"), (ids[1], "red"), (ids[1], "blue")])
+    template_id = db.create_template("Reading", {"n": "int"})
+    db.assign_templates([(ids[2], template_id), (ids[3], template_id)])
+    db.link_entries([(ids[0], ids[1]), (ids[1], ids[4])])
+    return capsule_id, ids
+
+def contents(capsule_id):
+    """Capsule contents in a form that does not depend on the ids."""
+    entries = db.get_entries_by_capsule(capsule_id)
+    position = {entry["id"]: i for i, entry in enumerate(entries)}
+    return {
+        "properties": [json.loads(entry["properties"]) for entry in entries],
+        "tags": sorted((position[e["id"]], tag["name"]) for e in entries for tag in db.get_tags_for_entry(e["id"])),
+        "templates": [(db.get_template_for_entry(e["id"]) or {}).get("name") for e in entries],
+        "links": sorted((position[e["id"]], position[t["id"]]) for e in entries for t in db.get_linked_entries(e["id"])),
+        "history": [s["payload"] for s in db.get_snapshots_by_entry(entries[0]["id"])],
+    }
+
+def export_bytes(client, capsule_id, codec=None):
+    query = f"?compress={codec}" if codec else ""
+    response = client.get(f"/api/capsule/{capsule_id}/export{query}")
+    assert response.status_code == 200 and response.is_streamed
+    return response.get_data()
+
+def test_export_import_round_trip_with_remapped_ids():
+    capsule_id, ids = make_capsule()
+    with app.test_client() as client:
+        for codec in (None, "gzip"):
+            body = export_bytes(client, capsule_id, codec)
+            assert body[:2] == (b"\x1f\x8b" if codec else b'{"')
+            response = client.post("/api/capsules/import", data=body, content_type="application/x-ndjson")
+            assert response.status_code == 200
+            summary = response.get_json()
+            assert (summary["entries"], summary["snapshots"], summary["tags"], summary["links"]) == (5, 3, 3, 2)
+            copy_id = summary["capsule_id"]
+            assert copy_id != capsule_id and db.get_capsule_by_id(copy_id)["storage_mode"] == "native"
+            assert contents(copy_id) == contents(capsule_id)
+            assert not {entry["id"] for entry in db.get_entries_by_capsule(copy_id)} & set(ids)
+    # New versions continue the imported history
+    copy_first = db.get_entries_by_capsule(copy_id)[0]["id"]
+    db.create_snapshot(copy_first, datetime(2025, 2, 1, tzinfo=UTC), {"n": 0, "version": 3})
+    assert [s["payload"]["version"] for s in db.get_snapshots_by_entry(copy_first)] == [0, 1, 2, 3]
+
+def test_preserved_ids_and_existing_capsule():
+    capsule_id, ids = make_capsule()
+    records = list(export_records(db.get_capsule_by_id(capsule_id)))
+    assert [r["type"] for r in records][:2] == ["header", "capsule"] and records[-1]["type"] == "end"
+    with pytest.raises(ValueError, match="already exists"):
+        import_archive(iter(records), ids="preserve")
+    before = contents(capsule_id)
+    db.delete_capsule(capsule_id)
+    summary = import_archive(iter(records), ids="preserve", batch_size=2)
+    assert summary["capsule_id"] == capsule_id
+    assert [entry["id"] for entry in db.get_entries_by_capsule(capsule_id)] == ids
+    assert contents(capsule_id) == before
+
+def test_interrupted_import_resumes_from_checkpoint(monkeypatch):
+    capsule_id, _ = make_capsule()
+    body = b"".join(archive.export_archive(db.get_capsule_by_id(capsule_id), "gzip"))
+    saved = []
+    real_link_entries = db.link_entries
+
+    def failing_link_entries(pairs, batch_size):
+        raise ConnectionError("database went away")
+    monkeypatch.setattr(db, "link_entries", failing_link_entries)
+    with pytest.raises(ImportInterrupted) as stopped:
+        import_archive(iter_records(io.BytesIO(body)), batch_size=2, on_checkpoint=saved.append)
+    checkpoint = stopped.value.checkpoint
+    assert checkpoint == saved[-1] and 0 < checkpoint["records"]
+    assert db.get_capsule_by_id(checkpoint["capsule_id"])["import_id"] == checkpoint["import_id"]
+    monkeypatch.setattr(db, "link_entries", real_link_entries)
+    summary = import_archive(iter_records(io.BytesIO(body)), batch_size=2, checkpoint=checkpoint)
+    assert summary["capsule_id"] == checkpoint["capsule_id"] and summary["links"] == 2
+    assert contents(checkpoint["capsule_id"]) == contents(capsule_id)
+
+def test_resume_only_writes_into_its_own_capsule():
+    capsule_id, ids = make_capsule()
+    other_id = db.create_capsule("Unrelated", "desc", datetime(2025, 1, 1, tzinfo=UTC), [])
+    body = b"".join(archive.export_archive(db.get_capsule_by_id(capsule_id)))
+    with app.test_client() as client:
+        hijack = client.post(f"/api/capsules/import?capsule_id={other_id}&resume_records=0", data=body)
+        assert hijack.status_code == 400
+        forged = client.post(f"/api/capsules/import?capsule_id={other_id}&resume_records=3&import_id=guess", data=body)
+        assert forged.status_code == 400 and "not created by this import" in forged.get_json()["error"]
+        assert client.post(f"/api/capsules/import?capsule_id={other_id}&resume_records=3", data=body).status_code == 400
+    assert db.get_entries_by_capsule(other_id) == []
+
+def test_bad_archives_are_rejected(monkeypatch):
+    capsule_id, _ = make_capsule()
+    monkeypatch.setattr(archive, "zstandard", None)
+    with app.test_client() as client:
+        assert client.get(f"/api/capsule/{capsule_id}/export?compress=zstd").status_code == 400
+        assert client.get("/api/capsule/missing/export").status_code == 404
+        assert client.post("/api/capsules/import", data=b'{"type": "entry"}\n').status_code == 400
+        assert client.post("/api/capsules/import?ids=bogus", data=b"").status_code == 400
+        truncated = b"".join(line + b"\n" for line in export_bytes(client, capsule_id).splitlines()[:-1])
+        response = client.post("/api/capsules/import", data=truncated)
+        assert response.status_code == 400 and response.get_json()["checkpoint"]["records"] > 0
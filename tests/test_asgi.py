@@ -0,0 +1,87 @@
+import asyncio
+import json
+from datetime import datetime, UTC
+import pytest
+
+pytest.importorskip("asgiref")
+
+import db
+from asgi import application
+from cache import get_response_cache
+from recall import app
+
+def call(path, query=b"", method="GET", headers=(), with_headers=False, raw=False):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http", "http_version": "1.1", "method": method, "path": path, "raw_path": path.encode(),
+        "root_path": "", "scheme": "http", "query_string": query, "headers": list(headers), "server": ("test", 80),
+    }
+    asyncio.run(application(scope, receive, send))
+    status = messages[0]["status"]
+    body = b"".join(m.get("body", b"") for m in messages[1:])
+    data = body if raw else json.loads(body) if body else None
+    if with_headers:
+        return status, data, {name.decode(): value.decode() for name, value in messages[0]["headers"]}
+    return status, data
+
+def test_async_capsule_route_pages_entries():
+    capsule_id = db.create_capsule("Async Capsule", "desc", datetime.now(UTC), [])
+    for i in range(3):
+        db.create_entry(capsule_id, datetime.now(UTC), json.dumps({"n": i}))
+    status, data = call(f"/api/capsule/{capsule_id}", b"limit=2")
+    assert status == 200
+    assert data["capsule_name"] == "Async Capsule"
+    assert len(data["entries"]) == 2 and data["next_cursor"]
+    status, _ = call("/api/capsule/missing")
+    assert status == 404
+
+def test_async_entry_details_and_wsgi_fallback():
+    capsule_id = db.create_capsule("Async Capsule", "desc", datetime.now(UTC), [])
+    a = db.create_entry(capsule_id, datetime.now(UTC), json.dumps({"n": 1}))
+    b = db.create_entry(capsule_id, datetime.now(UTC), json.dumps({"n": 2}))
+    db.link_entry_to_entry(a, b)
+    db.tag_entry(a, "testtag")
+    status, data = call(f"/api/entries/{a}")
+    assert status == 200
+    assert [e["id"] for e in data["linked_entries"]] == [b]
+    assert data["tags"] == [{"id": data["tags"][0]["id"], "name": "testtag"}]
+    # Routes without an async handler go through the Flask app
+    status, data = call("/api/entries/search", b"tag=testtag")
+    assert status == 200
+    assert [e["id"] for e in data["entries"]] == [a]
+
+def test_async_routes_send_etags_and_db_headers():
+    capsule_id = db.create_capsule("Async Capsule", "desc", datetime.now(UTC), [])
+    entry_id = db.create_entry(capsule_id, datetime.now(UTC), json.dumps({"n": 1}))
+    for path in (f"/api/capsule/{capsule_id}", f"/api/entries/{entry_id}"):
+        status, _, headers = call(path, with_headers=True)
+        assert status == 200 and headers["cache-control"] == "no-cache" and "x-db-calls" in headers
+        etag = headers["etag"]
+        status, body, headers = call(path, headers=[(b"if-none-match", etag.encode())], with_headers=True)
+        assert status == 304 and body is None and headers["x-db-calls"] == "0"
+    db.tag_entry(entry_id, "late")
+    status, data = call(f"/api/entries/{entry_id}", headers=[(b"if-none-match", etag.encode())])
+    assert status == 200 and [t["name"] for t in data["tags"]] == ["late"]
+    # The Flask view issues the same tag for the same variant
+    with app.test_client() as client:
+        flask_etag = client.get(f"/api/capsule/{capsule_id}?limit=5").headers["ETag"]
+    assert call(f"/api/capsule/{capsule_id}", b"limit=5", with_headers=True)[2]["etag"] == flask_etag
+
+def test_async_and_flask_bodies_match_for_an_etag():
+    capsule_id = db.create_capsule("Async Capsule", "desc", datetime.now(UTC), [])
+    entry_id = db.create_entry(capsule_id, datetime.now(UTC), json.dumps({"b": 1, "a": "é"}))
+    db.tag_entry(entry_id, "testtag")
+    with app.test_client() as client:
+        response = client.get(f"/api/entries/{entry_id}")
+    get_response_cache().clear()
+    status, body, headers = call(f"/api/entries/{entry_id}", with_headers=True, raw=True)
+    assert status == 200
+    assert headers["etag"] == response.headers["ETag"]
+    assert body == response.get_data()
@@ -0,0 +1,43 @@
+import json
+import pytest
+from datetime import datetime, UTC
+import db
+from recall import app
+
+def make_entries(count):
+    capsule_id = db.create_capsule("Bulk Edge Capsule", "desc", datetime.now(UTC), [])
+    return [db.create_entry(capsule_id, datetime.now(UTC), json.dumps({"n": i})) for i in range(count)]
+
+def test_tag_entries_counts_created_and_existing():
+    ids = make_entries(5)
+    db.tag_entry(ids[0], "testtag_a")
+    pairs = [(entry_id, "testtag_a") for entry_id in ids] + [(ids[1], "testtag_b"), (ids[1], "testtag_b"), ("missing", "testtag_a")]
+    counts = db.tag_entries(pairs, batch_size=2)
+    assert counts == {"created": 5, "existing": 1, "missing": 1, "duplicates": 1, "batches": 4}
+    assert {e["id"] for e in db.filter_entries_by_tag("testtag_a")} == set(ids)
+    assert db.tag_entries(pairs)["existing"] == 6
+
+def test_link_entries_counts_created_and_existing():
+    ids = make_entries(4)
+    db.link_entry_to_entry(ids[0], ids[1])
+    counts = db.link_entries([(ids[0], ids[1]), (ids[0], ids[2]), (ids[2], ids[3]), (ids[3], "missing")])
+    assert counts == {"created": 2, "existing": 1, "missing": 1, "duplicates": 0, "batches": 1}
+    assert {e["id"] for e in db.get_linked_entries(ids[0])} == {ids[1], ids[2]}
+
+def test_tag_and_template_names_are_unique():
+    assert db.create_tag("testtag_unique") == db.create_tag("testtag_unique")
+    first = db.create_template("tpl_unique", "{}")
+    assert db.create_template("tpl_unique", "{}") == first
+    with pytest.raises(ValueError, match="different structure"):
+        db.create_template("tpl_unique", '{"other": 1}')
+    assert db.get_template_by_name("tpl_unique")["structure"] == "{}"
+
+def test_bulk_edge_endpoints():
+    ids = make_entries(3)
+    with app.test_client() as client:
+        response = client.post("/api/entries/tags/bulk", json={"pairs": [{"entry_id": ids[0], "tag": "testtag_api"}]})
+        assert response.get_json()["created"] == 1
+        response = client.post("/api/entries/links/bulk?batch_size=1", json=[[ids[0], ids[1]], [ids[1], ids[2]]])
+        assert response.get_json()["batches"] == 2
+        assert client.post("/api/entries/links/bulk", json={"pairs": [[ids[0]]]}).status_code == 400
+        assert client.post("/api/entries/tags/bulk?batch_size=0", json=[]).status_code == 400
@@ -0,0 +1,58 @@
+from cache import LRUCache, ReadThroughCache, VersionCounters
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.stats()["evictions"] == 1
+
+def test_lru_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = LRUCache(10, ttl=5, clock=clock)
+    cache.set("a", 1)
+    clock.now = 4.9
+    assert cache.get("a") == 1
+    clock.now = 5.0
+    assert cache.get("a") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["expirations"]) == (1, 1, 1)
+
+def test_read_through_loads_once_and_invalidates():
+    calls = []
+    def loader(key):
+        calls.append(key)
+        return {"id": key, "fields": [{"name": "x"}]} if key != "missing" else None
+    cache = ReadThroughCache(LRUCache(10), "capsule")
+    first = cache.get_or_load("c1", loader)
+    first["fields"].append({"name": "mutated"})
+    assert cache.get_or_load("c1", loader)["fields"] == [{"name": "x"}]
+    assert calls == ["c1"]
+    cache.invalidate("c1")
+    cache.get_or_load("c1", loader)
+    assert calls == ["c1", "c1"]
+    assert cache.get_or_load("missing", loader) is None
+    assert cache.get_or_load("missing", loader) is None
+    assert calls.count("missing") == 2
+
+def test_local_versions_roll_over_after_ttl():
+    clock = FakeClock()
+    versions = VersionCounters(ttl=60, clock=clock)
+    first = versions.version("c1")
+    clock.now = 59.9
+    assert versions.version("c1") == first
+    clock.now = 60.0
+    assert versions.version("c1") != first
+    rolled, other = versions.version("c1"), versions.version("c2")
+    versions.bump("c1")
+    assert versions.version("c1") != rolled and versions.version("c2") == other
@@ -0,0 +1,45 @@
+import json
+import re
+from datetime import datetime, timedelta, UTC
+import db
+import recall
+from recall import app
+
+def make_capsule(count):
+    capsule_id = db.create_capsule("View Capsule", "desc", datetime.now(UTC), [{"name": "n", "type": "int"}])
+    start = datetime(2025, 1, 1, tzinfo=UTC)
+    rows = [(start + timedelta(seconds=i), json.dumps({"n": i})) for i in range(count)]
+    db.create_entries_batch(capsule_id, rows)
+    return capsule_id
+
+def cells(html):
+    return [int(n) for n in re.findall(r"<td>(\d+)</td>", html)]
+
+def next_url(html):
+    match = re.search(r'data-next="([^"]+)"', html)
+    return match.group(1).replace("&amp;", "&") if match else None
+
+def test_page_renders_first_page_and_streams_the_rest(monkeypatch):
+    monkeypatch.setattr(recall, "VIEW_PAGE_SIZE", 4)
+    capsule_id = make_capsule(10)
+    with app.test_client() as client:
+        page = client.get(f"/capsule/{capsule_id}").get_data(as_text=True)
+        assert cells(page) == [0, 1, 2, 3]
+        seen, url = cells(page), next_url(page)
+        while url:
+            fragment = client.get(url)
+            assert fragment.status_code == 200 and fragment.is_streamed
+            html = fragment.get_data(as_text=True)
+            assert "<html" not in html and "No entries" not in html
+            seen += cells(html)
+            url = next_url(html)
+        assert seen == list(range(10))
+
+def test_empty_capsule_and_bad_requests():
+    capsule_id = make_capsule(0)
+    with app.test_client() as client:
+        page = client.get(f"/capsule/{capsule_id}").get_data(as_text=True)
+        assert "No entries in this capsule." in page and next_url(page) is None
+        assert client.get(f"/capsule/{capsule_id}/entries?after=bogus").status_code == 400
+        assert client.get(f"/capsule/{capsule_id}/entries?limit=0").status_code == 400
+        assert client.get("/capsule/missing/entries").status_code == 404
@@ -49,6 +49,8 @@ def cleanup_db():
     # Clean up all test capsules and related entries after each test
     from src.backend import db
     yield
+    if db.get_backend().name != 'neo4j':
+        return
     # Remove all capsules with names starting with 'pytest_capsule' or 'Test Capsule' or similar
     with db.get_graph_driver() as driver:
         with driver.session() as session:
@@ -0,0 +1,63 @@
+import json
+from datetime import datetime, UTC
+import db
+from deletion import get_deletion_jobs
+from recall import app
+
+def make_capsule(count=5):
+    capsule_id = db.create_capsule("Doomed Capsule", "desc", datetime.now(UTC), [])
+    entry_ids = [db.create_entry(capsule_id, datetime.now(UTC), json.dumps({"n": i})) for i in range(count)]
+    for entry_id in entry_ids[:2]:
+        db.create_snapshot(entry_id, datetime.now(UTC), {"n": 0})
+        db.create_snapshot(entry_id, datetime.now(UTC), {"n": 1})
+    db.tag_entry(entry_ids[0], "doomed")
+    return capsule_id, entry_ids
+
+def test_delete_cascades_in_batches():
+    capsule_id, entry_ids = make_capsule()
+    keeper = db.create_capsule("Keeper", "desc", datetime.now(UTC), [])
+    survivor = db.create_entry(keeper, datetime.now(UTC), json.dumps({"n": 0}))
+    db.link_entry_to_entry(survivor, entry_ids[0])
+    assert db.mark_capsule_deleted(capsule_id)
+    assert db.get_capsule_by_id(capsule_id) is None
+    assert db.get_backend().get_deleted_capsule_ids() == [capsule_id]
+    batches = []
+    assert db.purge_capsule(capsule_id, batch_size=2, progress=lambda *totals: batches.append(totals)) == (5, 4)
+    assert batches == [(2, 4), (4, 4), (5, 4)]
+    assert all(db.get_entry_by_id(entry_id) is None for entry_id in entry_ids)
+    assert db.get_backend().get_deleted_capsule_ids() == []
+    assert db.get_linked_entries(survivor) == [] and db.filter_entries_by_tag("doomed") == []
+    assert db.get_entries_by_capsule(keeper)[0]["id"] == survivor
+    assert not db.delete_capsule(capsule_id)
+
+def test_entries_vanish_from_reads_before_the_purge():
+    capsule_id, entry_ids = make_capsule(count=2)
+    keeper = db.create_capsule("Keeper", "desc", datetime.now(UTC), [])
+    survivor = db.create_entry(keeper, datetime.now(UTC), json.dumps({"n": 0}))
+    db.link_entry_to_entry(survivor, entry_ids[0])
+    db.create_entry(capsule_id, datetime.now(UTC), json.dumps({"note": "abandoned"}))
+    assert len(db.search_entries_by_text("abandoned")) == 1
+    assert db.mark_capsule_deleted(capsule_id)
+    assert db.get_entry_by_id(entry_ids[0]) is None
+    assert db.get_entries_by_capsule(capsule_id) == []
+    assert db.get_linked_entries(survivor) == []
+    assert db.filter_entries_by_tag("doomed") == []
+    assert db.search_entries_by_text("abandoned") == []
+    assert db.search_entries_combined(tag="doomed") == []
+    assert db.search_entries_combined(linked_to=survivor) == []
+    assert db.get_tag_counts() == []
+
+def test_delete_endpoint_runs_a_background_job(monkeypatch):
+    capsule_id, entry_ids = make_capsule()
+    monkeypatch.setattr(get_deletion_jobs(), "batch_size", 2)
+    monkeypatch.setattr(get_deletion_jobs(), "pause", 0)
+    with app.test_client() as client:
+        response = client.post(f"/api/capsule/{capsule_id}/delete")
+        assert response.status_code == 200 and response.get_json()["job"]["capsule_id"] == capsule_id
+        assert client.get(f"/api/capsule/{capsule_id}").status_code == 404
+        assert get_deletion_jobs().get(capsule_id).wait(timeout=5)
+        status = client.get(f"/api/capsule/{capsule_id}/delete").get_json()
+        assert status["status"] == "done" and status["entries_deleted"] == 5 and status["batches"] == 3
+        assert db.get_entry_by_id(entry_ids[-1]) is None
+        assert client.post(f"/api/capsule/{capsule_id}/delete").status_code == 404
+        assert client.get("/api/capsule/missing/delete").status_code == 404
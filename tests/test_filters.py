@@ -0,0 +1,119 @@
+import json
+from datetime import datetime, timedelta, UTC
+import pytest
+import db
+from entry_storage import field_index_name, split_properties
+from filters import parse_filters
+from recall import app
+
+FIELDS = [
+    {"name": "temperature", "type": "int"},
+    {"name": "ok", "type": "boolean"},
+    {"name": "sensor", "type": "string"},
+]
+
+def make_capsule(storage_mode, count=10):
+    capsule_id = db.create_capsule("Filter Capsule", "desc", datetime.now(UTC), FIELDS, storage_mode=storage_mode)
+    start = datetime(2025, 1, 1, tzinfo=UTC)
+    for i in range(count):
+        properties = {"temperature": i * 5, "ok": i % 2 == 0, "sensor": f"s{i % 3}", "note": {"raw": i}}
+        db.create_entry(capsule_id, start + timedelta(minutes=i), json.dumps(properties))
+    return capsule_id
+
+def test_parse_filters_types_and_operators():
+    query = "temperature%3E%3D30&ok=true&sensor!=s1&limit=5"
+    assert parse_filters(query, FIELDS, ("limit",)) == [("temperature", ">=", 30), ("ok", "=", True), ("sensor", "!=", "s1")]
+    with pytest.raises(ValueError):
+        parse_filters("humidity>3", FIELDS)
+    with pytest.raises(ValueError):
+        parse_filters("temperature>warm", FIELDS)
+    with pytest.raises(ValueError):
+        parse_filters("ok>true", FIELDS)
+
+def test_split_keeps_mistyped_values_in_overflow():
+    overflow, native = split_properties(FIELDS, json.dumps({"temperature": "30", "ok": False, "extra": 1}))
+    assert native == {"f_ok": False}
+    assert json.loads(overflow) == {"temperature": "30", "extra": 1}
+
+def test_field_index_names_stay_distinct():
+    assert field_index_name("Temp C") != field_index_name("temp_c")
+    assert field_index_name("Temp C") == field_index_name("Temp C")
+    assert field_index_name("temp_c").startswith("entry_field_temp_c_")
+
+@pytest.mark.parametrize("storage_mode", ["native", "json"])
+def test_filtered_pages_match_in_either_mode(storage_mode):
+    capsule_id = make_capsule(storage_mode)
+    filters = [("temperature", ">", 10), ("ok", "=", True)]
+    seen, cursor = [], None
+    while True:
+        page, cursor = db.get_entries_filtered(capsule_id, filters, limit=2, after=cursor)
+        seen.extend(json.loads(entry["properties"])["temperature"] for entry in page)
+        if cursor is None:
+            break
+    assert seen == [20, 30, 40]
+
+def test_native_reads_return_the_written_properties():
+    capsule_id = make_capsule("native", count=1)
+    entry = db.get_entries_by_capsule(capsule_id)[0]
+    assert json.loads(entry["properties"]) == {"temperature": 0, "ok": True, "sensor": "s0", "note": {"raw": 0}}
+    assert not any(key.startswith("f_") for key in entry)
+
+def test_migration_moves_entries_to_native():
+    capsule_id = make_capsule("json", count=7)
+    before = db.get_entries_by_capsule(capsule_id)
+    assert db.migrate_capsule_storage(capsule_id, batch_size=3) == 7
+    assert db.get_capsule_by_id(capsule_id)["storage_mode"] == "native"
+    after = db.get_entries_by_capsule(capsule_id)
+    assert [json.loads(e["properties"]) for e in after] == [json.loads(e["properties"]) for e in before]
+    if db.get_backend().name != "memory":
+        return
+    stored = db.get_backend().entries[after[0]["id"]]
+    assert stored["f_temperature"] == 0 and "temperature" not in json.loads(stored["properties"])
+
+def test_writes_ignore_a_stale_cached_storage_mode():
+    capsule_id = make_capsule("json", count=1)
+    assert db.get_capsule_by_id(capsule_id)["storage_mode"] == "json"
+    # Another process starts the migration; this worker's capsule cache still says json
+    db.get_backend().set_capsule_storage_mode(capsule_id, "migrating")
+    entry_id = db.create_entry(capsule_id, datetime(2025, 2, 1, tzinfo=UTC), json.dumps({"temperature": 99}))
+    assert db.get_capsule_by_id(capsule_id)["storage_mode"] == "json"
+    if db.get_backend().name != "memory":
+        return
+    assert db.get_backend().entries[entry_id]["f_temperature"] == 99
+
+def test_filter_endpoint():
+    capsule_id = make_capsule("native")
+    with app.test_client() as client:
+        response = client.get(f"/api/capsule/{capsule_id}/entries?temperature>=35&sensor=s1&limit=5")
+        assert response.status_code == 200
+        data = response.get_json()
+        assert [json.loads(e["properties"])["temperature"] for e in data["entries"]] == [35]
+        assert data["next_cursor"] is None
+        assert client.get(f"/api/capsule/{capsule_id}/entries?unknown=1").status_code == 400
+        assert client.get("/api/capsule/missing/entries?temperature>1").status_code == 404
+
+@pytest.mark.parametrize("storage_mode", ["native", "json"])
+def test_time_range_bounds_pages(storage_mode):
+    capsule_id = make_capsule(storage_mode)
+    start, end = datetime(2025, 1, 1, 0, 3, tzinfo=UTC), datetime(2025, 1, 1, 0, 7, tzinfo=UTC)
+    page, _ = db.get_entries_filtered(capsule_id, [], limit=10, start=start, end=end)
+    assert [json.loads(e["properties"])["temperature"] for e in page] == [15, 20, 25, 30]
+    page, _ = db.get_entries_filtered(capsule_id, [("ok", "=", True)], limit=10, start=start)
+    assert [json.loads(e["properties"])["temperature"] for e in page] == [20, 30, 40]
+
+def test_timeline_endpoint():
+    capsule_id = db.create_capsule("Timeline Capsule", "desc", datetime.now(UTC), [])
+    start = datetime(2025, 3, 1, 22, 30, tzinfo=UTC)
+    for i in range(6):
+        db.create_entry(capsule_id, start + timedelta(minutes=40 * i), json.dumps({"n": i}))
+    with app.test_client() as client:
+        hours = client.get(f"/api/capsule/{capsule_id}/timeline?bucket=hour").get_json()
+        assert [b["count"] for b in hours["buckets"]] == [1, 2, 1, 2] and hours["total"] == 6
+        assert hours["buckets"][0]["start"].startswith("2025-03-01T22:00:00")
+        days = client.get(f"/api/capsule/{capsule_id}/timeline?bucket=day&from=2025-03-01T23:00:00Z")
+        assert [b["count"] for b in days.get_json()["buckets"]] == [2, 3]
+        ranged = client.get(f"/api/capsule/{capsule_id}/entries?from=2025-03-02T00:00:00&to=2025-03-02T01:00:00")
+        assert [json.loads(e["properties"])["n"] for e in ranged.get_json()["entries"]] == [3]
+        assert client.get(f"/api/capsule/{capsule_id}/timeline?bucket=week").status_code == 400
+        assert client.get(f"/api/capsule/{capsule_id}/entries?from=2025-03-02&to=2025-03-01").status_code == 400
+        assert client.get("/api/capsule/missing/timeline").status_code == 404
@@ -0,0 +1,75 @@
+import json
+from datetime import datetime, timedelta, UTC
+import db
+from recall import app
+
+def make_capsule(count=6):
+    fields = [{"name": "title", "type": "string"}]
+    capsule_id = db.create_capsule("Graph Capsule", "desc", datetime.now(UTC), fields)
+    other_id = db.create_capsule("Other Capsule", "desc", datetime.now(UTC), fields)
+    start = datetime(2025, 1, 1, tzinfo=UTC)
+    ids = [
+        db.create_entry(capsule_id, start + timedelta(minutes=i), json.dumps({"title": f"t{i}"}))
+        for i in range(count)
+    ]
+    outside = db.create_entry(other_id, start, json.dumps({"title": "elsewhere"}))
+    for target in ids[1:]:
+        db.link_entry_to_entry(ids[0], target)
+    db.link_entry_to_entry(ids[1], outside)
+    db.tag_entry(ids[0], "hub")
+    db.tag_entry(ids[1], "hub")
+    db.create_snapshot(ids[2], start, json.dumps({"v": 1}))
+    return capsule_id, ids
+
+def get_graph(client, capsule_id, query=""):
+    response = client.get(f"/api/capsules/{capsule_id}/graph{query}")
+    return response, json.loads(response.get_data(as_text=True)) if response.status_code == 200 else None
+
+def test_graph_elements_are_cytoscape_compatible():
+    capsule_id, ids = make_capsule()
+    with app.test_client() as client:
+        _, graph = get_graph(client, capsule_id, "?snapshots=true")
+    nodes = [e["data"] for e in graph["elements"] if e["group"] == "nodes"]
+    edges = [e["data"] for e in graph["elements"] if e["group"] == "edges"]
+    assert [n["id"] for n in nodes if n["type"] == "entry"] == ids
+    assert nodes[0]["label"] == "t0"
+    assert {n["id"] for n in nodes if n["type"] != "entry"} >= {"tag:hub"}
+    assert sum(1 for e in edges if e["type"] == "LINKS_TO") == len(ids) - 1
+    assert sum(1 for e in edges if e["type"] == "TAGGED_AS") == 2
+    assert sum(1 for e in edges if e["type"] == "HAS_SNAPSHOT") == 1
+    node_ids = {n["id"] for n in nodes}
+    assert all(e["source"] in node_ids and e["target"] in node_ids for e in edges)
+    assert graph["node_count"] == len(nodes) and graph["edge_count"] == len(edges)
+    assert graph["truncated"] is False
+
+def test_graph_caps_and_prunes_by_degree():
+    capsule_id, ids = make_capsule()
+    with app.test_client() as client:
+        _, first = get_graph(client, capsule_id, "?limit=2")
+        _, hubs = get_graph(client, capsule_id, "?limit=2&prune=degree")
+        _, sample = get_graph(client, capsule_id, "?limit=3&prune=sample&seed=7")
+        assert client.get(f"/api/capsules/{capsule_id}/graph?prune=random").status_code == 400
+    entry_ids = lambda graph: [e["data"]["id"] for e in graph["elements"] if e["data"].get("type") == "entry"]
+    assert entry_ids(first) == ids[:2] and first["truncated"] is True
+    assert entry_ids(hubs) == ids[:2]
+    assert len(entry_ids(sample)) == 3 and sample["truncated"] is True
+
+def test_graph_etag_and_invalidation():
+    capsule_id, ids = make_capsule()
+    with app.test_client() as client:
+        first, graph = get_graph(client, capsule_id)
+        assert first.headers["ETag"]
+        cached, _ = get_graph(client, capsule_id)
+        etag = cached.headers["ETag"]
+        assert etag == first.headers["ETag"] and cached.headers["X-DB-Calls"] == "0"
+        again = client.get(f"/api/capsules/{capsule_id}/graph", headers={"If-None-Match": etag})
+        assert again.status_code == 304
+        db.tag_entry(ids[3], "late")
+        changed, graph = get_graph(client, capsule_id)
+        assert changed.status_code == 200 and changed.headers["ETag"] != etag
+        assert any(e["data"]["id"] == "tag:late" for e in graph["elements"])
+        etag = get_graph(client, capsule_id, "?snapshots=true")[0].headers["ETag"]
+        db.create_snapshot(ids[3], datetime(2025, 2, 1, tzinfo=UTC), json.dumps({"v": 2}))
+        assert client.get(f"/api/capsules/{capsule_id}/graph?snapshots=true",
+                          headers={"If-None-Match": etag}).status_code == 200
+        assert client.get("/api/capsules/missing/graph").status_code == 404
@@ -0,0 +1,60 @@
+import json
+from datetime import datetime, UTC
+import db
+from cache import ResponseCache
+from recall import app
+
+def make_capsule():
+    capsule_id = db.create_capsule("Cached Capsule", "desc", datetime.now(UTC), [])
+    first = db.create_entry(capsule_id, datetime.now(UTC), json.dumps({"n": 1}))
+    second = db.create_entry(capsule_id, datetime.now(UTC), json.dumps({"n": 2}))
+    return capsule_id, first, second
+
+def test_unchanged_polls_skip_the_database():
+    capsule_id, _, _ = make_capsule()
+    with app.test_client() as client:
+        first = client.get(f"/api/capsule/{capsule_id}")
+        etag = first.headers["ETag"]
+        assert first.headers["Cache-Control"] == "no-cache"
+        unchanged = client.get(f"/api/capsule/{capsule_id}", headers={"If-None-Match": etag})
+        assert unchanged.status_code == 304 and unchanged.headers["X-DB-Calls"] == "0"
+        cached = client.get(f"/api/capsule/{capsule_id}")
+        assert cached.headers["X-DB-Calls"] == "0" and cached.get_data() == first.get_data()
+        paged = client.get(f"/api/capsule/{capsule_id}?limit=1")
+        assert paged.headers["ETag"] != etag
+        db.create_entry(capsule_id, datetime.now(UTC), json.dumps({"n": 3}))
+        changed = client.get(f"/api/capsule/{capsule_id}", headers={"If-None-Match": etag})
+        assert changed.status_code == 200 and len(changed.get_json()["entries"]) == 3
+
+def test_capsule_list_and_missing_capsules():
+    with app.test_client() as client:
+        etag = client.get("/api/capsules").headers["ETag"]
+        assert client.get("/api/capsules", headers={"If-None-Match": etag}).status_code == 304
+        capsule_id, _, _ = make_capsule()
+        listing = client.get("/api/capsules", headers={"If-None-Match": etag})
+        assert listing.status_code == 200 and listing.get_json()["capsules"][0]["id"] == capsule_id
+        db.delete_capsule(capsule_id)
+        missing = client.get(f"/api/capsule/{capsule_id}")
+        assert missing.status_code == 404 and "ETag" not in missing.headers
+
+def test_link_endpoints_follow_link_writes():
+    _, first, second = make_capsule()
+    with app.test_client() as client:
+        response = client.get(f"/api/entries/{first}/links_recursive")
+        etag = response.headers["ETag"]
+        assert response.get_json()["linked_entries_recursive"] == []
+        assert client.get(f"/api/entries/{first}/links_recursive", headers={"If-None-Match": etag}).status_code == 304
+        db.link_entry_to_entry(first, second)
+        linked = client.get(f"/api/entries/{first}/links", headers={"If-None-Match": etag})
+        assert [e["id"] for e in linked.get_json()["linked_entries"]] == [second]
+        db.delete_entry(second)
+        assert client.get(f"/api/entries/{first}/links").get_json()["linked_entries"] == []
+
+def test_response_cache_is_bounded_by_bytes():
+    cache = ResponseCache(max_bytes=10, max_body_bytes=6)
+    cache.set("a", b"1234")
+    cache.set("b", b"5678")
+    cache.set("too-big", b"1234567")
+    cache.set("c", b"901")
+    assert cache.get("a") is None and cache.get("b") == b"5678" and cache.get("too-big") is None
+    assert cache.stats()["bytes"] == 7 and cache.stats()["evictions"] == 1
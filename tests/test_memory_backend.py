@@ -0,0 +1,55 @@
+import json
+from datetime import datetime, timedelta, UTC
+from storage.memory import MemoryBackend
+
+def make_entries(backend, count):
+    capsule_id = backend.create_capsule("Mem Capsule", "desc", datetime.now(UTC), [{"name": "n", "type": "int"}])
+    start = datetime(2025, 1, 1, tzinfo=UTC)
+    ids = [
+        backend.create_entry(capsule_id, start + timedelta(minutes=i), json.dumps({"n": i, "word": f"w{i % 3}"}))
+        for i in range(count)
+    ]
+    return capsule_id, ids
+
+def test_pages_follow_timestamp_order():
+    backend = MemoryBackend()
+    capsule_id, ids = make_entries(backend, 7)
+    seen = []
+    cursor = None
+    while True:
+        page, cursor = backend.get_entries_page(capsule_id, 3, after=cursor)
+        seen.extend(entry["id"] for entry in page)
+        if cursor is None:
+            break
+    assert seen == ids
+    assert [e["id"] for e in backend.iter_entries_by_capsule(capsule_id)] == ids
+
+def test_delete_entry_detaches_edges_and_index():
+    backend = MemoryBackend()
+    capsule_id, (a, b, c) = make_entries(backend, 3)
+    backend.link_entry_to_entry(a, b)
+    backend.link_entry_to_entry(c, a)
+    backend.tag_entry(a, "important")
+    backend.delete_entry(a)
+    assert backend.get_entry_by_id(a) is None
+    assert backend.get_linked_entries(c) == []
+    assert backend.filter_entries_by_tag("important") == []
+    assert backend.search_entries("0") == []
+    assert [e["id"] for e in backend.get_entries_by_capsule(capsule_id)] == [b, c]
+
+def test_traversal_and_combined_search():
+    backend = MemoryBackend()
+    _, (a, b, c, d) = make_entries(backend, 4)
+    backend.link_entry_to_entry(a, b)
+    backend.link_entry_to_entry(b, c)
+    backend.link_entry_to_entry(c, a)
+    hits, truncated = backend.traverse_linked_entries(a, max_depth=5)
+    assert [(hit["entry"]["id"], hit["depth"]) for hit in hits] == [(b, 1), (c, 2)]
+    assert not truncated
+    backend.tag_entry(b, "x")
+    backend.tag_entry(d, "x")
+    both = backend.search_entries_combined(tag="x", linked_to=a, mode="and")
+    assert [entry["id"] for entry, _ in both] == [b]
+    either = backend.search_entries_combined(text="w0", tag="x", mode="or")
+    assert {entry["id"] for entry, _ in either} == {a, b, d}
+    assert either[-1] == (backend.get_entry_by_id(b), 0.0)
@@ -0,0 +1,86 @@
+import json
+from datetime import datetime, UTC
+import db
+import metrics
+from recall import app
+
+class FakeSummary:
+    result_available_after = 700
+    result_consumed_after = 50
+
+class FakeResult:
+    def __init__(self, tx=None):
+        self.tx = tx
+
+    def consume(self):
+        if self.tx is not None and self.tx.closed:
+            raise RuntimeError("the result is out of scope")
+        return FakeSummary()
+
+class FakeTransaction:
+    closed = False
+
+    def run(self, query, parameters=None, **kwargs):
+        return FakeResult(self)
+
+class FakeSession:
+    def run(self, query, parameters=None, **kwargs):
+        return FakeResult()
+
+    def execute_write(self, work):
+        tx = FakeTransaction()
+        try:
+            return work(tx)
+        finally:
+            tx.closed = True
+
+def test_calls_are_counted_once_per_outer_call():
+    registry = metrics.get_metrics()
+    registry.clear()
+    capsule_id = db.create_capsule("Metrics Capsule", "desc", datetime.now(UTC), [])
+    db.create_entry(capsule_id, datetime.now(UTC), json.dumps({"a": 1}))
+    assert db.get_entries_by_capsule(capsule_id)
+    assert registry.calls[("create_entry", "none")] == 1
+    assert ("get_capsule_by_id", "none") not in registry.calls
+    assert registry.rows[("get_entries_by_capsule", "none")] == 1
+    assert sum(1 for _ in db.iter_entries_by_capsule(capsule_id)) == 1
+    assert registry.rows[("iter_entries_by_capsule", "none")] == 1
+
+def test_request_headers_and_prometheus_export():
+    metrics.get_metrics().clear()
+    db.create_capsule("Metrics Capsule", "desc", datetime.now(UTC), [])
+    with app.test_client() as client:
+        response = client.get("/api/capsules")
+        assert response.headers["X-DB-Calls"] == "1"
+        assert response.headers["X-DB-Queries"] == "0"
+        assert float(response.headers["X-DB-Time"]) >= 0
+        text = client.get("/metrics").get_data(as_text=True)
+    assert 'recall_db_calls_total{function="get_all_capsules",route="/api/capsules"} 1' in text
+    assert 'recall_db_call_seconds_bucket{function="get_all_capsules",route="/api/capsules",le="+Inf"} 1' in text
+
+def test_slow_queries_are_logged_with_parameter_shapes(capsys):
+    registry = metrics.get_metrics()
+    registry.clear()
+    session = metrics.TrackedSession(FakeSession())
+    session.run("MATCH (e:Entry {id: $id})\n RETURN e", id="secret-id", rows=[{"a": 1}, {"a": 2}])
+    session.finish()
+    assert registry.slow_queries[("unknown", "none")] == 1
+    out = capsys.readouterr().out
+    assert "MATCH (e:Entry {id: $id}) RETURN e" in out
+    assert '"rows": "list[2] of {\\"a\\": \\"int\\"}"' in out and "secret-id" not in out
+
+def test_transaction_statements_are_recorded():
+    registry = metrics.get_metrics()
+    registry.clear()
+    stats = metrics.begin_request("/write")
+    try:
+        session = metrics.TrackedSession(FakeSession())
+        def write(tx):
+            tx.run("UNWIND $rows AS row CREATE (:Entry {id: row.id})", rows=[{"id": "a"}])
+            tx.run("MATCH (e:Entry) RETURN count(e)")
+            return "done"
+        assert session.execute_write(write) == "done"
+        session.finish()
+    finally:
+        metrics.end_request()
+    assert registry.queries[("unknown", "/write")] == 2 and stats.queries == 2
@@ -0,0 +1,18 @@
+from contextlib import contextmanager
+from pool import DriverPool
+
+class FakeDriver:
+    @contextmanager
+    def session(self, **kwargs):
+        yield object()
+
+def test_pool_counters_are_named_as_estimates():
+    pool = DriverPool("bolt://unused", "neo4j", "secret", max_pool_size=1)
+    pool._driver = FakeDriver()
+    with pool.session():
+        with pool.session():
+            assert pool.stats()["in_use"] == 2
+    stats = pool.stats()
+    assert stats["in_use"] == 0 and stats["acquired_total"] == 2
+    assert stats["sessions_high_water"] == 2 and stats["saturated_requests"] == 1
+    assert "idle" not in stats and "waits" not in stats
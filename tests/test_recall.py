@@ -24,6 +24,8 @@ def cleanup_db():
     sys.modules['db'] = db
     spec.loader.exec_module(db)
     yield
+    if db.get_backend().name != 'neo4j':
+        return
     with db.get_graph_driver() as driver:
         with driver.session() as session:
             session.run("""
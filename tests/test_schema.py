@@ -0,0 +1,110 @@
+from contextlib import contextmanager
+import pytest
+import db
+import schema
+
+class RecordingBackend:
+    """Runs migrations against an in-process list of statements instead of a Neo4j server."""
+
+    def __init__(self, version=0):
+        self.version = version
+        self.statements = []
+        self.calls = []
+
+    @contextmanager
+    def session(self):
+        yield self
+
+    def run(self, statement, **params):
+        backend = self
+
+        class Result:
+            def single(self):
+                return {"version": backend.version}
+
+            def consume(self):
+                if "SchemaVersion" in statement:
+                    backend.version = params["version"]
+                else:
+                    backend.statements.append(statement)
+
+        return Result()
+
+    def backfill_search_index(self):
+        self.calls.append("backfill")
+
+    def merge_duplicate_tags(self):
+        self.calls.append("merge_tags")
+
+    def merge_duplicate_templates(self):
+        self.calls.append("merge_templates")
+
+    def recount_tags(self):
+        self.calls.append("recount_tags")
+
+def test_migrations_apply_in_order_once():
+    backend = RecordingBackend()
+    assert schema.migrate(backend) == [version for version, _, _ in schema.MIGRATIONS]
+    assert backend.version == schema.LATEST_VERSION
+    assert backend.calls == ["backfill", "merge_tags", "merge_templates", "recount_tags"]
+    assert any("entry_timestamp" in s for s in backend.statements)
+    assert schema.migrate(backend) == []
+
+def test_migrations_resume_from_recorded_version():
+    backend = RecordingBackend(version=2)
+    assert schema.migrate(backend) == [3, 4, 5, 6, 7, 8]
+    assert backend.calls == ["merge_tags", "merge_templates", "recount_tags"]
+
+def test_source_lookups_are_indexed():
+    assert schema.index_report() == []
+    missing = schema.index_report(indexed=[("Entry", "id")])
+    assert {(label, prop) for _, _, label, prop in missing} >= {("Capsule", "id"), ("Tag", "name"), ("Snapshot", "seq")}
+
+def test_report_covers_where_lookups_and_label_scans(tmp_path):
+    source = tmp_path / "queries.py"
+    source.write_text('''
+UNINDEXED = """
+MATCH (e:Entry) WHERE e.search_text IS NULL
+RETURN e
+"""
+INDEXED = "MATCH (e:Entry) WHERE e.id IN $ids RETURN e"
+SCAN = "MATCH (c:Capsule)-[:HAS_ENTRY]->(e:Entry) RETURN c, e"
+MARKED = "MATCH (c:Capsule) RETURN c  // full scan: lists every capsule"
+EXPANSION = "MATCH (e)-[:HAS_SNAPSHOT]->(s:Snapshot) WHERE s.seq > 1 RETURN s"
+ANCHORED = "MATCH (:Capsule)-[:HAS_ENTRY]->(e:Entry {id: $id}) WHERE e.ts > $start RETURN e"
+''')
+    assert [(line, label, prop) for _, line, label, prop in schema.index_report([str(source)])] == [
+        (3, "Entry", "search_text"), (7, "Capsule", None),
+    ]
+
+def test_check_mode_on_memory_backend(monkeypatch):
+    monkeypatch.setenv("RECALL_SCHEMA", "check")
+    assert db.check_schema() == []
+    assert schema.schema_mode() == "check"
+
+def test_duplicate_templates_merge_before_the_name_constraint():
+    backend = db.get_backend()
+    if backend.name != 'neo4j':
+        pytest.skip("duplicate Template names can only be seeded in Neo4j")
+    with backend.session() as session:
+        session.run("DROP CONSTRAINT template_name_unique IF EXISTS").consume()
+        session.run(
+            """
+            UNWIND ['tpl-dupe-a', 'tpl-dupe-b'] AS id
+            CREATE (tpl:Template {id: id, name: 'tpl-dupe', structure: '{}'})
+            CREATE (:Entry {id: 'entry-' + id})-[:USES_TEMPLATE]->(tpl)
+            """
+        ).consume()
+    try:
+        assert backend.merge_duplicate_templates() == 1
+        with backend.session() as session:
+            rows = session.run(
+                "MATCH (e:Entry)-[:USES_TEMPLATE]->(tpl:Template {name: 'tpl-dupe'}) RETURN e.id AS entry, tpl.id AS tpl"
+            ).data()
+        assert sorted(row["entry"] for row in rows) == ["entry-tpl-dupe-a", "entry-tpl-dupe-b"]
+        assert {row["tpl"] for row in rows} == {"tpl-dupe-a"}
+    finally:
+        with backend.session() as session:
+            session.run("MATCH (e:Entry) WHERE e.id STARTS WITH 'entry-tpl-dupe-' DETACH DELETE e").consume()
+            session.run("MATCH (tpl:Template {name: 'tpl-dupe'}) DETACH DELETE tpl").consume()
+            session.run(schema.MIGRATIONS[2][2][-1]).consume()
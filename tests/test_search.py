@@ -0,0 +1,33 @@
+import json
+from search import InvertedIndex, index_properties, parse_query, to_lucene
+
+def test_index_properties_skips_keys_and_punctuation():
+    fields = index_properties(json.dumps({"title": "Daily Report!", "count": 3, "done": True}))
+    assert fields["search_text"] == "daily report 3 true"
+    assert "title__report" in fields["search_fields"].split()
+    assert "title" not in fields["search_text"].split()
+
+def test_parse_query_field_scoping():
+    terms, field_terms = parse_query('sensor title:"daily report" Count:3')
+    assert terms == ["sensor"]
+    assert field_terms == ["title__daily", "title__report", "count__3"]
+    assert to_lucene('title:x y') == "search_text:y AND search_fields:title__x"
+    assert to_lucene('!!') is None
+
+def test_inverted_index_ranking_and_pagination():
+    index = InvertedIndex()
+    index.add("a", {"title": "report report", "body": "sensor"})
+    index.add("b", {"title": "report", "body": "other"})
+    index.add("c", {"title": "unrelated"})
+    hits = index.search("report")
+    assert [doc_id for doc_id, _ in hits] == ["a", "b"]
+    assert index.search("report", skip=1, limit=1)[0][0] == "b"
+    assert [doc_id for doc_id, _ in index.search("body:sensor")] == ["a"]
+    assert index.search("title:sensor") == []
+
+def test_inverted_index_remove():
+    index = InvertedIndex()
+    index.add("a", {"title": "report"})
+    index.remove("a")
+    assert index.search("report") == []
+    assert len(index) == 0
@@ -0,0 +1,61 @@
+import json
+from datetime import datetime, timedelta, UTC
+import db
+from recall import app
+
+def make_capsule(name, tag_sets, start=datetime(2025, 1, 1, tzinfo=UTC)):
+    capsule_id = db.create_capsule(name, "desc", datetime.now(UTC), [])
+    ids = db.create_entries_batch(capsule_id, [(start + timedelta(minutes=i), json.dumps({"n": i}))
+                                               for i in range(len(tag_sets))])
+    db.tag_entries([(entry_id, tag) for entry_id, tags in zip(ids, tag_sets) for tag in tags])
+    return capsule_id, ids
+
+def counts(capsule_id=None):
+    return {row["name"]: row["entries"] for row in db.get_tag_counts(capsule_id=capsule_id)}
+
+def test_counts_follow_tagging_and_deletes():
+    first, ids = make_capsule("First", [["red", "blue"], ["red"], ["red", "green"]])
+    second, other_ids = make_capsule("Second", [["blue"], ["blue", "red"]])
+    assert db.get_tag_counts() == [{"name": "red", "entries": 4}, {"name": "blue", "entries": 3},
+                                   {"name": "green", "entries": 1}]
+    assert counts(first) == {"red": 3, "blue": 1, "green": 1}
+    db.tag_entry(ids[1], "red")
+    db.tag_entry(ids[1], "blue")
+    assert counts(first)["blue"] == 2 and counts()["red"] == 4
+    db.delete_entry(ids[2])
+    assert counts(first) == {"red": 2, "blue": 2}
+    db.delete_capsule(second)
+    assert counts() == {"red": 2, "blue": 2} and counts(second) == {}
+    assert db.get_tag_counts(limit=1) == [{"name": "blue", "entries": 2}]
+
+def test_cooccurrence_and_intersection():
+    first, ids = make_capsule("First", [["a", "b"], ["a", "b", "c"], ["a"], ["b", "c"]])
+    second, other_ids = make_capsule("Second", [["a", "b"]], start=datetime(2025, 2, 1, tzinfo=UTC))
+    assert db.get_tag_cooccurrence("a") == [{"name": "b", "entries": 3}, {"name": "c", "entries": 1}]
+    assert db.get_tag_cooccurrence("a", capsule_id=second) == [{"name": "b", "entries": 1}]
+    assert [e["id"] for e in db.get_entries_with_tags(["a", "b"])[0]] == ids[:2] + other_ids
+    assert [e["id"] for e in db.get_entries_with_tags(["b", "c", "a"])[0]] == [ids[1]]
+    assert db.get_entries_with_tags(["a", "missing"]) == ([], None)
+    page, cursor = db.get_entries_with_tags(["a", "b"], limit=2, capsule_id=first)
+    assert [e["id"] for e in page] == ids[:2] and cursor is None
+    page, cursor = db.get_entries_with_tags(["a", "b"], limit=2)
+    rest, end = db.get_entries_with_tags(["a", "b"], limit=2, after=cursor)
+    assert [e["id"] for e in page + rest] == ids[:2] + other_ids and end is None
+
+def test_tag_endpoints():
+    capsule_id, ids = make_capsule("Tagged", [["x", "y"], ["x"]])
+    with app.test_client() as client:
+        response = client.get("/api/tags")
+        assert response.get_json()["tags"] == [{"name": "x", "entries": 2}, {"name": "y", "entries": 1}]
+        etag = response.headers["ETag"]
+        assert client.get("/api/tags", headers={"If-None-Match": etag}).status_code == 304
+        db.tag_entry(ids[1], "y")
+        assert client.get("/api/tags", headers={"If-None-Match": etag}).get_json()["tags"][1]["entries"] == 2
+        related = client.get(f"/api/tags/x/related?capsule_id={capsule_id}").get_json()
+        assert related["related"] == [{"name": "y", "entries": 2}]
+        assert client.get("/api/tags/nope/related").status_code == 404
+        both = client.get("/api/tags/entries?tag=x&tag=y").get_json()
+        assert [e["id"] for e in both["entries"]] == ids and both["next_cursor"] is None
+        assert client.get("/api/tags/entries").status_code == 400
+        assert client.get("/api/tags?limit=0").status_code == 400
+        assert 'value="x"' in client.get(f"/capsule/{capsule_id}").get_data(as_text=True)
@@ -0,0 +1,59 @@
+import json
+from datetime import datetime, UTC
+import pytest
+import db
+import template_engine
+from recall import app
+
+STRUCTURE = {
+    "tags": ["checklist"],
+    "entries": [
+        {"properties": {"title": "Step {n} in {capsule}", "priority": "2"}, "tags": ["first"]},
+        {"title": "Review", "priority": 1},
+    ],
+}
+FIELDS = [{"name": "title", "type": "string"}, {"name": "priority", "type": "int"}]
+
+def make_template(structure=STRUCTURE, name="Checklist"):
+    return db.create_template(name, json.dumps(structure))
+
+def test_parse_structure_rejects_malformed_templates():
+    assert len(template_engine.parse_structure(json.dumps(STRUCTURE))) == 2
+    for bad in ("not json", "{}", json.dumps({"entries": [1]}), json.dumps({"entries": [{"properties": {}, "tags": "x"}]})):
+        with pytest.raises(ValueError):
+            template_engine.parse_structure(bad)
+
+def test_apply_creates_entries_tags_and_template_edges_in_batches():
+    template_id = make_template()
+    capsules = [db.create_capsule(f"C{i}", "desc", datetime.now(UTC), FIELDS) for i in range(2)]
+    events = list(template_engine.apply_template(
+        db.get_template(template_id), [db.get_capsule_by_id(c) for c in capsules], repeat=3, batch_size=4
+    ))
+    done = events[-1]
+    assert done["created"] == done["entries"] == 12 and done["template_edges"] == 12
+    assert done["tag_edges"] == 18 and done["tags"] == 2 and done["batches"] == 4
+    entries = db.get_entries_page(capsules[0], limit=10)[0]
+    assert [json.loads(e["properties"])["title"] for e in entries] == ["Step 1 in C0", "Review", "Step 3 in C0"] + \
+        ["Review", "Step 5 in C0", "Review"]
+    assert json.loads(entries[0]["properties"])["priority"] == 2
+    assert sorted(t["name"] for t in db.get_tags_for_entry(entries[0]["id"])) == ["checklist", "first"]
+    assert db.get_template_for_entry(entries[1]["id"])["id"] == template_id
+
+def test_apply_api_dry_run_and_validation():
+    template_id = make_template()
+    capsule_id = db.create_capsule("Target", "desc", datetime.now(UTC), FIELDS)
+    with app.test_client() as client:
+        url = f"/api/templates/{template_id}/apply"
+        dry = client.post(url, json={"capsule_ids": [capsule_id], "repeat": 5, "dry_run": True}).get_json()
+        assert dry["entries"] == 10 and dry["created"] == 0 and dry["bytes"] > 0 and dry["batches"] == 1
+        assert db.get_entries_by_capsule(capsule_id) == []
+        applied = client.post(url, json={"capsule_ids": [capsule_id], "repeat": 5}).get_json()
+        assert applied["created"] == 10 and len(db.get_entries_by_capsule(capsule_id)) == 10
+        assert client.post(url, json={"capsule_ids": ["missing"]}).status_code == 404
+        assert client.post(url, json={"capsule_ids": [capsule_id], "repeat": 0}).status_code == 400
+        assert client.post("/api/templates/missing/apply", json={"capsule_ids": [capsule_id]}).status_code == 404
+        broken = make_template({"entries": []}, name="Broken")
+        assert client.post(f"/api/templates/{broken}/apply", json={"capsule_ids": [capsule_id]}).status_code == 400
+        bad_value = make_template({"entries": [{"priority": "high"}, {"priority": 3}]}, name="Bad value")
+        summary = client.post(f"/api/templates/{bad_value}/apply", json={"capsule_ids": [capsule_id]}).get_json()
+        assert summary["created"] == 1 and summary["errors"][0]["entry"] == 0
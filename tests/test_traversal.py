@@ -0,0 +1,43 @@
+from traversal import breadth_first
+
+GRAPH = {
+    'a': ['b', 'c'],
+    'b': ['d'],
+    'c': ['d', 'e'],
+    'd': ['a'],
+    'e': ['f'],
+}
+
+def fetch_children(ids, fan_out):
+    children = {}
+    for node_id in ids:
+        linked = [{'id': child} for child in GRAPH.get(node_id, [])]
+        children[node_id] = linked if fan_out is None else linked[:fan_out]
+    return children
+
+def test_breadth_first_depth_and_paths():
+    hits, truncated = breadth_first('a', fetch_children, max_depth=5)
+    assert not truncated
+    by_id = {hit['entry']['id']: hit for hit in hits}
+    assert set(by_id) == {'b', 'c', 'd', 'e', 'f'}
+    assert by_id['d']['depth'] == 2
+    assert by_id['d']['path'] == ['a', 'b', 'd']
+    assert by_id['f']['path'] == ['a', 'c', 'e', 'f']
+
+def test_breadth_first_respects_max_depth():
+    hits, _ = breadth_first('a', fetch_children, max_depth=1)
+    assert [hit['entry']['id'] for hit in hits] == ['b', 'c']
+
+def test_breadth_first_limit_and_fan_out():
+    hits, truncated = breadth_first('a', fetch_children, max_depth=5, limit=2)
+    assert truncated
+    assert len(hits) == 2
+    hits, _ = breadth_first('a', fetch_children, max_depth=5, fan_out=1)
+    assert [hit['entry']['id'] for hit in hits] == ['b', 'd']
+
+def test_breadth_first_handles_long_chains_without_recursion():
+    chain = {str(i): [str(i + 1)] for i in range(5000)}
+    def fetch(ids, fan_out):
+        return {i: [{'id': c} for c in chain.get(i, [])] for i in ids}
+    hits, _ = breadth_first('0', fetch, max_depth=5000)
+    assert len(hits) == 5000
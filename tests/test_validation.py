@@ -0,0 +1,27 @@
+import json
+import pytest
+from ingest import prepare_row
+from validation import validate_properties
+
+FIELDS = [
+    {"name": "temperature", "type": "int"},
+    {"name": "ok", "type": "boolean", "defaultValue": "true"},
+    {"name": "label", "type": "string"},
+]
+
+def test_validate_properties_coerces_declared_fields():
+    result = validate_properties(FIELDS, {"temperature": "21", "label": 5, "extra": [1]})
+    assert result == {"temperature": 21, "ok": True, "label": "5", "extra": [1]}
+
+def test_validate_properties_rejects_bad_types():
+    with pytest.raises(ValueError, match="temperature"):
+        validate_properties(FIELDS, {"temperature": "warm"})
+    with pytest.raises(ValueError, match="ok"):
+        validate_properties(FIELDS, {"ok": "maybe"})
+
+def test_prepare_row_accepts_wrapped_and_bare_records():
+    timestamp, properties = prepare_row(FIELDS, {"properties": {"temperature": 3}, "timestamp": "2025-01-02T03:04:05Z"})
+    assert timestamp.isoformat() == "2025-01-02T03:04:05+00:00"
+    assert json.loads(properties)["temperature"] == 3
+    _, properties = prepare_row(FIELDS, {"temperature": 4})
+    assert json.loads(properties)["temperature"] == 4
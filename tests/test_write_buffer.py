@@ -0,0 +1,107 @@
+import json
+import os
+import threading
+from datetime import datetime, UTC
+import pytest
+import db
+from recall import app
+from write_buffer import WriteBuffer, set_write_buffer
+
+@pytest.fixture
+def buffered():
+    buffers = []
+
+    def install(**options):
+        buffer = WriteBuffer(flush_interval=60, **options)
+        buffers.append(buffer)
+        set_write_buffer(buffer)
+        return buffer
+    yield install
+    set_write_buffer(None)
+    for buffer in buffers:
+        buffer.close()
+
+def crash(buffer):
+    # Stop the flusher without draining, as if the process had died.
+    with buffer._cond:
+        buffer._closed = True
+        buffer._cond.notify()
+    buffer._thread.join()
+    buffer._queue.clear()
+    buffer._wal.close()
+    buffer._wal_owner.close()  # the lock dies with the process
+    buffer._wal = None
+
+def test_entries_are_queued_and_committed_in_one_group(buffered):
+    buffer = buffered()
+    capsule_id = db.create_capsule("Buffered", "desc", datetime.now(UTC), [])
+    with app.test_client() as client:
+        for i in range(3):
+            response = client.post(f"/api/capsule/{capsule_id}/add_entry", json={"properties": {"n": i}})
+            assert response.status_code == 202 and response.get_json()["queued"]
+        assert db.get_entries_by_capsule(capsule_id) == []
+        assert client.get("/api/health/cache").get_json()["write_buffer"]["queued"] == 3
+    assert buffer.flush() == 3
+    assert [json.loads(e["properties"])["n"] for e in db.get_entries_by_capsule(capsule_id)] == [0, 1, 2]
+    assert buffer.stats()["flushes"] == 1 and buffer.stats()["committed"] == 3
+
+def test_full_buffer_answers_429(buffered):
+    buffered(max_size=2)
+    capsule_id = db.create_capsule("Busy", "desc", datetime.now(UTC), [])
+    entry_id = db.create_entry(capsule_id, datetime.now(UTC), json.dumps({}))
+    with app.test_client() as client:
+        assert client.post(f"/api/entries/{entry_id}/snapshots", json={"payload": {"v": 1}}).status_code == 202
+        assert client.post(f"/api/capsule/{capsule_id}/add_entry", json={"properties": {}}).status_code == 202
+        refused = client.post(f"/api/capsule/{capsule_id}/add_entry", json={"properties": {}})
+        assert refused.status_code == 429 and refused.headers["Retry-After"] == "1"
+        assert client.post("/api/entries/missing/snapshots", json={"payload": {}}).status_code == 404
+
+def test_write_ahead_file_is_replayed_after_a_crash(buffered, tmp_path):
+    wal = str(tmp_path / "writes.wal")
+    capsule_id = db.create_capsule("Durable", "desc", datetime.now(UTC), [])
+    entry_id = db.create_entry(capsule_id, datetime.now(UTC), json.dumps({}))
+    first = buffered(wal_path=wal)
+    first.add_entry(capsule_id, datetime.now(UTC), json.dumps({"n": 1}))
+    first.add_snapshot(entry_id, datetime.now(UTC), json.dumps({"v": 1}))
+    crash(first)
+    own = f"{wal}.{os.getpid()}"
+    with open(own, "a", encoding="utf-8") as torn:
+        torn.write('{"kind": "entry", "capsule_id"')
+    buffered(wal_path=wal)
+    assert len(db.get_entries_by_capsule(capsule_id)) == 2
+    assert len(db.get_snapshots_by_entry(entry_id)) == 1
+    assert os.path.getsize(own) == 0 and not os.path.exists(own + ".flushing")
+
+def test_workers_only_replay_write_ahead_files_of_dead_workers(buffered, tmp_path, monkeypatch):
+    wal = str(tmp_path / "writes.wal")
+    capsule_id = db.create_capsule("Shared", "desc", datetime.now(UTC), [])
+    monkeypatch.setattr(os, "getpid", lambda: 101)
+    live = buffered(wal_path=wal)
+    live.add_entry(capsule_id, datetime.now(UTC), json.dumps({"n": 1}))
+    monkeypatch.setattr(os, "getpid", lambda: 102)
+    other = buffered(wal_path=wal)
+    other.add_entry(capsule_id, datetime.now(UTC), json.dumps({"n": 2}))
+    assert db.get_entries_by_capsule(capsule_id) == []
+    # The other worker rotates and commits only its own file
+    assert other.flush() == 1
+    assert os.path.getsize(f"{wal}.101") > 0
+    crash(live)
+    monkeypatch.setattr(os, "getpid", lambda: 103)
+    buffered(wal_path=wal)
+    assert sorted(json.loads(e["properties"])["n"] for e in db.get_entries_by_capsule(capsule_id)) == [1, 2]
+    assert not os.path.exists(f"{wal}.101") and not os.path.exists(f"{wal}.101.lock")
+    assert os.path.exists(f"{wal}.102.lock")
+
+def test_fsync_does_not_block_the_queue(buffered, tmp_path, monkeypatch):
+    buffer = buffered(wal_path=str(tmp_path / "writes.wal"))
+    capsule_id = db.create_capsule("Durable", "desc", datetime.now(UTC), [])
+    seen = []
+
+    def slow_fsync(fd):
+        reader = threading.Thread(target=lambda: seen.append(buffer.stats()["queued"]))
+        reader.start()
+        reader.join(timeout=5)
+        assert not reader.is_alive()
+    monkeypatch.setattr(os, "fsync", slow_fsync)
+    buffer.add_entry(capsule_id, datetime.now(UTC), json.dumps({"n": 1}))
+    assert seen == [0] and buffer.stats()["queued"] == 1